@@ -1,6 +1,13 @@
+import argparse
 import asyncio
 import websockets
-from datetime import date
+from Clock import RealClock, add_clock_arguments, create_clock
+from Recipes import LEGACY_RECIPES_FILE, RecipeBook, run_timeline
+from TickScheduler import TickScheduler
+
+# Zeitquelle für die Schritte, mit --clock scaled|virtual läuft die Simulation schneller
+clock = RealClock()
+tick_scheduler = TickScheduler(clock)
 
 class MachineState:
     def __init__(self, temp=22):
@@ -15,77 +22,21 @@ class MachineState:
     def to_csv(self):
         water_flag = 1 if self.water_ok else 0
         grounds_flag = 1 if self.grounds_ok else 0
-        return f"{self.temp},{water_flag},{grounds_flag},{self.water_flow},{date.today().strftime('%d.%m.%Y')}"
-
-class Step:
-    def __init__(self, second: int, description: str):
-        self.second = second
-        self.description = description
-
-    async def execute(self, state: MachineState, send):
-        await send(f"{self.description},{state.to_csv()}")
-        await asyncio.sleep(1)
-
-class HeatUp(Step):
-    def __init__(self, second: int, temp: int):
-        super().__init__(second, f"Aufheizen")
-        self.target_temp = temp
-    
-    async def execute(self, state: MachineState, send):
-        state.temp = self.target_temp
-        state.water_flow = 5 if 31 <= self.second <= 49 else 0
-        await super().execute(state, send)
-        if self.second >= 49 or self.second < 31:
-            state.water_flow = 0
-
-class CoolDown(Step):
-    def __init__(self, second: int, temp: int):
-        super().__init__(second, f"Abkühlen")
-        self.target_temp = temp
-    
-    async def execute(self, state: MachineState, send):
-        state.temp = self.target_temp
-        await super().execute(state, send)
+        return f"{self.temp},{water_flag},{grounds_flag},{self.water_flow},{clock.now().strftime('%d.%m.%Y')}"
 
-class CoffeeGrind(Step): pass
-class CoffeePress(Step): pass
+# Rezepte kommen aus recipes_legacy.json (siehe Recipes.py), hier nur die Menüauswahl und die Anzeige-Texte
+recipe_book = RecipeBook()
+recipe_book.load_file(LEGACY_RECIPES_FILE)
 
-class PowderMoister(Step):
-    async def execute(self, state: MachineState, send):
-        state.water_flow = 5
-        await super().execute(state, send)
-        state.water_flow = 0
+coffee_types = {"1": "Normal", "2": "Espresso"}
 
-class CoffeeBrewing(Step):
-    def __init__(self, second: int, description: str, amount: int = 1):
-        super().__init__(second, description)
-        self.amount = amount
-    
-    async def execute(self, state: MachineState, send):
-        if not state.water_ok:
-            await send(f"Wasser leer,{state.to_csv()}")
-            return False
-        if not state.grounds_ok:
-            await send(f"Kaffeesatz voll,{state.to_csv()}")
-            return False
-
-        state.water_flow = 5
-        if state.cups_since_empty + self.amount >= 3:
-            state.grounds_ok = False
-            
-        if state.cups_since_filled + self.amount >= 5:
-            state.water_ok = False
-
-        await send(f"{self.description},{state.to_csv()}")
-        await asyncio.sleep(1)
-        state.water_flow = 0
-        return True
-
-class BrewingUnitToStartPosition(Step): pass
-
-coffee_types = {
-    "1": {"name": "Normal", "grinding_steps": 6, "press_steps": 5, "moisting_steps": 2, "brewing_steps": 14, "toStart_steps": 4},
-    "2": {"name": "Espresso", "grinding_steps": 6, "press_steps": 5, "moisting_steps": 2, "brewing_steps": 14, "toStart_steps": 4}
+step_labels = {
+    "Grind": "Mahlen",
+    "Press": "Pressen",
+    "Rest": "Ruhen",
+    "Moisten": "Anfeuchten",
+    "Brew": "Brühen",
+    "ToStartposition": "Zur Startposition"
 }
 
 state = MachineState()
@@ -124,14 +75,13 @@ async def heat_up_machine(send):
     total_seconds = 45
     temp_difference = target_temp - start_temp
     
-    for second in range(total_seconds + 1):
+    async for second in tick_scheduler.steps(total_seconds + 1):
         current_temp = start_temp + (temp_difference * (second / total_seconds))
         state.temp = round(current_temp, 1)
         
         state.water_flow = 5 if 31 <= second <= 45 else 0
         
         await send(f"Aufheizen,{state.to_csv()}")
-        await asyncio.sleep(1)
     
     state.water_flow = 0
 
@@ -141,20 +91,42 @@ async def cool_down_machine(send):
     total_seconds = 180
     temp_difference = start_temp - target_temp
     
-    for second in range(total_seconds):
+    async for second in tick_scheduler.steps(total_seconds):
         current_temp = start_temp - (temp_difference * (second / total_seconds))
         state.temp = round(current_temp, 1)
         await send(f"Abkühlen,{state.to_csv()}")
-        await asyncio.sleep(1)
     
     state.powered_on = False
     await send(f"Ausgeschaltet,{state.to_csv()}")
 
+async def brew_coffee(recipe_name, amount, send):
+    if not state.water_ok:
+        await send(f"Wasser leer,{state.to_csv()}")
+        return False
+    if not state.grounds_ok:
+        await send(f"Kaffeesatz voll,{state.to_csv()}")
+        return False
+
+    async def send_tick(tick):
+        state.water_flow = tick.water_flow
+        if tick.temperature is not None:
+            state.temp = tick.temperature
+        await send(f"{step_labels.get(tick.step, tick.step)},{state.to_csv()}")
+
+    await run_timeline(recipe_book.get_timeline(recipe_name, amount), tick_scheduler, send_tick)
+    state.water_flow = 0
+
+    state.cups_since_empty += amount
+    state.cups_since_filled += amount
+    state.grounds_ok = state.cups_since_empty < 3
+    state.water_ok = state.cups_since_filled < 5
+    return True
+
 async def handle_command(option, send):
     if option == "1":
         if not state.powered_on:
             state.powered_on = True
-            await asyncio.sleep(2)
+            await clock.sleep(2)
         
         await heat_up_machine(send)
         return "ready"
@@ -222,43 +194,7 @@ async def echo(websocket):
                         current_state = "ready"
                         continue
                         
-                    recipe = coffee_types[message]
-
-                    grinding = [CoffeeGrind(i+1, "Mahlen") for i in range(recipe['grinding_steps'])]
-                    press = [CoffeePress(i+1, "Pressen") for i in range(recipe['press_steps'])]
-                    moisting = [PowderMoister(i+1, "Anfeuchten") for i in range(recipe['moisting_steps'])]
-                    brewing = [CoffeeBrewing(i+1, "Brühen", current_amount) for i in range(recipe['brewing_steps'] * current_amount)]
-                    toStartPosition = [BrewingUnitToStartPosition(i+1, "Zur Startposition") for i in range(recipe['toStart_steps'])]
-
-                    for step in grinding:
-                        await step.execute(state, send)
-                    for step in press:
-                        await step.execute(state, send)
-                    
-                    if not state.water_ok:
-                        current_state = "ready"
-                        continue
-                    if not state.grounds_ok:
-                        current_state = "ready"
-                        continue
-                    
-                    for step in moisting:
-                        await step.execute(state, send)
-
-                    brew_successful = True
-                    for step in brewing:
-                        ok = await step.execute(state, send)
-                        if not ok:
-                            brew_successful = False
-                            break
-
-                    if brew_successful:
-                        for step in toStartPosition:
-                            await step.execute(state, send)
-                        
-                        state.cups_since_empty += current_amount
-                        state.cups_since_filled += current_amount
-                    
+                    await brew_coffee(coffee_types[message], current_amount, send)
                     current_state = "ready"
                         
                 else:
@@ -282,4 +218,9 @@ async def main():
         await asyncio.Future()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kaffeemaschinen-Simulation ohne Datenbank")
+    add_clock_arguments(parser)
+    args = parser.parse_args()
+    clock = create_clock(args.clock, args.speed)
+    tick_scheduler.clock = clock
     asyncio.run(main())
\ No newline at end of file
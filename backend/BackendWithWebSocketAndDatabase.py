@@ -3,6 +3,7 @@ import websockets
 from datetime import date
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+from ProfileTables import COOLING_COLLECTION, HEATING_COLLECTION, ProfileTables, step_collection_name
 
 DATABASE_URL = "mongodb://localhost:27017"
 client = AsyncIOMotorClient(DATABASE_URL)
@@ -30,54 +31,8 @@ coffee_types = {
 
 state = MachineState()
 
-async def get_heating_data():
-    collection = database.Aufheizen
-    data = await collection.find().sort("_id", 1).to_list(length=None)
-    return data
-
-async def get_heating_data_from_current_temp(current_temp):
-    collection = database.Aufheizen
-    data = await collection.find({"temperature": {"$gte": current_temp}}).sort("temperature", 1).to_list(length=None)
-    return data
-
-async def get_cooling_data():
-    collection = database.Abkühlen
-    data = await collection.find().sort("_id", 1).to_list(length=None)
-    return data
-
-async def get_cooling_data_from_current_temp(current_temp):
-    collection = database.Abkühlen
-    data = await collection.find({"temperature": {"$lte": current_temp}}).sort("temperature", -1).to_list(length=None)
-    return data
-
-async def get_coffee_step_data(step_name: str, coffee_type: str, amount: int):
-    coffee_info = coffee_types[coffee_type]
-    
-    if step_name == "Mahlen":
-        collection_name = "Mahlen"
-    elif step_name == "Pressen":
-        collection_name = "Pressen"
-    elif step_name == "Anfeuchten":
-        collection_name = "Anfeuchten"
-    elif step_name == "Brühen":
-        if amount == 1:
-            if coffee_info["collection_prefix"] == "Espresso":
-                collection_name = f"Einen_Espresso_Brühen"
-            else:
-                collection_name = f"Einen_Normalen_Kaffee_Brühen"
-        else:
-            if coffee_info["collection_prefix"] == "Espresso":
-                collection_name = f"Zwei_Espresso_Brühen"
-            else:
-                collection_name = f"Zwei_Normale_Kaffee_Brühen"
-    elif step_name == "Zur_Startposition":
-        collection_name = "Zur_Startposition"
-    else:
-        return []
-    
-    collection = database[collection_name]
-    data = await collection.find().sort("_id", 1).to_list(length=None)
-    return data
+# Aufheizen, Abkühlen und Kaffee-Schritte werden beim Start geladen und im Speicher gehalten
+profile_tables = ProfileTables(database)
 
 async def get_coffee_workflow(coffee_type: str, amount: int):
     workflow = [
@@ -92,13 +47,13 @@ async def get_coffee_workflow(coffee_type: str, amount: int):
     return workflow
 
 async def heat_up_machine_from_db(send):
-    heating_data = await get_heating_data_from_current_temp(state.temp)
+    heating_data = profile_tables.get(HEATING_COLLECTION).rows_from_temperature(state.temp)
     
-    for entry in heating_data:
-        state.temp = entry['temperature']
-        state.water_flow = entry['water_flow']
-        state.water_ok = entry['water_ok']
-        state.grounds_ok = entry['grounds_ok']
+    for temperature, water_flow, water_ok, grounds_ok in heating_data:
+        state.temp = temperature
+        state.water_flow = water_flow
+        state.water_ok = water_ok
+        state.grounds_ok = grounds_ok
         
         await send(f"Aufheizen,{state.to_csv()}")
         await asyncio.sleep(1)
@@ -106,14 +61,15 @@ async def heat_up_machine_from_db(send):
     state.water_flow = 0
 
 async def cool_down_machine_from_db(send, websocket=None):
-    cooling_data = await get_cooling_data_from_current_temp(state.temp)
+    cooling_table = profile_tables.get(COOLING_COLLECTION)
+    cooling_data = cooling_table.rows_down_from_temperature(state.temp)
     
     if not cooling_data:
-        cooling_data = await get_cooling_data()
+        cooling_data = cooling_table.rows()
     
     cooling_interrupted = False
     
-    for entry in cooling_data:
+    for temperature, water_flow, water_ok, grounds_ok in cooling_data:
         if websocket:
             try:
                 message = await asyncio.wait_for(websocket.recv(), timeout=0.1)
@@ -123,10 +79,10 @@ async def cool_down_machine_from_db(send, websocket=None):
             except asyncio.TimeoutError:
                 pass
         
-        state.temp = entry['temperature']
-        state.water_flow = entry['water_flow']
-        state.water_ok = entry['water_ok']
-        state.grounds_ok = entry['grounds_ok']
+        state.temp = temperature
+        state.water_flow = water_flow
+        state.water_ok = water_ok
+        state.grounds_ok = grounds_ok
         
         await send(f"Abkühlen,{state.to_csv()}")
         await asyncio.sleep(1)
@@ -138,17 +94,18 @@ async def cool_down_machine_from_db(send, websocket=None):
         await heat_up_machine_from_db(send)
 
 async def execute_coffee_step(step_name: str, coffee_type: str, amount: int, send):
-    step_data = await get_coffee_step_data(step_name, coffee_type, amount)
+    collection_name = step_collection_name(step_name, coffee_types[coffee_type]["collection_prefix"], amount)
+    step_data = profile_tables.get(collection_name).rows()
     
     if not step_data:
         print(f"Keine Daten gefunden für Schritt: {step_name}")
         return True
     
-    for entry in step_data:
-        state.temp = entry['temperature']
-        state.water_flow = entry['water_flow']
-        state.water_ok = entry['water_ok']
-        state.grounds_ok = entry['grounds_ok']
+    for temperature, water_flow, water_ok, grounds_ok in step_data:
+        state.temp = temperature
+        state.water_flow = water_flow
+        state.water_ok = water_ok
+        state.grounds_ok = grounds_ok
         
         if not state.water_ok:
             await send(f"Wasser leer,{state.to_csv()}")
@@ -314,14 +271,19 @@ async def main():
     try:
         await database.command('ping')
         print("MongoDB Verbindung erfolgreich")
+        await profile_tables.load()
         
     except Exception as e:
         print(f"MongoDB Verbindung fehlgeschlagen: {e}")
         return
     
-    async with websockets.serve(echo, "localhost", 8765):
-        print(">>> Server läuft auf ws://localhost:8765")
-        await asyncio.Future()
+    profile_tables.start()
+    try:
+        async with websockets.serve(echo, "localhost", 8765):
+            print(">>> Server läuft auf ws://localhost:8765")
+            await asyncio.Future()
+    finally:
+        await profile_tables.stop()
 
 if __name__ == "__main__":
     try:
@@ -1,156 +1,305 @@
+import argparse
 import asyncio
+import multiprocessing
+import sys
 import websockets
 from datetime import date, datetime
-from motor.motor_asyncio import AsyncIOMotorClient
 import json
+import os
+import time
+import uuid
+from Machine import Machine
+from HistoryWriter import HistoryWriter
+from HistoryRetention import HistoryRetention
+from Broadcaster import Broadcaster
+from Codecs import CODECS, find_codec, get_codec, select_subprotocol
+from HistoryQuery import serialize_history_item, stream_history_pages
+from Statistics import Statistics
+from PubSub import MongoPubSub, SocketPubSub
+from Clock import RealClock, add_clock_arguments, create_clock
+from Recipes import RecipeBook, run_timeline
+from TickScheduler import LagHistogram, TickScheduler
+from Supervisor import TaskSupervisor
+from Commands import MAX_BATCH_SIZE, CommandError, LegacyCommandAdapter, operation_status, parse_command
+from CoffeeWriter import CoffeeError, CoffeeWriter, parse_coffee
+from Storage import create_storage
+from Metrics import CALL_BUCKETS_MS, Metrics
+from TimeSeries import parse_series_request, query_series, stream_series
 
-DATABASE_URL = "mongodb://localhost:27017"
-client = AsyncIOMotorClient(DATABASE_URL)
-database = client.Kaffeemaschine
-status_collection = database.Status
-coffee_history_collection = database.CoffeeHistory
-status_history_collection = database.StatusHistory
-
-connected_clients = set()
-machine_state = {
-    "input_state": "ready",
-    "current_amount": 1,
-    "is_processing": False,
-    "last_activity": datetime.now(),
-    "current_task": None
-}
-
-# Aktuelle Werte aus Datenbank auslesen
-async def get_current_status():
-    try:
-        current_status = await status_collection.find_one()
-        if current_status:
-            status_copy = current_status.copy()
-            if '_id' in status_copy:
-                status_copy['_id'] = str(status_copy['_id'])
-            if 'last_updated' in status_copy and isinstance(status_copy['last_updated'], datetime):
-                status_copy['last_updated'] = status_copy['last_updated'].isoformat()
-            return status_copy
-    except Exception as e:
-        return None
+# Speicher für Status und Historie (siehe Storage.py): mongodb://... (Standard), memory (nur im Arbeitsspeicher,
+# z.B. für Lasttests), mongomock (MongoDB-API im Arbeitsspeicher) oder sqlite:///kaffeemaschine.db
+DATABASE_URL = os.environ.get("DATABASE_URL", "mongodb://localhost:27017")
+storage = create_storage(DATABASE_URL)
+# Nur bei MongoDB gesetzt, Statistik, Verdichtung, Rezepte aus der Datenbank und MongoPubSub brauchen es
+database = storage.database
+
+# Zeitquelle der Simulation, mit --clock scaled|virtual läuft sie schneller als in echter Zeit
+clock = RealClock()
+# Gemeinsamer Sekundentakt aller Simulationen (absolute Deadlines, misst die Verspätung jedes Ticks)
+tick_scheduler = TickScheduler(clock)
+
+# Maschinen der Flotte, z.B. MACHINE_IDS=machine-1,machine-2,machine-3
+MACHINE_IDS = os.environ.get("MACHINE_IDS", "machine-1").split(",")
+DEFAULT_MACHINE_ID = MACHINE_IDS[0]
+machines = {machine_id: Machine(machine_id, storage, clock) for machine_id in MACHINE_IDS}
+
+history_writer = HistoryWriter(storage)
+# Kaffees aus dem Frontend werden geprüft, dedupliziert und gebündelt geschrieben (CoffeeWriter.py)
+coffee_writer = CoffeeWriter(storage)
+history_retention = HistoryRetention(database, clock=clock) if database is not None else None
+statistics = Statistics(database.CoffeeHistory, database.StatusHistory, clock=clock) if database is not None else None
+
+connected_clients = Broadcaster()
+# Alle Hintergrund-Tasks (Heartbeats, Auto-Standby, push_status_changes) mit Referenz und Fehlerprotokoll
+background_tasks = TaskSupervisor()
+
+# Rezepte aus recipes.json, beim Start durch die Collection Recipes ersetzt (falls dort Rezepte stehen)
+recipe_book = RecipeBook()
+recipe_book.load_file()
+HEARTBEAT_INTERVAL = 15
+
+# Latenzen im Hot Path, Event-Loop-Verzögerung und Zähler, abrufbar unter http://127.0.0.1:9108/metrics
+metrics = Metrics()
 
+# Mehrprozessbetrieb: nur der Besitzer-Prozess simuliert, alle Prozesse bedienen WebSocket-Clients.
+# Status kommt per Pub/Sub ("status") zu den Workern, Befehle gehen per Pub/Sub ("commands") zum Besitzer.
+cluster = {"is_owner": True, "pubsub": None}
+# In Workern: weitergeleitete Kaffees, deren ack auf das Ergebnis des Besitzers wartet (ticket -> Client, Timer)
+forwarded_coffees = {}
+FORWARDED_COFFEE_TIMEOUT = 10
+
+def set_clock(new_clock):
+    global clock
+    clock = new_clock
+    tick_scheduler.clock = new_clock
+    for machine in machines.values():
+        machine.set_clock(new_clock)
+    if history_retention:
+        history_retention.clock = new_clock
+    if statistics:
+        statistics.clock = new_clock
+
+# Aktuelle Werte aus dem Speicher auslesen (die Datenbank wird im Hintergrund aktualisiert)
+@metrics.timed("get_current_status")
+async def get_current_status(machine):
+    return machine.status_store.snapshot()
+
+# Die neuesten 100 Kaffees (für die alte "History"-Nachricht)
 async def get_coffee_history():
     try:
-        history = await coffee_history_collection.find().to_list(length=100)
-        
-        for item in history:
-            if '_id' in item:
-                item['_id'] = str(item['_id'])
-            if 'createdDate' in item and isinstance(item['createdDate'], datetime):
-                item['createdDate'] = item['createdDate'].isoformat()
-        
-        return history
+        history = await storage.recent_coffees(100)
+        return [serialize_history_item(item) for item in history]
     except Exception as e:
         return []
 
 # Step updaten
-async def update_step(step_name: str, water_flow: int = 0, **additional_updates):
-    current_status = await get_current_status()
+async def update_step(machine, step_name: str, water_flow: int = 0, **additional_updates):
+    current_status = machine.status_store.update(
+        current_step=step_name,
+        water_flow=water_flow,
+        **additional_updates
+    )
     if not current_status:
         return False
     
-    current_status['current_step'] = step_name
-    current_status['water_flow'] = water_flow
-    current_status.update(additional_updates)
-    
-    success = await update_status_in_db(current_status)
-    if success:
-        await broadcast_status()
-    return success
+    # Das Senden an die Clients übernimmt push_status_changes, sobald sich etwas geändert hat
+    await save_status_to_history(current_status)
+    return True
 
-# Daten in Datenbank einspeichern
-async def update_status_in_db(status_data):
-    try:
-        if status_data:
-            status_data['last_updated'] = datetime.now()
-            await save_status_to_history(status_data)
-        
-        await status_collection.delete_many({})
-        await status_collection.insert_one(status_data)
-        return True
-    except Exception as e:
-        print(f"Error updating status in DB: {e}")
+# Status im Speicher ersetzen, das Schreiben in die Datenbank übernimmt der StatusStore
+@metrics.timed("update_status_in_db")
+async def update_status_in_db(machine, status_data):
+    if not status_data:
         return False
+    
+    current_status = machine.status_store.replace(status_data)
+    await save_status_to_history(current_status)
+    return True
 
+# Snapshot wird nur eingereiht, der HistoryWriter schreibt gebündelt im Hintergrund
+@metrics.timed("save_status_to_history")
 async def save_status_to_history(status_data):
     try:
-        status_copy = status_data.copy()
-        if '_id' in status_copy:
-            del status_copy['_id']
-                
-        await status_history_collection.insert_one(status_copy)
-        
-        # Alte Einträge löschen, falls Datenbank zu voll wird
-        # await status_history_collection.delete_many({
-        #    'timestamp': {'$lt': datetime.now() - timedelta(days=30)}
-        # })
-        
+        history_writer.add(status_data)
         return True
     except Exception as e:
         print(f"Error saving status to history: {e}")
         return False
 
+# Wartet, bis der CoffeeWriter den Eintrag geschrieben hat (eine schon vorhandene id zählt als gespeichert)
 async def save_coffee_to_history(coffee_data):
-    try:            
-        await coffee_history_collection.insert_one(coffee_data)
-        return True
+    try:
+        status = await coffee_writer.submit(coffee_data)
+        return status in ("stored", "duplicate")
     except Exception as e:
         print(f"Error saving coffee to history: {e}")
         return False
 
+# Einmal pro geschriebenem Batch statt pro Kaffee
+async def notify_coffees_stored(count):
+    if statistics:
+        statistics.invalidate_coffee()
+    if cluster["pubsub"]:
+        await cluster["pubsub"].publish("coffee_saved", {})
+
+coffee_writer.on_stored = notify_coffees_stored
+
 # String to JSON
-async def status_to_json(status):
+def status_to_message(status, seq=None, machine_id=None):
     if not status:
-        return {
-            "type": "status",
-            "data": {
-                "temperature": 22,
-                "water_ok": True,
-                "grounds_ok": True,
-                "water_flow": 0,
-                "current_step": "Waiting",
-                "powered_on": False,
-                "cups_since_empty": 0,
-                "cups_since_filled": 0,
-                "last_updated": datetime.now().isoformat()
-            }
+        status = {
+            "temperature": 22,
+            "water_ok": True,
+            "grounds_ok": True,
+            "water_flow": 0,
+            "current_step": "Waiting",
+            "powered_on": False,
+            "cups_since_empty": 0,
+            "cups_since_filled": 0,
+            "last_updated": clock.now().isoformat()
         }
     
-    return json.dumps({"type": "status", "data": status}, default=str)
+    message = {"type": "status", "data": status}
+    if machine_id is not None:
+        message["machine_id"] = machine_id
+    if seq is not None:
+        message["seq"] = seq
+    return message
 
-# Nachricht an Frontend schicken
-async def broadcast_status():
-    if not connected_clients:
-        return
+async def status_to_json(status, seq=None, machine_id=None):
+    return json.dumps(status_to_message(status, seq, machine_id), default=str)
+
+# Nur die seit dem letzten Frame geänderten Felder (last_updated wird weggelassen)
+def status_delta_message(previous, status, base, seq, machine_id):
+    changes = {
+        key: value for key, value in status.items()
+        if key != 'last_updated' and previous.get(key) != value
+    }
+    return {"type": "status_delta", "machine_id": machine_id, "seq": seq, "base": base, "data": changes}
+
+# Status einer Maschine an ihre Abonnenten in diesem Prozess schicken (kodiert wird im Broadcaster)
+def send_status_frame(machine, current_status, seq):
+    message = status_to_message(current_status, seq, machine.machine_id)
+    
+    last_broadcast = machine.last_broadcast
+    delta_message = None
+    if current_status and last_broadcast["data"] is not None:
+        delta_message = status_delta_message(
+            last_broadcast["data"], current_status, last_broadcast["seq"], seq, machine.machine_id
+        )
     
+    last_broadcast.update(seq=seq, data=current_status, message=message)
+    connected_clients.broadcast_status(message, delta_message, machine.subscribers, machine.machine_id)
+
+# Läuft auch ohne Abonnenten, damit last_broadcast immer dem aktuellen Stand entspricht
+@metrics.timed("broadcast_status")
+async def broadcast_status(machine):
     try:
-        current_status = await get_current_status()
-        message = await status_to_json(current_status)
-        
-        disconnected = set()
-        for websocket in connected_clients:
-            try:
-                await websocket.send(message)
-            except:
-                disconnected.add(websocket)
+        current_status = await get_current_status(machine)
+        seq = machine.status_store.version
+        send_status_frame(machine, current_status, seq)
         
-        connected_clients.difference_update(disconnected)
+        if cluster["pubsub"]:
+            await cluster["pubsub"].publish(
+                "status", {"machine_id": machine.machine_id, "seq": seq, "data": current_status}
+            )
     except Exception as e:
         print(f"Error broadcasting status: {e}")
 
-async def send_current_status(websocket):
+# Für Delta-Clients muss der Snapshot genau dem zuletzt gesendeten Frame entsprechen
+async def send_current_status(websocket, machine):
     try:
-        current_status = await get_current_status()
-        message = await status_to_json(current_status)
-        await websocket.send(message)
+        message = machine.last_broadcast["message"]
+        if message is None:
+            message = status_to_message(
+                await get_current_status(machine), machine.status_store.version, machine.machine_id
+            )
+        connected_clients.send_to(websocket, message, "status", machine.machine_id)
     except Exception as e:
         print(f"Error sending current status: {e}")
 
+async def send_coffee_history(websocket):
+    try:
+        history = await get_coffee_history()
+        connected_clients.send_to(websocket, {"type": "coffee_history", "data": history}, "coffee_history")
+    except Exception as e:
+        print(f"Error sending coffee history: {e}")
+
+# Gefilterte Historie seitenweise nur an den anfragenden Client
+async def send_coffee_history_pages(websocket, request):
+    request_id = request.get('request_id')
+    
+    async def send_page(items, next_cursor, done=False, error=None):
+        page = {
+            "type": "coffee_history_page",
+            "request_id": request_id,
+            "data": items,
+            "next_cursor": next_cursor,
+            "done": done
+        }
+        if error:
+            page["error"] = error
+        connected_clients.send_to(websocket, page, "coffee_history_page")
+        # Nächste Seite erst lesen, wenn diese beim Client angekommen ist
+        await connected_clients.drain(websocket)
+    
+    try:
+        await stream_history_pages(storage, request, send_page)
+    except Exception as e:
+        print(f"Error querying coffee history: {e}")
+        await send_page([], None, done=True, error="query failed")
+
+# Temperatur und Wasserfluss eines Zeitraums aus der StatusHistory, auf höchstens "points" Punkte
+# reduziert und in Stücken gesendet (siehe TimeSeries.py)
+async def send_time_series(websocket, request):
+    request_id = request.get('request_id')
+    
+    async def send_chunk(field, points, done, **extra):
+        chunk = {"type": "timeseries_chunk", "request_id": request_id, "field": field, "data": points, "done": done, **extra}
+        connected_clients.send_to(websocket, chunk, "timeseries_chunk")
+        await connected_clients.drain(websocket)
+    
+    try:
+        machine = get_target_machine(websocket, request)
+        query = parse_series_request(request, machine.machine_id if machine else DEFAULT_MACHINE_ID, clock.now())
+    except (ValueError, TypeError) as e:
+        await send_chunk(None, [], True, error=f"invalid query: {e}")
+        return
+    
+    try:
+        result = await query_series(storage, query, history_retention)
+    except Exception as e:
+        print(f"Error querying time series: {e}")
+        await send_chunk(None, [], True, error="query failed")
+        return
+    
+    # Vor den Stücken beschreibt timeseries_info die Antwort (Maschine, Zeitraum, Quelle, gelesene Snapshots)
+    connected_clients.send_to(websocket, {
+        "type": "timeseries_info",
+        "request_id": request_id,
+        "machine_id": query["machine_id"],
+        "from": query["start"].isoformat(),
+        "to": query["end"].isoformat(),
+        "source": result["source"],
+        "samples": result["samples"],
+        "points": {field: len(points) for field, points in result["series"].items()},
+    }, "timeseries_info")
+    await stream_series(result, send_chunk)
+
+async def send_statistics(websocket, request):
+    if statistics is None:
+        response = {"type": "statistics", "request_id": request.get('request_id'), "data": None, "error": "not supported"}
+        connected_clients.send_to(websocket, response, "statistics")
+        return
+    
+    try:
+        result = await statistics.query(request)
+        response = {"type": "statistics", "request_id": request.get('request_id'), "data": result}
+    except Exception as e:
+        print(f"Error computing statistics: {e}")
+        response = {"type": "statistics", "request_id": request.get('request_id'), "data": None, "error": "query failed"}
+    connected_clients.send_to(websocket, response, "statistics")
+
 async def send_coffee_history_to_all():
     if not connected_clients:
         return
@@ -162,67 +311,61 @@ async def send_coffee_history_to_all():
             "type": "coffee_history",
             "data": history
         }
-        message = json.dumps(response, default=str)
-        
-        disconnected = set()
-        for websocket in connected_clients:
-            try:
-                await websocket.send(message)
-            except:
-                disconnected.add(websocket)
-        
-        connected_clients.difference_update(disconnected)
+        connected_clients.broadcast(response, "coffee_history")
     except Exception as e:
         print(f"Error sending coffee history: {e}")
 
-# Funktionen die im Hintergrund laufen
-async def continuous_waiting_broadcast():
+# Funktionen die im Hintergrund laufen (push_status_changes läuft einmal pro Maschine)
+async def push_status_changes(machine):
+    version = machine.status_store.version
     while True:
-        await asyncio.sleep(1)
+        version = await machine.status_store.wait_for_change(version)
+        await broadcast_status(machine)
+
+async def send_heartbeats():
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
         
-        current_status = await get_current_status()
-        if current_status and current_status.get('current_step') == 'Waiting':
-            await broadcast_status()
+        if connected_clients:
+            message = {"type": "heartbeat", "time": datetime.now().isoformat()}
+            connected_clients.broadcast(message, "heartbeat")
 
+# Läuft endlos und treibt die virtuelle Uhr daher nicht an (background=True)
 async def check_auto_standby():
     while True:
-        await asyncio.sleep(10)
+        await clock.sleep(10, background=True)
         
-        if machine_state["is_processing"]:
-            continue
+        for machine in machines.values():
+            if machine.state["is_processing"] or machine.supervisor.is_busy():
+                continue
+                
+            time_since_activity = (clock.now() - machine.state["last_activity"]).total_seconds()
             
-        time_since_activity = (datetime.now() - machine_state["last_activity"]).total_seconds()
-        
-        if time_since_activity > 120:
-            current_status = await get_current_status()
-            if current_status and current_status.get('powered_on', False):
-                asyncio.create_task(simulate_cooling())
-
-# Wird am Start der Simulationsfunktionen ausgeführt
-async def prepare_machine_task():
-    if machine_state["current_task"] and not machine_state["current_task"].done():
-        machine_state["current_task"].cancel()
-        try:
-            await machine_state["current_task"]
-        except asyncio.CancelledError:
-            pass
-    
+            if time_since_activity > 120:
+                current_status = await get_current_status(machine)
+                if current_status and current_status.get('powered_on', False):
+                    machine.supervisor.submit("CoolDown", lambda machine=machine: simulate_cooling(machine))
+
+# Wird am Start der Simulationsfunktionen ausgeführt. Eine vorherige Operation hat der
+# MachineSupervisor bereits abgebrochen und ihr Aufräumen abgewartet.
+async def prepare_machine_task(machine):
+    machine_state = machine.state
     machine_state["current_task"] = asyncio.current_task()
     machine_state["is_processing"] = True
-    machine_state["last_activity"] = datetime.now()
+    machine_state["last_activity"] = clock.now()
 
 # Wird am Ende der Simulationsfunktionen ausgeführt
-async def cleanup_machine_task():
-    machine_state["is_processing"] = False
-    if machine_state["current_task"] == asyncio.current_task():
-        machine_state["current_task"] = None
+async def cleanup_machine_task(machine):
+    machine.state["is_processing"] = False
+    if machine.state["current_task"] == asyncio.current_task():
+        machine.state["current_task"] = None
 
 # Simulationsbereich
-async def simulate_heating():
-    await prepare_machine_task()
+async def simulate_heating(machine):
+    await prepare_machine_task(machine)
     
     try:
-        current_status = await get_current_status()
+        current_status = await get_current_status(machine)
         if not current_status:
             return
         
@@ -230,7 +373,7 @@ async def simulate_heating():
         target_temp = 94
         
         if current_temp >= target_temp:
-            await update_step("Waiting", 0, temperature=target_temp, powered_on=True)
+            await update_step(machine, "Waiting", 0, temperature=target_temp, powered_on=True)
             return
         
         total_temp_diff = target_temp - 22
@@ -239,39 +382,39 @@ async def simulate_heating():
         total_seconds = 45
         remaining_seconds = int((1 - progress) * total_seconds)
         
-        await update_step("HeatUp", 0, powered_on=True)
+        await update_step(machine, "HeatUp", 0, powered_on=True)
         
-        for second in range(remaining_seconds + 1):
-            if machine_state["current_task"] != asyncio.current_task():
+        async for second in tick_scheduler.steps(remaining_seconds + 1):
+            if machine.state["current_task"] != asyncio.current_task():
                 return
                 
-            progress = second / remaining_seconds
+            progress = second / remaining_seconds if remaining_seconds else 1
             new_temp = current_temp + (current_temp_diff * progress)
             
             current_water_flow = 3 if second >= (remaining_seconds - 15) and second <= remaining_seconds else 0
             
             await update_step(
+                machine,
                 "HeatUp",
                 current_water_flow,
                 temperature=round(new_temp, 1),
                 powered_on=True
             )
-            await asyncio.sleep(1)
         
-        await update_step("Waiting", 0, temperature=target_temp, powered_on=True)
+        await update_step(machine, "Waiting", 0, temperature=target_temp, powered_on=True)
         
     except asyncio.CancelledError:
-        await update_step("Waiting", 0, powered_on=True)
+        await update_step(machine, "Waiting", 0, powered_on=True)
     except Exception as e:
         print(f"Error in simulate_heating: {e}")
     finally:
-        await cleanup_machine_task()
+        await cleanup_machine_task(machine)
 
-async def simulate_cooling():
-    await prepare_machine_task()
+async def simulate_cooling(machine):
+    await prepare_machine_task(machine)
     
     try:
-        current_status = await get_current_status()
+        current_status = await get_current_status(machine)
         if not current_status:
             return
         
@@ -279,7 +422,7 @@ async def simulate_cooling():
         target_temp = 22
         
         if current_temp <= target_temp:
-            await update_step("Waiting", 0, temperature=target_temp, powered_on=False)
+            await update_step(machine, "Waiting", 0, temperature=target_temp, powered_on=False)
             return
         
         total_temp_diff = 94 - target_temp  
@@ -288,157 +431,372 @@ async def simulate_cooling():
         total_seconds = 180
         remaining_seconds = int((1 - progress) * total_seconds)
         
-        await update_step("CoolDown", 0, powered_on=False)
+        await update_step(machine, "CoolDown", 0, powered_on=False)
         
-        for second in range(remaining_seconds + 1):
-            if machine_state["current_task"] != asyncio.current_task():
+        async for second in tick_scheduler.steps(remaining_seconds + 1):
+            if machine.state["current_task"] != asyncio.current_task():
                 return
                 
-            progress = second / remaining_seconds
+            progress = second / remaining_seconds if remaining_seconds else 1
             new_temp = current_temp - (current_temp_diff * progress)  
             
             await update_step(
+                machine,
                 "CoolDown",
                 0,
                 temperature=round(new_temp, 1),
                 powered_on=False
             )
-            await asyncio.sleep(1)
             
-        await update_step("Waiting", 0, temperature=target_temp, powered_on=False)
+        await update_step(machine, "Waiting", 0, temperature=target_temp, powered_on=False)
         
     except asyncio.CancelledError:
-        await update_step("Waiting", 0, powered_on=False)
+        await update_step(machine, "Waiting", 0, powered_on=False)
     except Exception as e:
         print(f"Error in simulate_cooling: {e}")
     finally:
-        await cleanup_machine_task()
+        await cleanup_machine_task(machine)
 
-async def simulate_coffee_brewing(coffee_type: str, amount: int):
-    await prepare_machine_task()
+async def simulate_coffee_brewing(machine, coffee_type: str, amount: int):
+    await prepare_machine_task(machine)
     
     try:
-        current_status = await get_current_status()
+        current_status = await get_current_status(machine)
         if not current_status:
             return False
         
         if not current_status.get('water_ok', True):
-            await update_step("Water empty", 0, powered_on=True)
+            await update_step(machine, "Water empty", 0, powered_on=True)
             return False
         
         if not current_status.get('grounds_ok', True):
-            await update_step("Grounds full", 0, powered_on=True)
+            await update_step(machine, "Grounds full", 0, powered_on=True)
             return False
         
-        coffee_info = coffee_types.get(coffee_type, {})
-        steps = [
-            ("Grind", coffee_info.get('grinding_steps', 6)),
-            ("Press", coffee_info.get('press_steps', 5)),
-            ("Rest", coffee_info.get('rest_steps1', 3)),
-            ("Moisten", coffee_info.get('moisting_steps', 2)),
-            ("Rest", coffee_info.get('rest_steps2', 4)),
-            ("Brew", coffee_info.get('brewing_steps', 14) * amount),
-            ("ToStartposition", coffee_info.get('toStart_steps', 4))
-        ]
+        # Ablauf (Schritt und Wasserfluss pro Sekunde) ist vorberechnet, siehe Recipes.py
+        timeline = recipe_book.get_timeline(coffee_type, amount)
+        task = asyncio.current_task()
+        
+        # brew_id und recipe kennzeichnen alle Snapshots dieses Bezugs (für die Statistik)
+        brew_id = uuid.uuid4().hex
         
-        for step_name, step_duration in steps:
-            for second in range(step_duration):
-                if machine_state["current_task"] != asyncio.current_task():
-                    return False
-                    
-                water_flow = 5 if step_name == "Brew" else 0
-                water_flow = 1 if step_name == "Moisten" else 0
-                await update_step(step_name, water_flow, powered_on=True)
-                await asyncio.sleep(1)
+        async def apply_tick(tick):
+            updates = {"powered_on": True, "brew_id": brew_id, "recipe": coffee_type}
+            if tick.temperature is not None:
+                updates["temperature"] = tick.temperature
+            await update_step(machine, tick.step, tick.water_flow, **updates)
+        
+        completed = await run_timeline(
+            timeline, tick_scheduler, apply_tick, lambda: machine.state["current_task"] == task
+        )
+        if not completed:
+            return False
         
-        current_status = await get_current_status()
+        current_status = await get_current_status(machine)
         if current_status:
             cups_since_empty = current_status.get('cups_since_empty', 0) + amount
             cups_since_filled = current_status.get('cups_since_filled', 0) + amount
             
             await update_step(
+                machine,
                 "Waiting",
                 0,
                 cups_since_empty=cups_since_empty,
                 cups_since_filled=cups_since_filled,
                 grounds_ok=cups_since_empty < 3,
                 water_ok=cups_since_filled < 5,
-                powered_on=True
+                powered_on=True,
+                brew_id=None,
+                recipe=None
             )
             
         return True
         
     except asyncio.CancelledError:
-        await update_step("Waiting", 0, powered_on=True)
+        await update_step(machine, "Waiting", 0, powered_on=True, brew_id=None, recipe=None)
         return False
     except Exception as e:
         print(f"Error in simulate_coffee_brewing: {e}")
         return False
     finally:
-        await cleanup_machine_task()
+        await cleanup_machine_task(machine)
+
+# Abonnierte Maschinen eines Clients ersetzen, "*" steht für alle Maschinen
+async def subscribe_machines(websocket, machine_ids):
+    connection = connected_clients.get(websocket)
+    if machine_ids == "*":
+        machine_ids = list(machines)
+    machine_ids = [machine_id for machine_id in machine_ids if machine_id in machines]
+    
+    for machine_id in connection.machine_ids:
+        machines[machine_id].unsubscribe(websocket)
+    connection.machine_ids = machine_ids
+    for machine_id in machine_ids:
+        machines[machine_id].subscribe(websocket)
+        await send_current_status(websocket, machines[machine_id])
+
+# Zielmaschine eines Befehls: machine_id aus der Nachricht oder die erste abonnierte Maschine
+def get_target_machine(websocket, data=None):
+    if data and isinstance(data.get('machine_id'), str) and data['machine_id'] in machines:
+        return machines[data['machine_id']]
+    connection = connected_clients.get(websocket)
+    if connection.machine_ids:
+        return machines[connection.machine_ids[0]]
+    return None
+
+# Strukturierte Nachrichten (JSON oder binär kodiert)
+async def handle_structured_message(websocket, data, received=None):
+    connection = connected_clients.get(websocket)
+    received = received or time.perf_counter()
+    
+    # Protokoll-Nachrichten: {"type": "hello", "delta": true, "encoding": "msgpack"} und {"type": "resync"}.
+    # Ein unbekanntes Format wird mit einem Fehler beantwortet, die Verbindung bleibt beim bisherigen Format.
+    if data.get('type') == 'hello':
+        connection.delta = bool(data.get('delta', False))
+        if 'encoding' in data:
+            codec = find_codec(data['encoding'])
+            if codec:
+                connection.codec = codec
+            else:
+                response = {
+                    "type": "hello", "error": f"unsupported encoding: {data['encoding']}",
+                    "encoding": connection.codec.name, "encodings": list(CODECS)
+                }
+                connected_clients.send_to(websocket, response, "hello")
+        for machine_id in connection.machine_ids:
+            await send_current_status(websocket, machines[machine_id])
+    elif data.get('type') == 'resync':
+        resync_ids = [data['machine_id']] if data.get('machine_id') in connection.machine_ids else connection.machine_ids
+        for machine_id in resync_ids:
+            await send_current_status(websocket, machines[machine_id])
+    elif data.get('type') == 'subscribe':
+        machine_ids = data.get('machines', [])
+        if machine_ids != "*" and not (isinstance(machine_ids, list) and all(isinstance(machine_id, str) for machine_id in machine_ids)):
+            response = {"type": "subscribe", "error": 'machines must be "*" or a list of machine ids', "machines": connection.machine_ids}
+            connected_clients.send_to(websocket, response, "subscribe")
+            return
+        await subscribe_machines(websocket, machine_ids)
+    elif data.get('type') in ('command', 'batch'):
+        await handle_command_request(websocket, data, received)
+    elif data.get('type') == 'history_query':
+        await send_coffee_history_pages(websocket, data)
+    elif data.get('type') == 'statistics_query':
+        await send_statistics(websocket, data)
+    elif data.get('type') == 'timeseries_query':
+        await send_time_series(websocket, data)
+    elif data.get('type') == 'scheduler_stats':
+        response = {"type": "scheduler_stats", "data": tick_scheduler.snapshot()}
+        connected_clients.send_to(websocket, response, "scheduler_stats")
+    elif data.get('type') == 'supervisor_stats':
+        response = {
+            "type": "supervisor_stats",
+            "data": {machine_id: machine.supervisor.snapshot() for machine_id, machine in machines.items()}
+        }
+        connected_clients.send_to(websocket, response, "supervisor_stats")
+    elif all(key in data for key in ['id', 'type', 'strength', 'createdDate']):
+        await handle_coffee_submission(websocket, data, received)
+
+# Kaffee aus dem Frontend: ungültige Einträge werden ohne jeden DB-Zugriff abgelehnt. Das ack kommt erst,
+# wenn der Eintrag geschrieben ist (status "stored" oder "duplicate"), in Workern mit dem Ergebnis des Besitzers.
+async def handle_coffee_submission(websocket, data, received):
+    request_id = data.get('request_id')
+    try:
+        coffee = parse_coffee(data, recipe_book)
+    except CoffeeError as e:
+        coffee_writer.stats["invalid"] += 1
+        send_ack(websocket, request_id, [{"ok": False, "error": str(e)}], received)
+        return
+    if data.get('machine_id') is not None and not isinstance(data['machine_id'], str):
+        coffee_writer.stats["invalid"] += 1
+        send_ack(websocket, request_id, [{"ok": False, "error": "invalid machine_id"}], received)
+        return
+    
+    machine = get_target_machine(websocket, data)
+    if machine and 'machine_id' not in coffee:
+        coffee['machine_id'] = machine.machine_id
+    
+    if not cluster["is_owner"]:
+        await forward_coffee(websocket, coffee, request_id, received)
+        return
+    
+    try:
+        future = coffee_writer.submit(coffee)
+    except CoffeeError as e:
+        send_ack(websocket, request_id, [{"ok": False, "error": str(e)}], received)
+        return
+    
+    def acknowledge(done):
+        if websocket in connected_clients.clients:
+            status = done.result()
+            send_ack(websocket, request_id, [{"ok": status != "failed", "status": status}], received)
+    future.add_done_callback(acknowledge)
+
+# Worker: Kaffee an den Besitzer weiterleiten, das ack kommt mit dessen Ergebnis (receive_coffee_ack).
+# Antwortet der Besitzer nicht rechtzeitig, bekommt der Client ok=false und kann erneut senden (id ist dedupliziert).
+async def forward_coffee(websocket, coffee, request_id, received):
+    ticket = uuid.uuid4().hex
+    timer = asyncio.get_running_loop().call_later(
+        FORWARDED_COFFEE_TIMEOUT, resolve_forwarded_coffee, ticket, {"ok": False, "error": "no answer from owner process"}
+    )
+    forwarded_coffees[ticket] = (websocket, request_id, received, timer)
+    try:
+        await cluster["pubsub"].publish("commands", {"coffee": coffee, "ticket": ticket})
+    except Exception as e:
+        print(f"Error forwarding coffee: {e}")
+        resolve_forwarded_coffee(ticket, {"ok": False, "error": "forwarding failed"})
+
+def resolve_forwarded_coffee(ticket, result):
+    entry = forwarded_coffees.pop(ticket, None)
+    if entry is None:
+        return
+    websocket, request_id, received, timer = entry
+    timer.cancel()
+    if websocket in connected_clients.clients:
+        send_ack(websocket, request_id, [result], received)
+
+# Befehl an den MachineSupervisor der Maschine geben, zurückgegeben wird das Future der Operation
+def execute_command(machine, command):
+    supervisor = machine.supervisor
+    machine.state["last_activity"] = clock.now()
+    name = command["command"]
+    
+    if name == "brew":
+        coffee_type, amount = command["coffee_type"], command["amount"]
+        return supervisor.submit(
+            f"Brew:{coffee_type}:{amount}", lambda: simulate_coffee_brewing(machine, coffee_type, amount)
+        )
+    if name == "heat_up":
+        return supervisor.submit("HeatUp", lambda: simulate_heating(machine))
+    if name == "cool_down":
+        return supervisor.submit("CoolDown", lambda: simulate_cooling(machine))
+    if name == "water_fill_up":
+        return supervisor.submit(
+            "WaterFillUp", lambda: update_step(machine, "Waiting", 0, water_ok=True, cups_since_filled=0), preempt=False
+        )
+    if name == "ground_clearing":
+        return supervisor.submit(
+            "GroundClearing", lambda: update_step(machine, "Waiting", 0, grounds_ok=True, cups_since_empty=0), preempt=False
+        )
+    return None
 
-coffee_types = {
-    "Normal": {"grinding_steps": 6, "press_steps": 5, "rest_steps1":3 , "moisting_steps": 2, "rest_steps2":4, "brewing_steps": 14, "toStart_steps": 4},
-    "Espresso": {"grinding_steps": 6, "press_steps": 5,"rest_steps1":3, "moisting_steps": 2, "rest_steps2":4, "brewing_steps": 10, "toStart_steps": 4}
-}
+# Im Besitzer-Prozess direkt ausführen, in Workern an den Besitzer weiterleiten (dann ohne Future)
+async def dispatch_command(machine, command):
+    if cluster["is_owner"]:
+        return execute_command(machine, command)
+    await cluster["pubsub"].publish("commands", {"machine_id": machine.machine_id, "command": command})
+    return None
+
+# {"type": "command", ...} oder {"type": "batch", "commands": [...]} ausführen und bestätigen.
+# Mit "wait": true kommt die Bestätigung erst, wenn alle Operationen beendet sind.
+async def handle_command_request(websocket, data, received):
+    request_id = data.get('request_id')
+    
+    if data.get('type') == 'batch':
+        entries = data.get('commands')
+        if not isinstance(entries, list) or not entries or len(entries) > MAX_BATCH_SIZE:
+            send_ack(websocket, request_id, [{"ok": False, "error": f"commands must be a list of 1 to {MAX_BATCH_SIZE} commands"}], received)
+            return
+    else:
+        entries = [data]
+    
+    results = []
+    futures = []
+    for entry in entries:
+        future = None
+        try:
+            if not isinstance(entry, dict):
+                raise CommandError("command must be an object")
+            command = parse_command(entry, recipe_book)
+            machine_id = entry.get('machine_id', data.get('machine_id'))
+            if machine_id is not None and not isinstance(machine_id, str):
+                raise CommandError("machine_id must be a string")
+            if machine_id is not None and machine_id not in machines:
+                raise CommandError(f"unknown machine: {machine_id}")
+            machine = get_target_machine(websocket, {"machine_id": machine_id})
+            if not machine:
+                raise CommandError("no machine subscribed")
+            future = await dispatch_command(machine, command)
+            results.append({"ok": True, "status": "accepted" if future else "forwarded"})
+        except CommandError as e:
+            results.append({"ok": False, "error": str(e)})
+        futures.append(future)
+    
+    if data.get('wait') and any(futures):
+        background_tasks.spawn(send_ack_when_done(websocket, request_id, results, futures, received), "ack")
+    else:
+        send_ack(websocket, request_id, results, received, batch=data.get('type') == 'batch')
+
+async def send_ack_when_done(websocket, request_id, results, futures, received):
+    for result, future in zip(results, futures):
+        if future:
+            result["status"] = operation_status(await future)
+            result["ok"] = result["status"] == "completed"
+    if websocket in connected_clients.clients:
+        send_ack(websocket, request_id, results, received, batch=len(results) > 1)
+
+def send_ack(websocket, request_id, results, received, batch=False):
+    ack = {"type": "ack", "request_id": request_id}
+    if batch:
+        ack["ok"] = all(result["ok"] for result in results)
+        ack["results"] = results
+    else:
+        ack.update(results[0])
+    ack["timing"] = {"server_ms": round((time.perf_counter() - received) * 1000, 3)}
+    connected_clients.send_to(websocket, ack, "ack")
 
 # WebSocket Handler
 async def handler(websocket):
-    connected_clients.add(websocket)
-    await send_current_status(websocket)
+    # Format über das WebSocket-Subprotokoll aushandeln, ohne Angabe wird JSON verwendet
+    connected_clients.add(websocket, get_codec(websocket.subprotocol))
+    # Ohne subscribe-Nachricht ist die erste Maschine abonniert (altes Frontend)
+    await subscribe_machines(websocket, [DEFAULT_MACHINE_ID])
+    # Alte Textbefehle werden pro Verbindung in strukturierte Befehle übersetzt
+    legacy_commands = LegacyCommandAdapter(recipe_book)
     
     try:
         async for message in websocket:
-            machine_state["last_activity"] = datetime.now()
+            received = time.perf_counter()
+            if isinstance(message, bytes):
+                try:
+                    data = connected_clients.get(websocket).codec.decode(message)
+                    if isinstance(data, dict):
+                        await handle_structured_message(websocket, data, received)
+                except Exception as e:
+                    print(f"Error decoding message: {e}")
+                continue
             
             if message.startswith('{'):
                 try:
                     data = json.loads(message)
-                    if all(key in data for key in ['id', 'type', 'strength', 'createdDate']):
-                        await save_coffee_to_history(data)
-                    continue
                 except json.JSONDecodeError:
-                    pass
+                    data = None
+                # Wie bei binären Nachrichten: ein fehlerhafter Befehl darf die Verbindung nicht beenden
+                if isinstance(data, dict):
+                    try:
+                        await handle_structured_message(websocket, data, received)
+                    except Exception as e:
+                        print(f"Error handling message: {e}")
+                    continue
             
-            if machine_state["input_state"] == "await_amount":
-                if message in ["1", "2"]:
-                    machine_state["current_amount"] = int(message)
-                    machine_state["input_state"] = "await_coffee_choice"
-                else:
-                    machine_state["input_state"] = "ready"
-                    
-            elif machine_state["input_state"] == "await_coffee_choice":
-                if message in coffee_types:
-                    asyncio.create_task(
-                        simulate_coffee_brewing(message, machine_state["current_amount"])
-                    )
-                machine_state["input_state"] = "ready"
-                
-            elif machine_state["input_state"] == "ready":
-                if message == "Brew":
-                    machine_state["input_state"] = "await_amount"
-                elif message == "HeatUp":
-                    asyncio.create_task(simulate_heating())
-                elif message == "CoolDown":
-                    asyncio.create_task(simulate_cooling())
-                elif message == "WaterFillUp":
-                    await update_step("Waiting", 0, water_ok=True, cups_since_filled=0)
-                elif message == "GroundClearing":
-                    await update_step("Waiting", 0, grounds_ok=True, cups_since_empty=0)
-                elif message == "History":
-                    await send_coffee_history_to_all()
-                else:
-                    current_status = await get_current_status()
-                    powered_on = current_status.get('powered_on', True) if current_status else True
-                    await update_step("Waiting", 0, powered_on=powered_on)
+            if message == "History":
+                await send_coffee_history(websocket)
+                continue
+            
+            # Unbekannte Texte und Zwischenschritte ("Brew", Anzahl) lösen keine Operation aus
+            command = legacy_commands.feed(message)
+            machine = get_target_machine(websocket)
+            if command and machine:
+                await dispatch_command(machine, command)
     
     except websockets.exceptions.ConnectionClosed:
         pass
     finally:
-        connected_clients.remove(websocket)
+        for machine_id in connected_clients.get(websocket).machine_ids:
+            machines[machine_id].unsubscribe(websocket)
+        await connected_clients.remove(websocket)
 
-# Start Status setzen
-async def initialize_status_once():
+# Start Status setzen: letzter Stand aus Snapshot und Ereignisprotokoll (EventLog.py), sonst Standardwerte
+async def initialize_status_once(machine):
     initial_status = {
         "temperature": 22,
         "water_ok": True,
@@ -448,30 +806,258 @@ async def initialize_status_once():
         "water_flow": 0,
         "powered_on": False,
         "current_step": "Waiting",
-        "last_updated": datetime.now(),
     }
-    await update_status_in_db(initial_status)
-    machine_state["last_activity"] = datetime.now()
-    machine_state["is_processing"] = False
-    machine_state["input_state"] = "ready"
-    machine_state["current_task"] = None
+    # Schlägt das Laden fehl, bricht der Start ab (main meldet "Error initializing"). Mit Standardwerten weiterzumachen
+    # würde den letzten Snapshot überschreiben und seq wieder bei 1 beginnen lassen, neue Ereignisse gingen als Duplikate verloren.
+    try:
+        recovered = await machine.event_log.recover()
+    except Exception as e:
+        raise RuntimeError(f"recovering status of {machine.machine_id} failed: {e}") from e
+    if recovered:
+        initial_status.update(recovered)
+        # Ein beim Beenden laufender Bezug oder Aufheizvorgang wird nach dem Neustart nicht fortgesetzt
+        initial_status.update(current_step="Waiting", water_flow=0, brew_id=None, recipe=None)
+    initial_status["last_updated"] = clock.now()
+    
+    await update_status_in_db(machine, initial_status)
+    machine.event_log.take_snapshot(machine.status_store.status)
+    machine.state["last_activity"] = clock.now()
+    machine.state["is_processing"] = False
+    machine.state["current_task"] = None
+    
+# Pub/Sub-Empfänger im Besitzer-Prozess: Befehle der Worker ausführen, neue Worker synchronisieren
+async def receive_command(event):
+    # Von einem Worker bereits geprüft, das Ergebnis geht nach dem Schreiben auf "coffee_ack" zurück
+    if 'coffee' in event:
+        ticket = event.get('ticket')
+        try:
+            future = coffee_writer.submit(event['coffee'])
+        except CoffeeError as e:
+            if ticket:
+                await cluster["pubsub"].publish("coffee_ack", {"ticket": ticket, "ok": False, "error": str(e)})
+            return
+        if ticket:
+            background_tasks.spawn(publish_coffee_ack(ticket, future), "coffee-ack")
+        return
+    
+    machine = machines.get(event.get('machine_id'))
+    if machine:
+        execute_command(machine, event['command'])
+
+async def publish_coffee_ack(ticket, future):
+    status = await future
+    await cluster["pubsub"].publish("coffee_ack", {"ticket": ticket, "ok": status != "failed", "status": status})
+
+async def receive_sync_request(event):
+    for machine in machines.values():
+        await cluster["pubsub"].publish("status", {
+            "machine_id": machine.machine_id,
+            "seq": machine.status_store.version,
+            "data": await get_current_status(machine)
+        })
+
+# Pub/Sub-Empfänger in den Workern: Status des Besitzers an die eigenen Clients weitergeben
+async def receive_remote_status(event):
+    machine = machines.get(event.get('machine_id'))
+    if machine and event['seq'] != machine.last_broadcast["seq"]:
+        send_status_frame(machine, event['data'], event['seq'])
+
+async def receive_coffee_ack(event):
+    result = {"ok": event.get('ok', False)}
+    result.update({key: event[key] for key in ("status", "error") if key in event})
+    resolve_forwarded_coffee(event.get('ticket'), result)
+
+async def receive_coffee_saved(event):
+    if statistics:
+        statistics.invalidate_coffee()
+
+async def request_sync(event):
+    await cluster["pubsub"].publish("sync", {})
+
+# Werte für den Metrik-Endpunkt. Damit lässt sich unterscheiden, ob ein langsamer Takt an der Datenbank
+# (storage_write), am Kodieren (encode) oder am Verteilen an die Clients (broadcast_status, Warteschlangen) liegt.
+def collect_backend_metrics():
+    status_writes = LagHistogram(CALL_BUCKETS_MS)
+    event_writes = LagHistogram(CALL_BUCKETS_MS)
+    for machine in machines.values():
+        status_writes.add(machine.status_store.write_time)
+        event_writes.add(machine.event_log.write_time)
+    queued, longest_queue = connected_clients.queue_depths()
+    frames = connected_clients.stats
+    scheduler = tick_scheduler.snapshot()
+    
+    return [
+        ("connected_clients", "gauge", "Verbundene WebSocket-Clients", [({}, len(connected_clients))]),
+        ("outbound_queue_messages", "gauge", "Noch nicht gesendete Nachrichten aller Clients", [({}, queued)]),
+        ("outbound_queue_max", "gauge", "Längste Sende-Warteschlange eines Clients", [({}, longest_queue)]),
+        ("frames_sent_total", "counter", "Gesendete Frames", [({}, frames["frames_sent"])]),
+        ("bytes_sent_total", "counter", "Gesendete Bytes", [({}, frames["bytes_sent"])]),
+        ("frames_coalesced_total", "counter", "Durch neuere Status-Frames ersetzte Frames", [({}, frames["coalesced"])]),
+        ("frames_dropped_total", "counter", "Wegen voller Warteschlange verworfene Frames", [({}, frames["dropped"])]),
+        ("encode_duration_seconds", "histogram", "Dauer des Kodierens einer Nachricht",
+         [({}, connected_clients.encode_time)]),
+        ("storage_write_duration_seconds", "histogram", "Dauer der Schreibvorgänge in den Speicher",
+         [({"target": "status"}, status_writes), ({"target": "status_history"}, history_writer.write_time),
+          ({"target": "coffee_history"}, coffee_writer.write_time), ({"target": "machine_events"}, event_writes)]),
+        ("history_queue_messages", "gauge", "Snapshots in der Warteschlange des HistoryWriters",
+         [({}, history_writer.pending())]),
+        ("history_dropped_total", "counter", "Verworfene Snapshots der StatusHistory",
+         [({}, history_writer.stats["dropped"])]),
+        ("machine_events_total", "counter", "Aufgezeichnete Zustandsänderungen",
+         [({"machine": machine.machine_id}, machine.event_log.stats["recorded"]) for machine in machines.values()]),
+        ("recovery_replayed_events", "gauge", "Beim Start nach dem Snapshot abgespielte Ereignisse",
+         [({"machine": machine.machine_id}, machine.event_log.recovery["replayed"])
+          for machine in machines.values() if machine.event_log.recovery]),
+        ("coffee_queue_messages", "gauge", "Kaffees in der Warteschlange des CoffeeWriters", [({}, coffee_writer.pending())]),
+        ("coffees_total", "counter", "Eingesendete Kaffees nach Ergebnis",
+         [({"result": result}, count) for result, count in coffee_writer.stats.items() if result != "queued"]),
+        ("tick_lag_seconds", "histogram", "Verspätung der Ticks gegenüber ihrer Deadline", [({}, tick_scheduler.lag)]),
+        ("ticks_skipped_total", "counter", "Übersprungene Ticks", [({}, scheduler["skipped"])]),
+        ("pending_operations", "gauge", "Wartende Operationen aller Maschinen",
+         [({}, sum(len(machine.supervisor.pending) for machine in machines.values()))]),
+    ]
+
+metrics.add_collector(collect_backend_metrics)
+
+# Metrik-Endpunkt (nur lokal) und optionales Protokoll starten, port=0 schaltet den Endpunkt ab
+async def start_metrics(port, log_interval):
+    metrics.start(log_interval)
+    if not port:
+        return None
+    try:
+        return await metrics.serve(port)
+    except OSError as e:
+        print(f"Error starting metrics endpoint on port {port}: {e}")
+        return None
+
+async def stop_metrics(server):
+    if server:
+        server.close()
+        await server.wait_closed()
+    await metrics.stop()
+
+def create_pubsub(kind, is_hub):
+    if kind == "mongo":
+        return MongoPubSub(database)
+    return SocketPubSub(is_hub=is_hub)
+
+# Mehrere Prozesse teilen sich den Port (SO_REUSEPORT, nur Linux/BSD), sonst bekommt jeder Worker einen eigenen Port
+def get_serve_options(port, worker_index, separate_ports):
+    if separate_ports:
+        return {"port": port + worker_index}
+    return {"port": port, "reuse_port": True}
+
+async def serve_clients(port, worker_index=0, separate_ports=False, shared=False):
+    options = get_serve_options(port, worker_index, separate_ports) if shared else {"port": port}
+    async with websockets.serve(handler, "localhost", select_subprotocol=select_subprotocol, **options):
+        await asyncio.Future()
+
+# Worker-Prozess: nur WebSocket-Clients bedienen, Status kommt vom Besitzer
+async def worker_main(worker_index, pubsub_kind, port, separate_ports, metrics_port=0, metrics_log_interval=0):
+    cluster["is_owner"] = False
+    pubsub = create_pubsub(pubsub_kind, is_hub=False)
+    pubsub.subscribe("status", receive_remote_status)
+    pubsub.subscribe("coffee_saved", receive_coffee_saved)
+    pubsub.subscribe("coffee_ack", receive_coffee_ack)
+    pubsub.subscribe("connected", request_sync)
+    cluster["pubsub"] = pubsub
+    await pubsub.start()
     
+    background_tasks.spawn(send_heartbeats(), "heartbeats")
+    # Jeder Worker hat seinen eigenen Metrik-Port (metrics_port + Index)
+    metrics_server = await start_metrics(metrics_port + worker_index if metrics_port else 0, metrics_log_interval)
+    try:
+        await serve_clients(port, worker_index, separate_ports, shared=True)
+    finally:
+        await stop_metrics(metrics_server)
+        await pubsub.stop()
+        await background_tasks.stop()
+
+def run_worker(worker_index, pubsub_kind, port, separate_ports, metrics_port, metrics_log_interval):
+    asyncio.run(worker_main(worker_index, pubsub_kind, port, separate_ports, metrics_port, metrics_log_interval))
+
+def start_workers(workers, pubsub_kind, port, separate_ports, metrics_port=0, metrics_log_interval=0):
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for worker_index in range(1, workers):
+        process = context.Process(
+            target=run_worker,
+            args=(worker_index, pubsub_kind, port, separate_ports, metrics_port, metrics_log_interval),
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
 # Main
-async def main():
+async def main(workers=1, pubsub_kind="socket", port=8765, separate_ports=False, metrics_port=9108, metrics_log_interval=0):
     try:
-        await database.command('ping')
-        await initialize_status_once()
+        await storage.ping()
+        await storage.ensure_indexes()
+        if database is not None:
+            await recipe_book.load_collection(database.Recipes)
+        for machine in machines.values():
+            await initialize_status_once(machine)
         
         # Hintergrund Funktionen
-        asyncio.create_task(check_auto_standby())
-        asyncio.create_task(continuous_waiting_broadcast())
+        background_tasks.spawn(check_auto_standby(), "auto-standby")
+        background_tasks.spawn(send_heartbeats(), "heartbeats")
+        for machine in machines.values():
+            machine.push_task = background_tasks.spawn(push_status_changes(machine), f"push-{machine.machine_id}")
+        
+        if workers > 1:
+            pubsub = create_pubsub(pubsub_kind, is_hub=True)
+            pubsub.subscribe("commands", receive_command)
+            pubsub.subscribe("sync", receive_sync_request)
+            cluster["pubsub"] = pubsub
+            await pubsub.start()
+            start_workers(workers, pubsub_kind, port, separate_ports, metrics_port, metrics_log_interval)
         
     except Exception as e:
         print(f"Error initializing: {e}")
         return
     
-    async with websockets.serve(handler, "localhost", 8765):
-        await asyncio.Future()
+    for machine in machines.values():
+        machine.status_store.start()
+        machine.event_log.start()
+    history_writer.start()
+    coffee_writer.start()
+    if history_retention:
+        history_retention.start()
+    metrics_server = await start_metrics(metrics_port, metrics_log_interval)
+    try:
+        await serve_clients(port, 0, separate_ports, shared=workers > 1)
+    finally:
+        await stop_metrics(metrics_server)
+        if cluster["pubsub"]:
+            await cluster["pubsub"].stop()
+        for machine in machines.values():
+            await machine.supervisor.stop()
+        await background_tasks.stop()
+        for machine in machines.values():
+            await machine.status_store.stop()
+            await machine.event_log.stop()
+        await history_writer.stop()
+        await coffee_writer.stop()
+        if history_retention:
+            await history_retention.stop()
+        await tick_scheduler.stop()
+        await storage.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Kaffeemaschinen-Backend")
+    parser.add_argument("--workers", type=int, default=1, help="Anzahl Prozesse, die WebSocket-Clients bedienen")
+    parser.add_argument("--pubsub", choices=["socket", "mongo"], default="socket")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--separate-ports", action="store_true", default=sys.platform == "win32",
+                        help="Jeder Worker auf eigenem Port (port + Index), z.B. hinter einem Load Balancer")
+    parser.add_argument("--metrics-port", type=int, default=9108,
+                        help="Port für GET /metrics auf 127.0.0.1 (Worker: Port + Index), 0 = aus")
+    parser.add_argument("--metrics-log-interval", type=float, default=0,
+                        help="Alle N Sekunden eine Zusammenfassung der Metriken ausgeben, 0 = aus")
+    add_clock_arguments(parser)
+    args = parser.parse_args()
+    if args.pubsub == "mongo" and database is None:
+        parser.error("--pubsub mongo braucht MongoDB (DATABASE_URL=mongodb://...)")
+    set_clock(create_clock(args.clock, args.speed))
+    asyncio.run(main(args.workers, args.pubsub, args.port, args.separate_ports, args.metrics_port, args.metrics_log_interval))
\ No newline at end of file
@@ -0,0 +1,69 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+from Codecs import CODECS
+
+# Vergleicht Kodierzeit und Frame-Größe der verfügbaren Formate (JSON, MessagePack, CBOR)
+
+
+def status_payload():
+    return {
+        "type": "status",
+        "seq": 1234,
+        "data": {
+            "temperature": 93.4,
+            "water_ok": True,
+            "grounds_ok": True,
+            "cups_since_empty": 1,
+            "cups_since_filled": 3,
+            "water_flow": 5,
+            "powered_on": True,
+            "current_step": "Brew",
+            "last_updated": datetime.now().isoformat(),
+        },
+    }
+
+
+def history_payload(entries=100):
+    start = datetime(2026, 1, 1, 8, 0)
+    return {
+        "type": "coffee_history",
+        "data": [
+            {
+                "_id": f"65f1c0d2a1b2c3d4e5f6{index:04d}",
+                "id": 1767254400000 + index,
+                "type": "Espresso" if index % 3 == 0 else "Normal",
+                "strength": index % 5 + 1,
+                "createdDate": (start + timedelta(minutes=17 * index)).isoformat(),
+            }
+            for index in range(entries)
+        ],
+    }
+
+
+def measure(codec, message, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        payload = codec.encode(message)
+    duration = time.perf_counter() - started
+    return duration / iterations, len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark der Nachrichtenformate")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    payloads = [
+        ("status", status_payload(), args.iterations),
+        ("history (100)", history_payload(100), max(1, args.iterations // 50)),
+    ]
+
+    print(f"{'Nachricht':<15} {'Format':<8} {'Kodieren':>12} {'Größe':>10}")
+    for label, message, iterations in payloads:
+        for name, codec in CODECS.items():
+            seconds, size = measure(codec, message, iterations)
+            print(f"{label:<15} {name:<8} {seconds * 1e6:>9.2f} µs {size:>8} B")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import os
+import time
+
+# Ohne Datenbank: Status und Ereignisprotokoll im Speicher (muss vor dem Import des Backends gesetzt sein)
+os.environ.setdefault("DATABASE_URL", "memory")
+
+import BackendWithWebSocketAndDatabaseInAndOut as backend
+from Clock import add_clock_arguments, create_clock
+from Machine import Machine
+
+# Lässt viele Maschinen gleichzeitig einen Kaffee brühen und misst, wie stark die Event-Loop verzögert.
+# Status und Historie werden dabei nur im Speicher gehalten (die Hintergrund-Tasks zum Schreiben laufen nicht).
+
+
+class NullWebSocket:
+    def __init__(self):
+        self.frames = 0
+
+    async def send(self, message, text=False):
+        self.frames += 1
+
+
+# Misst alle interval Sekunden, wie viel später als geplant die Event-Loop den Task wieder aufweckt
+async def measure_loop_lag(lags, interval=0.05):
+    while True:
+        planned = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - planned)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(machine_count, clients_per_machine, coffee_type):
+    backend.machines.clear()
+    for index in range(machine_count):
+        machine_id = f"bench-{index + 1}"
+        machine = Machine(machine_id, backend.storage, backend.clock)
+        backend.machines[machine_id] = machine
+        await backend.initialize_status_once(machine)
+        await backend.update_step(machine, "Waiting", 0, powered_on=True, temperature=94)
+        machine.push_task = asyncio.create_task(backend.push_status_changes(machine))
+
+    clients = []
+    for machine in backend.machines.values():
+        for _ in range(clients_per_machine):
+            websocket = NullWebSocket()
+            backend.connected_clients.add(websocket)
+            backend.connected_clients.get(websocket).machine_ids = [machine.machine_id]
+            machine.subscribe(websocket)
+            clients.append(websocket)
+
+    lags = []
+    lag_task = asyncio.create_task(measure_loop_lag(lags))
+
+    started = time.perf_counter()
+    simulated_started = backend.clock.monotonic()
+    results = await asyncio.gather(*[
+        backend.simulate_coffee_brewing(machine, coffee_type, 1)
+        for machine in backend.machines.values()
+    ])
+    duration = time.perf_counter() - started
+    simulated_duration = backend.clock.monotonic() - simulated_started
+
+    lag_task.cancel()
+    await backend.tick_scheduler.stop()
+    for machine in backend.machines.values():
+        machine.push_task.cancel()
+    for websocket in clients:
+        await backend.connected_clients.remove(websocket)
+
+    ideal = len(backend.recipe_book.get_timeline(coffee_type, 1))
+    frames = sum(websocket.frames for websocket in clients)
+    scheduler = backend.tick_scheduler.snapshot()
+
+    print(f"Maschinen:          {machine_count} ({sum(results)} Bezüge erfolgreich)")
+    print(f"Clients:            {len(clients)}")
+    print(f"Dauer:              {duration:.1f} s")
+    print(f"Simulierte Dauer:   {simulated_duration:.1f} s (ideal {ideal} s)")
+    print(f"Tick-Verzögerung:   p50 ≤ {scheduler['lag']['p50_ms']} ms   p99 ≤ {scheduler['lag']['p99_ms']} ms"
+          f"   max {scheduler['lag']['max_ms']:.1f} ms   übersprungen {scheduler['skipped']}")
+    print(f"Gesendete Frames:   {frames} ({frames / duration:.0f}/s)")
+    # Mit virtueller Uhr ist der Lauf oft kürzer als ein Messintervall
+    if not lags:
+        return
+    print(f"Loop-Verzögerung:   p50 {percentile(lags, 50) * 1000:.1f} ms"
+          f"   p99 {percentile(lags, 99) * 1000:.1f} ms   max {max(lags) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark für viele gleichzeitig brühende Maschinen")
+    parser.add_argument("--machines", type=int, default=200)
+    parser.add_argument("--clients-per-machine", type=int, default=2)
+    parser.add_argument("--coffee-type", default="Espresso", choices=list(backend.recipe_book))
+    add_clock_arguments(parser)
+    args = parser.parse_args()
+
+    backend.set_clock(create_clock(args.clock, args.speed))
+    asyncio.run(run(args.machines, args.clients_per_machine, args.coffee_type))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import asyncio
+import argparse
+import time
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Vergleicht das alte Speichern (delete_many + insert_one) mit dem Upsert einzelner Felder
+DATABASE_URL = "mongodb://localhost:27017"
+MACHINE_ID = "machine-1"
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def initial_status():
+    return {
+        "temperature": 22,
+        "water_ok": True,
+        "grounds_ok": True,
+        "cups_since_empty": 0,
+        "cups_since_filled": 0,
+        "water_flow": 0,
+        "powered_on": True,
+        "current_step": "HeatUp",
+        "last_updated": datetime.now(),
+    }
+
+
+# Bisheriger Weg: Collection leeren und komplettes Dokument neu einfügen
+async def write_delete_insert(collection, status, changes):
+    status.update(changes)
+    await collection.delete_many({})
+    await collection.insert_one(status.copy())
+
+
+# Neuer Weg: ein Dokument pro Maschine, nur geänderte Felder per $set
+async def write_upsert(collection, status, changes):
+    status.update(changes)
+    await collection.update_one({"_id": MACHINE_ID}, {"$set": changes}, upsert=True)
+
+
+async def run(name, collection, write, iterations):
+    await collection.delete_many({})
+    status = initial_status()
+    latencies = []
+
+    started = time.perf_counter()
+    for tick in range(iterations):
+        changes = {"temperature": round(22 + tick * 0.1, 1), "last_updated": datetime.now()}
+        begin = time.perf_counter()
+        await write(collection, status, changes)
+        latencies.append(time.perf_counter() - begin)
+    duration = time.perf_counter() - started
+
+    print(
+        f"{name:<22} {iterations / duration:>10.1f} ops/s"
+        f"   p50 {percentile(latencies, 50) * 1000:>7.3f} ms"
+        f"   p99 {percentile(latencies, 99) * 1000:>7.3f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark für das Speichern des Maschinenstatus")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--url", default=DATABASE_URL)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.url)
+    database = client.Kaffeemaschine_Benchmark
+    collection = database.Status
+
+    try:
+        await database.command('ping')
+        await run("delete_many+insert_one", collection, write_delete_insert, args.iterations)
+        await run("update_one $set upsert", collection, write_upsert, args.iterations)
+    finally:
+        await client.drop_database("Kaffeemaschine_Benchmark")
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
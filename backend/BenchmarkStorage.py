@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import BackendWithWebSocketAndDatabaseInAndOut as backend
+from Clock import VirtualClock
+from CoffeeWriter import CoffeeWriter
+from HistoryWriter import HistoryWriter
+from Machine import Machine
+from Storage import MemoryStorage, MotorStorage, SqliteStorage
+
+# Vergleicht die Speicher aus Storage.py Ende-zu-Ende: viele Maschinen brühen mit virtueller Uhr so schnell
+# wie möglich, StatusStore und HistoryWriter schreiben wie im Backend im Hintergrund. Gemessen wird, wie
+# viele Status-Ticks pro Sekunde inklusive Schreiben verarbeitet werden und wie lange Lesezugriffe dauern.
+BACKENDS = ["memory", "sqlite", "mongomock", "mongo"]
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def open_storage(name, url, sqlite_path):
+    if name == "memory":
+        return MemoryStorage()
+    if name == "sqlite":
+        return SqliteStorage(sqlite_path)
+    if name == "mongomock":
+        from mongomock_motor import AsyncMongoMockClient
+        return MotorStorage(AsyncMongoMockClient().Kaffeemaschine_Benchmark)
+    from motor.motor_asyncio import AsyncIOMotorClient
+    return MotorStorage(AsyncIOMotorClient(url).Kaffeemaschine_Benchmark)
+
+
+async def cleanup_storage(storage):
+    if storage.database is not None:
+        await storage.database.client.drop_database("Kaffeemaschine_Benchmark")
+    await storage.close()
+
+
+async def brew_round(coffee_type):
+    machines = list(backend.machines.values())
+    # Wasser auffüllen und Kaffeesatz leeren, damit jeder Bezug startet
+    for machine in machines:
+        await backend.update_step(
+            machine, "Waiting", 0, powered_on=True, temperature=94, water_ok=True, grounds_ok=True,
+            cups_since_filled=0, cups_since_empty=0
+        )
+    results = await asyncio.gather(*[
+        backend.simulate_coffee_brewing(machine, coffee_type, 1) for machine in machines
+    ])
+    # Gleichzeitig einreichen, der CoffeeWriter schreibt sie gebündelt
+    await asyncio.gather(*[
+        backend.save_coffee_to_history({
+            "id": f"{machine.machine_id}-{time.perf_counter_ns()}",
+            "type": coffee_type,
+            "strength": 3,
+            "createdDate": backend.clock.now().isoformat(),
+            "machine_id": machine.machine_id,
+        })
+        for machine, brewed in zip(machines, results) if brewed
+    ])
+    return sum(results)
+
+
+async def measure_reads(storage, reads):
+    recent = []
+    for _ in range(reads):
+        begin = time.perf_counter()
+        await storage.recent_coffees(100)
+        recent.append(time.perf_counter() - begin)
+
+    pages = []
+    for _ in range(reads):
+        begin = time.perf_counter()
+        cursor = storage.find_coffees({"coffee_type": "Espresso"}, 50)
+        async for _ in cursor:
+            pass
+        pages.append(time.perf_counter() - begin)
+    return recent, pages
+
+
+async def run(name, storage, machine_count, rounds, coffee_type, reads):
+    await storage.ping()
+    await storage.ensure_indexes()
+
+    # Das Backend schreibt über diese Globals, sie werden für jeden Speicher neu gesetzt
+    backend.storage = storage
+    backend.history_writer = HistoryWriter(storage)
+    backend.coffee_writer = CoffeeWriter(storage)
+    backend.set_clock(VirtualClock())
+    backend.machines.clear()
+    for index in range(machine_count):
+        machine_id = f"bench-{index + 1}"
+        machine = Machine(machine_id, storage, backend.clock)
+        backend.machines[machine_id] = machine
+        await backend.initialize_status_once(machine)
+        machine.status_store.start()
+        machine.event_log.start()
+    backend.history_writer.start()
+    backend.coffee_writer.start()
+
+    started = time.perf_counter()
+    brews = 0
+    for _ in range(rounds):
+        brews += await brew_round(coffee_type)
+    simulated = time.perf_counter()
+
+    # Was noch in den Warteschlangen liegt, zählt zur Laufzeit
+    for machine in backend.machines.values():
+        await machine.status_store.stop()
+        await machine.event_log.stop()
+    await backend.history_writer.stop()
+    await backend.coffee_writer.stop()
+    await backend.tick_scheduler.stop()
+    finished = time.perf_counter()
+
+    recent, pages = await measure_reads(storage, reads)
+    stats = backend.history_writer.stats
+    duration = finished - started
+
+    print(f"{name}")
+    print(f"  Bezüge:             {brews} von {machine_count * rounds}")
+    print(f"  Status-Ticks:       {stats['queued']} ({stats['queued'] / duration:.0f}/s inkl. Schreiben)")
+    print(f"  Dauer:              {duration:.2f} s (davon {finished - simulated:.2f} s Restschreiben)")
+    print(f"  StatusHistory:      {stats['flushed']} geschrieben, {stats['dropped']} verworfen")
+    print(f"  Neueste 100:        p50 {percentile(recent, 50) * 1000:.2f} ms   p99 {percentile(recent, 99) * 1000:.2f} ms")
+    print(f"  Gefilterte Seiten:  p50 {percentile(pages, 50) * 1000:.2f} ms   p99 {percentile(pages, 99) * 1000:.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark der Speicher für Status und Historie")
+    parser.add_argument("--backends", default="memory,sqlite,mongomock",
+                        help=f"Kommagetrennt, Auswahl aus {', '.join(BACKENDS)}")
+    parser.add_argument("--machines", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3, help="Bezüge pro Maschine")
+    parser.add_argument("--coffee-type", default="Espresso", choices=list(backend.recipe_book))
+    parser.add_argument("--reads", type=int, default=50)
+    parser.add_argument("--url", default="mongodb://localhost:27017", help="MongoDB für das Backend mongo")
+    args = parser.parse_args()
+
+    names = args.backends.split(",")
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown:
+        parser.error(f"unbekannte Backends: {', '.join(unknown)}")
+
+    print(f"{args.machines} Maschinen, {args.rounds} Bezüge je Maschine ({args.coffee_type}), {datetime.now():%H:%M:%S}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names:
+            try:
+                storage = open_storage(name, args.url, os.path.join(directory, "benchmark.db"))
+            except ImportError as e:
+                print(f"{name}: übersprungen ({e})")
+                continue
+            try:
+                await run(name, storage, args.machines, args.rounds, args.coffee_type, args.reads)
+            except Exception as e:
+                print(f"Error benchmarking {name}: {e}")
+            finally:
+                await cleanup_storage(storage)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+# Ohne Datenbank: alle Szenarien laufen gegen MemoryStorage (muss vor dem Import des Backends gesetzt sein)
+os.environ["DATABASE_URL"] = "memory"
+
+import BackendWithWebSocketAndDatabaseInAndOut as backend
+from Clock import VirtualClock
+from CoffeeWriter import parse_coffee
+from Machine import Machine
+
+# Wiederholbare Messungen der Tick- und Broadcast-Pipeline. Jedes Szenario liefert Sekunden pro Operation
+# (schnellster von --repeats Durchläufen, wie bei timeit: langsamere Durchläufe messen vor allem Störungen). Mit --save wird eine Baseline geschrieben, mit --compare wird
+# gegen eine Baseline verglichen und bei einer Verschlechterung über --tolerance mit Exit-Code 1 beendet.
+# Eine feste Referenzrechnung (calibrate) gleicht unterschiedlich schnelle Rechner bzw. Taktraten aus.
+FANOUT_CLIENTS = [1, 10, 100, 1000]
+HISTORY_SIZES = [100, 1000, 10000]
+# Gleichzeitig eingesendete Kaffees pro Durchlauf (z.B. viele Kiosk-Clients)
+INGEST_BURST = 100
+
+
+class NullWebSocket:
+    async def send(self, message, text=False):
+        pass
+
+
+# Sekunden pro Aufruf von operation, schnellster von repeats Durchläufen mit je iterations Aufrufen
+# Die Garbage Collection ist wie bei timeit während der Messung abgeschaltet
+async def measure(operation, iterations, repeats):
+    # Aufwärmen
+    await operation()
+    samples = []
+    for _ in range(repeats):
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            for _ in range(iterations):
+                await operation()
+            samples.append((time.perf_counter() - started) / iterations)
+        finally:
+            gc.enable()
+    return min(samples)
+
+
+# Reine Python-Rechnung ohne Backend-Code, Sekunden pro Durchlauf
+def calibrate(repeats, iterations=2000):
+    status = {"temperature": 94, "current_step": "Brew", "water_flow": 5, "powered_on": True}
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for index in range(iterations):
+            status["temperature"] = index
+            json.dumps(status)
+            sum(value * value for value in range(50))
+        samples.append((time.perf_counter() - started) / iterations)
+    return min(samples)
+
+
+async def create_machines(count):
+    for machine in backend.machines.values():
+        for websocket in list(machine.subscribers):
+            await backend.connected_clients.remove(websocket)
+    backend.machines.clear()
+    for index in range(count):
+        machine_id = f"bench-{index + 1}"
+        machine = Machine(machine_id, backend.storage, backend.clock)
+        backend.machines[machine_id] = machine
+        await backend.initialize_status_once(machine)
+    backend.history_writer.queue.clear()
+    return list(backend.machines.values())
+
+
+async def bench_update_step(iterations, repeats):
+    machine = (await create_machines(1))[0]
+    temperature = [20]
+
+    async def operation():
+        temperature[0] = temperature[0] % 95 + 1
+        await backend.update_step(machine, "HeatUp", 0, powered_on=True, temperature=temperature[0])
+        # Die Warteschlange des HistoryWriters soll nicht voll laufen (sonst misst man das Verwerfen)
+        backend.history_writer.queue.clear()
+    return {"update_step": await measure(operation, iterations, repeats)}
+
+
+async def bench_status_to_json(iterations, repeats):
+    machine = (await create_machines(1))[0]
+    status = await backend.get_current_status(machine)
+
+    async def operation():
+        await backend.status_to_json(status, 1, machine.machine_id)
+    return {"status_to_json": await measure(operation, iterations, repeats)}
+
+
+# Ein Broadcast inklusive Kodieren und Senden an alle Abonnenten (bis alle Warteschlangen leer sind)
+async def bench_broadcast_fanout(iterations, repeats):
+    results = {}
+    for client_count in FANOUT_CLIENTS:
+        machine = (await create_machines(1))[0]
+        clients = []
+        for _ in range(client_count):
+            websocket = NullWebSocket()
+            backend.connected_clients.add(websocket)
+            backend.connected_clients.get(websocket).machine_ids = [machine.machine_id]
+            machine.subscribe(websocket)
+            clients.append(websocket)
+        temperature = [20]
+
+        async def operation():
+            temperature[0] = temperature[0] % 95 + 1
+            machine.status_store.update(temperature=temperature[0])
+            await backend.broadcast_status(machine)
+            for websocket in clients:
+                await backend.connected_clients.drain(websocket)
+
+        # Große Fan-outs mit weniger Wiederholungen, damit der Lauf kurz bleibt
+        scaled_iterations = max(20, iterations // client_count)
+        results[f"broadcast_status[{client_count}]"] = await measure(operation, scaled_iterations, repeats)
+
+        for websocket in clients:
+            machine.unsubscribe(websocket)
+            await backend.connected_clients.remove(websocket)
+    return results
+
+
+def clear_coffee_history():
+    backend.storage.coffee_history.clear()
+    backend.storage.coffee_keys.clear()
+
+
+async def bench_coffee_history(iterations, repeats):
+    results = {}
+    for size in HISTORY_SIZES:
+        clear_coffee_history()
+        await backend.storage.insert_coffees([{
+            "id": index,
+            "type": "Espresso" if index % 2 else "Normal",
+            "strength": index % 5 + 1,
+            "createdDate": f"2024-01-01T00:00:00.{index:06d}",
+        } for index in range(size)])
+
+        async def operation():
+            await backend.get_coffee_history()
+        results[f"get_coffee_history[{size}]"] = await measure(operation, max(5, iterations // 100), repeats)
+    clear_coffee_history()
+    return results
+
+
+# Prüfen, Einreihen und gebündeltes Schreiben von INGEST_BURST Kaffees bis zum letzten ack; jede zweite id ist doppelt
+async def bench_coffee_ingest(iterations, repeats):
+    clear_coffee_history()
+    writer = backend.coffee_writer
+    writer.start()
+    counter = [0]
+
+    async def operation():
+        futures = []
+        for index in range(INGEST_BURST):
+            counter[0] += index % 2
+            coffee = parse_coffee({
+                "id": counter[0],
+                "type": "Espresso",
+                "strength": 3,
+                "createdDate": f"2024-01-01T00:00:00.{counter[0] % 1000000:06d}",
+            }, backend.recipe_book)
+            futures.append(writer.submit(coffee))
+        await asyncio.gather(*futures)
+
+    result = await measure(operation, max(5, iterations // 100), repeats)
+    await writer.stop()
+    clear_coffee_history()
+    return {f"coffee_ingest[{INGEST_BURST}]": result}
+
+
+# Kompletter Bezug auf vielen Maschinen mit virtueller Uhr: misst nur die Rechenzeit, nicht die simulierten Sekunden
+async def bench_brew_cycle(iterations, repeats, machine_count=20):
+    async def operation():
+        backend.set_clock(VirtualClock())
+        machines = await create_machines(machine_count)
+        for machine in machines:
+            await backend.update_step(machine, "Waiting", 0, powered_on=True, temperature=94)
+        results = await asyncio.gather(*[
+            backend.simulate_coffee_brewing(machine, "Espresso", 1) for machine in machines
+        ])
+        await backend.tick_scheduler.stop()
+        if not all(results):
+            raise RuntimeError("brew failed")
+    return {f"brew_cycle[{machine_count}]": await measure(operation, 1, repeats)}
+
+
+SCENARIOS = {
+    "update_step": bench_update_step,
+    "status_to_json": bench_status_to_json,
+    "broadcast_fanout": bench_broadcast_fanout,
+    "coffee_history": bench_coffee_history,
+    "coffee_ingest": bench_coffee_ingest,
+    "brew_cycle": bench_brew_cycle,
+}
+
+
+# Die Referenzrechnung läuft vor jedem Szenario, damit sie Taktänderungen während des Laufs mitbekommt
+async def run(names, iterations, repeats):
+    backend.set_clock(VirtualClock())
+    results = {}
+    calibrations = []
+    for name in names:
+        calibrations.append(calibrate(repeats))
+        results.update(await SCENARIOS[name](iterations, repeats))
+    await create_machines(0)
+    return results, min(calibrations)
+
+
+def format_time(seconds):
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} µs"
+
+
+# Vergleich mit der Baseline, gibt die Namen der verschlechterten Messungen zurück.
+# Faktor ist um die Geschwindigkeit des Rechners bereinigt (Verhältnis der Referenzrechnungen).
+def compare(results, calibration, baseline, tolerance):
+    speed = calibration / baseline["calibration"] if baseline.get("calibration") else 1
+    print(f"Referenzrechnung: {format_time(calibration)} (Baseline {format_time(calibration / speed)}, Faktor {speed:.2f})")
+    regressions = []
+    print(f"{'Messung':<32} {'Baseline':>12} {'Aktuell':>12} {'Faktor':>8}")
+    for name, seconds in results.items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            print(f"{name:<32} {'-':>12} {format_time(seconds):>12} {'neu':>8}")
+            continue
+        ratio = seconds / reference / speed if reference else float("inf")
+        marker = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            marker = "  langsamer"
+        print(f"{name:<32} {format_time(reference):>12} {format_time(seconds):>12} {ratio:>7.2f}x{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks der Tick- und Broadcast-Pipeline")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Kommagetrennt, Auswahl aus {', '.join(SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--save", help="Ergebnisse als Baseline in diese JSON-Datei schreiben")
+    parser.add_argument("--compare", help="Mit dieser Baseline vergleichen")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Erlaubte Verschlechterung beim Vergleich (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    names = args.scenarios.split(",")
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unbekannte Szenarien: {', '.join(unknown)}")
+
+    results, calibration = asyncio.run(run(names, args.iterations, args.repeats))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(results, calibration, baseline, args.tolerance)
+    else:
+        regressions = []
+        for name, seconds in results.items():
+            print(f"{name:<32} {format_time(seconds):>12}")
+
+    if args.save:
+        report = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "repeats": args.repeats,
+            "calibration": calibration,
+            "results": results,
+        }
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline gespeichert: {args.save}")
+
+    if regressions:
+        print(f"Verschlechtert (> {args.tolerance:.0%}): {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
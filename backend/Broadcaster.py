@@ -0,0 +1,173 @@
+import asyncio
+import time
+from collections import deque
+from websockets.exceptions import ConnectionClosed
+from Codecs import JSON_CODEC
+from TickScheduler import LagHistogram
+
+# Buckets für die Kodierzeit einer Nachricht in Millisekunden
+ENCODE_BUCKETS_MS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 50]
+
+
+# Verbindung eines Clients mit eigener Warteschlange und eigenem Sende-Task
+class ClientConnection:
+    def __init__(self, websocket, max_queue_size=64, codec=JSON_CODEC, totals=None):
+        self.websocket = websocket
+        self.codec = codec
+        self.max_queue_size = max_queue_size
+        self.queue = deque()
+        # Noch nicht gesendete Status-Frames pro Maschine, werden von neueren Status-Frames ersetzt
+        self.pending_status = {}
+        self.has_messages = asyncio.Event()
+        self.queue_empty = asyncio.Event()
+        self.queue_empty.set()
+        self.closed = False
+        # Client hat per hello-Nachricht Delta-Frames angefordert
+        self.delta = False
+        # Abonnierte Maschinen, Befehle ohne machine_id gehen an die erste
+        self.machine_ids = []
+        self.stats = {"sent": 0, "coalesced": 0, "dropped": 0}
+        # Gemeinsame Zähler aller Verbindungen (bleiben nach dem Schließen erhalten)
+        self.totals = totals if totals is not None else {"frames_sent": 0, "bytes_sent": 0, "coalesced": 0, "dropped": 0}
+        self.writer_task = asyncio.create_task(self.writer_loop())
+
+    def enqueue(self, payload, kind, key=None):
+        if self.closed:
+            return
+
+        if kind == "status" and key in self.pending_status:
+            self.pending_status[key][1] = payload
+            self.stats["coalesced"] += 1
+            self.totals["coalesced"] += 1
+            return
+
+        if len(self.queue) >= self.max_queue_size:
+            dropped = self.queue.popleft()
+            if dropped[0] == "status" and self.pending_status.get(dropped[2]) is dropped:
+                del self.pending_status[dropped[2]]
+            self.stats["dropped"] += 1
+            self.totals["dropped"] += 1
+
+        entry = [kind, payload, key]
+        self.queue.append(entry)
+        if kind == "status":
+            self.pending_status[key] = entry
+        self.queue_empty.clear()
+        self.has_messages.set()
+
+    async def writer_loop(self):
+        try:
+            while True:
+                await self.has_messages.wait()
+                self.has_messages.clear()
+
+                while self.queue:
+                    entry = self.queue.popleft()
+                    if entry[0] == "status" and self.pending_status.get(entry[2]) is entry:
+                        del self.pending_status[entry[2]]
+                    # JSON wird als Text-Frame gesendet, binäre Formate als Binär-Frame
+                    await self.websocket.send(entry[1], text=not self.codec.binary)
+                    self.stats["sent"] += 1
+                    self.totals["frames_sent"] += 1
+                    self.totals["bytes_sent"] += len(entry[1])
+                self.queue_empty.set()
+        except asyncio.CancelledError:
+            raise
+        except ConnectionClosed:
+            self.closed = True
+            self.queue_empty.set()
+        except Exception as e:
+            # Z.B. TypeError bei send(..., text=...) mit websockets < 14: ohne Meldung bekäme der Client einfach nichts mehr
+            print(f"Error sending to client: {e}")
+            self.closed = True
+            self.queue_empty.set()
+
+    # Wartet, bis alle eingereihten Nachrichten gesendet sind (z.B. zwischen zwei Seiten einer Abfrage)
+    async def drain(self):
+        await self.queue_empty.wait()
+
+    async def close(self):
+        self.closed = True
+        self.queue_empty.set()
+        self.writer_task.cancel()
+        try:
+            await self.writer_task
+        except asyncio.CancelledError:
+            pass
+
+
+# Verteilt jede Nachricht (einmal pro verwendetem Format kodiert) an alle Clients, ohne auf langsame Clients zu warten
+class Broadcaster:
+    def __init__(self, max_queue_size=64):
+        self.max_queue_size = max_queue_size
+        self.clients = {}
+        self.stats = {"frames_sent": 0, "bytes_sent": 0, "coalesced": 0, "dropped": 0}
+        self.encode_time = LagHistogram(ENCODE_BUCKETS_MS)
+
+    def __len__(self):
+        return len(self.clients)
+
+    def add(self, websocket, codec=JSON_CODEC):
+        connection = ClientConnection(websocket, self.max_queue_size, codec, self.stats)
+        self.clients[websocket] = connection
+        return connection
+
+    async def remove(self, websocket):
+        connection = self.clients.pop(websocket, None)
+        if connection:
+            await connection.close()
+
+    # Kodierte Nachricht pro Format zwischenspeichern, damit jedes Format nur einmal kodiert wird
+    def encode(self, message, codec, cache):
+        if codec.name not in cache:
+            started = time.perf_counter()
+            cache[codec.name] = codec.encode(message)
+            self.encode_time.observe(time.perf_counter() - started)
+        return cache[codec.name]
+
+    def get(self, websocket):
+        return self.clients.get(websocket)
+
+    # Nachricht an einen einzelnen Client
+    def send_to(self, websocket, message, kind="message", key=None):
+        connection = self.clients.get(websocket)
+        if connection:
+            connection.enqueue(self.encode(message, connection.codec, {}), kind, key)
+
+    # Noch nicht gesendete Nachrichten: Summe und längste Warteschlange
+    def queue_depths(self):
+        depths = [len(connection.queue) for connection in self.clients.values()]
+        return sum(depths), max(depths, default=0)
+
+    async def drain(self, websocket):
+        connection = self.clients.get(websocket)
+        if connection:
+            await connection.drain()
+
+    # Nachricht an alle Clients, kehrt sofort zurück
+    def broadcast(self, message, kind="message"):
+        cache = {}
+        closed = []
+        for websocket, connection in self.clients.items():
+            if connection.closed:
+                closed.append(websocket)
+            else:
+                connection.enqueue(self.encode(message, connection.codec, cache), kind)
+
+        for websocket in closed:
+            self.clients.pop(websocket, None)
+
+    # Status-Frame einer Maschine an ihre Abonnenten: Delta-Clients bekommen nur die geänderten Felder,
+    # alle anderen den kompletten Status
+    def broadcast_status(self, full_message, delta_message, subscribers, key):
+        full_cache = {}
+        delta_cache = {}
+        for websocket in subscribers:
+            connection = self.clients.get(websocket)
+            if connection is None or connection.closed:
+                continue
+            if connection.delta and delta_message is not None:
+                # Delta-Frames werden nicht zusammengefasst, eine Lücke erkennt der Client an "base"
+                connection.enqueue(self.encode(delta_message, connection.codec, delta_cache), "status_delta", key)
+            else:
+                connection.enqueue(self.encode(full_message, connection.codec, full_cache), "status", key)
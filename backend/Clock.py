@@ -0,0 +1,104 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta
+
+# Zeitquelle der Simulation. Alle Uhren haben dieselbe Schnittstelle:
+# now() -> datetime, monotonic() -> Sekunden seit Start, await sleep(seconds, background=False)
+# background=True kennzeichnet Endlosschleifen (z.B. Auto-Standby), die die virtuelle Zeit nicht vorantreiben.
+# Netzwerk-Timeouts, Heartbeats und das Schreiben in die Datenbank laufen weiter in echter Zeit.
+
+
+# Echte Zeit (Standard)
+class RealClock:
+    speed = 1
+
+    def now(self):
+        return datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    async def sleep(self, seconds, background=False):
+        await asyncio.sleep(seconds)
+
+
+# Beschleunigte Zeit: bei speed=100 dauert eine simulierte Sekunde 10 ms
+class ScaledClock:
+    def __init__(self, speed=100, start=None):
+        self.speed = speed
+        self.start = start or datetime.now()
+        self.real_start = time.monotonic()
+
+    def now(self):
+        return self.start + timedelta(seconds=self.monotonic())
+
+    def monotonic(self):
+        return (time.monotonic() - self.real_start) * self.speed
+
+    async def sleep(self, seconds, background=False):
+        await asyncio.sleep(seconds / self.speed)
+
+
+# Virtuelle Zeit: sobald alle Tasks schlafen, springt die Uhr direkt zum nächsten Weckzeitpunkt.
+# Die Reihenfolge der Schritte bleibt wie in echter Zeit, die Simulation läuft aber so schnell wie möglich.
+class VirtualClock:
+    speed = None
+
+    def __init__(self, start=None, settle_rounds=5):
+        self.start = start or datetime.now()
+        self.elapsed = 0.0
+        # Schlafende Tasks als Heap (Weckzeitpunkt, Reihenfolge, Future, background)
+        self.sleepers = []
+        # Anzahl der Schläfer ohne background, nur sie treiben die Uhr an
+        self.foreground = 0
+        self.counter = itertools.count()
+        # So oft kommen die anderen Tasks vor jedem Zeitsprung zum Zug
+        self.settle_rounds = settle_rounds
+        self.driver_task = None
+
+    def now(self):
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def monotonic(self):
+        return self.elapsed
+
+    async def sleep(self, seconds, background=False):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.sleepers, (self.elapsed + max(0, seconds), next(self.counter), future, background))
+        if not background:
+            self.foreground += 1
+            if self.driver_task is None or self.driver_task.done():
+                self.driver_task = asyncio.create_task(self.drive())
+        await future
+
+    # Uhr vorstellen, solange noch Tasks ohne background schlafen. Schläfer mit background werden geweckt,
+    # wenn die Uhr ihren Zeitpunkt erreicht, halten sie aber nicht am Laufen (sonst springt eine
+    # Endlosschleife mit sleep(10) die Zeit ohne Pause vorwärts und belegt die CPU).
+    async def drive(self):
+        while self.foreground:
+            for _ in range(self.settle_rounds):
+                await asyncio.sleep(0)
+
+            self.elapsed = max(self.elapsed, self.sleepers[0][0])
+            while self.sleepers and self.sleepers[0][0] <= self.elapsed:
+                _, _, future, background = heapq.heappop(self.sleepers)
+                if not background:
+                    self.foreground -= 1
+                if not future.done():
+                    future.set_result(None)
+
+
+def create_clock(mode="real", speed=100):
+    if mode == "scaled":
+        return ScaledClock(speed)
+    if mode == "virtual":
+        return VirtualClock()
+    return RealClock()
+
+
+def add_clock_arguments(parser):
+    parser.add_argument("--clock", choices=["real", "scaled", "virtual"], default="real",
+                        help="Zeitquelle der Simulation")
+    parser.add_argument("--speed", type=float, default=100, help="Beschleunigung bei --clock scaled")
@@ -0,0 +1,74 @@
+import json
+
+# Optionale Pakete für binäre Formate (pip install msgpack cbor2)
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+# Gemeinsame Schnittstelle: name, binary, encode(dict) -> bytes, decode(bytes) -> dict
+class JsonCodec:
+    name = "json"
+    binary = False
+
+    def encode(self, message):
+        return json.dumps(message, default=str, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, payload):
+        return json.loads(payload)
+
+
+class MsgPackCodec:
+    name = "msgpack"
+    binary = True
+
+    def encode(self, message):
+        return msgpack.packb(message, default=str, use_bin_type=True)
+
+    def decode(self, payload):
+        return msgpack.unpackb(payload, raw=False)
+
+
+class CborCodec:
+    name = "cbor"
+    binary = True
+
+    def encode(self, message):
+        return cbor2.dumps(message, default=lambda encoder, value: encoder.encode(str(value)))
+
+    def decode(self, payload):
+        return cbor2.loads(payload)
+
+
+JSON_CODEC = JsonCodec()
+
+CODECS = {JSON_CODEC.name: JSON_CODEC}
+if msgpack is not None:
+    CODECS[MsgPackCodec.name] = MsgPackCodec()
+if cbor2 is not None:
+    CODECS[CborCodec.name] = CborCodec()
+
+
+# Format zu einem Namen, None bei unbekannten oder nicht installierten Formaten (auch bei Nicht-Text)
+def find_codec(name):
+    return CODECS.get(name) if isinstance(name, str) else None
+
+
+# Subprotokoll der Verbindung: ohne Angabe oder bei unbekanntem Namen JSON
+def get_codec(name):
+    return find_codec(name) or JSON_CODEC
+
+
+# Für websockets.serve: erstes vom Client angebotenes und unterstütztes Format wählen,
+# Clients ohne Subprotokoll (z.B. das Frontend) werden weiterhin akzeptiert
+def select_subprotocol(connection, subprotocols):
+    for name in subprotocols:
+        if name in CODECS:
+            return name
+    return None
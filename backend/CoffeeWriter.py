@@ -0,0 +1,155 @@
+import asyncio
+import time
+from collections import deque
+from Metrics import CALL_BUCKETS_MS
+from Statistics import parse_time
+from TickScheduler import LagHistogram
+
+# Kaffee aus dem Frontend: {"id": 1712345678901, "type": "Espresso", "strength": 3, "createdDate": "2026-...Z"}
+MAX_ID_LENGTH = 64
+MIN_STRENGTH = 1
+MAX_STRENGTH = 5
+# Ältere Frontends senden den angezeigten Namen statt des Rezepts (texts.js: black = "Schwarz" / "Black")
+COFFEE_TYPE_ALIASES = {"Schwarz": "Normal", "Black": "Normal"}
+
+
+class CoffeeError(ValueError):
+    pass
+
+
+# Eintrag prüfen und auf die bekannten Felder reduzieren, Fehler ohne jeden DB-Zugriff
+def parse_coffee(data, recipe_book):
+    coffee_id = data.get('id')
+    if isinstance(coffee_id, bool) or not isinstance(coffee_id, (int, str)) or coffee_id == "":
+        raise CoffeeError("id must be a number or a non-empty string")
+    if len(str(coffee_id)) > MAX_ID_LENGTH:
+        raise CoffeeError(f"id must not be longer than {MAX_ID_LENGTH} characters")
+
+    coffee_type = data.get('type')
+    if isinstance(coffee_type, str):
+        coffee_type = COFFEE_TYPE_ALIASES.get(coffee_type, coffee_type)
+    if not isinstance(coffee_type, str) or coffee_type not in recipe_book:
+        raise CoffeeError(f"unknown type: {coffee_type}")
+
+    strength = data.get('strength')
+    if isinstance(strength, bool) or not isinstance(strength, int) or not MIN_STRENGTH <= strength <= MAX_STRENGTH:
+        raise CoffeeError(f"strength must be {MIN_STRENGTH} to {MAX_STRENGTH}")
+
+    created_date = data.get('createdDate')
+    try:
+        parse_time(created_date)
+    except (AttributeError, TypeError, ValueError):
+        raise CoffeeError("createdDate must be an ISO timestamp")
+
+    coffee = {"id": coffee_id, "type": coffee_type, "strength": strength, "createdDate": created_date}
+    if isinstance(data.get('machine_id'), str):
+        coffee['machine_id'] = data['machine_id']
+    return coffee
+
+
+# Sammelt Kaffees und schreibt sie gebündelt (storage.insert_coffees). Jeder Aufruf von submit bekommt ein
+# Future, das erst nach dem Schreiben mit "stored", "duplicate" oder "failed" erfüllt wird.
+# Während ein Schreibvorgang läuft, sammeln sich die nächsten Einträge für den folgenden Batch.
+class CoffeeWriter:
+    def __init__(self, storage, batch_size=100, max_delay=0.01, max_queue_size=2000, retry_interval=2):
+        self.storage = storage
+        self.batch_size = batch_size
+        # Wartezeit nach dem ersten Eintrag, damit gleichzeitige Einsendungen in einen Batch kommen
+        self.max_delay = max_delay
+        self.max_queue_size = max_queue_size
+        self.retry_interval = retry_interval
+        self.queue = deque()
+        self.has_entries = asyncio.Event()
+        self.flush_task = None
+        # Wird nach jedem Batch mit neuen Einträgen mit deren Anzahl aufgerufen (async)
+        self.on_stored = None
+        self.stats = {"queued": 0, "stored": 0, "duplicate": 0, "failed": 0, "rejected": 0, "invalid": 0}
+        self.write_time = LagHistogram(CALL_BUCKETS_MS)
+
+    # Eintrag einreihen, bei voller Warteschlange wird er abgelehnt (der Client bekommt ein negatives ack)
+    def submit(self, coffee):
+        if len(self.queue) >= self.max_queue_size:
+            self.stats["rejected"] += 1
+            raise CoffeeError("too many pending coffees, try again later")
+
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((coffee.copy(), future))
+        self.stats["queued"] += 1
+        self.has_entries.set()
+        return future
+
+    def pending(self):
+        return len(self.queue)
+
+    def start(self):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush_loop())
+
+    # Hintergrund-Task beenden und Warteschlange leeren, was dann nicht geschrieben werden kann, ist "failed"
+    async def stop(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+
+        while self.queue:
+            if not await self.flush():
+                break
+        while self.queue:
+            _, future = self.queue.popleft()
+            self.stats["failed"] += 1
+            if not future.done():
+                future.set_result("failed")
+
+    async def flush_loop(self):
+        while True:
+            await self.has_entries.wait()
+            if len(self.queue) < self.batch_size:
+                await asyncio.sleep(self.max_delay)
+            self.has_entries.clear()
+
+            while self.queue:
+                if not await self.flush():
+                    await asyncio.sleep(self.retry_interval)
+                    break
+            # Bei einem Fehler bleibt has_entries gesetzt, damit der nächste Versuch ohne neuen Eintrag startet
+            if self.queue:
+                self.has_entries.set()
+
+    async def flush(self):
+        if not self.queue:
+            return True
+
+        entries = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+        started = time.perf_counter()
+        try:
+            statuses = await self.storage.insert_coffees([coffee for coffee, _ in entries])
+        except Exception as e:
+            self.write_time.observe(time.perf_counter() - started)
+            print(f"Error writing coffee history batch: {e}")
+            # Vorne wieder einreihen, die Futures bleiben offen bis zum nächsten Versuch
+            self.queue.extendleft(reversed(entries))
+            return False
+        self.write_time.observe(time.perf_counter() - started)
+
+        stored = 0
+        for (_, future), status in zip(entries, statuses):
+            if status == "stored":
+                stored += 1
+            elif status == "duplicate":
+                self.stats["duplicate"] += 1
+            else:
+                self.stats["failed"] += 1
+            if not future.done():
+                future.set_result(status)
+        self.stats["stored"] += stored
+
+        if stored and self.on_stored:
+            try:
+                await self.on_stored(stored)
+            except Exception as e:
+                print(f"Error after storing coffees: {e}")
+        return True
@@ -0,0 +1,77 @@
+# Befehle als JSON: {"type": "command", "request_id": "...", "command": "brew", "coffee_type": "Normal", "amount": 2}
+# oder mehrere auf einmal: {"type": "batch", "request_id": "...", "commands": [{"command": "water_fill_up"}, ...]}
+COMMAND_NAMES = ["heat_up", "cool_down", "brew", "water_fill_up", "ground_clearing"]
+MAX_BATCH_SIZE = 50
+
+
+class CommandError(ValueError):
+    pass
+
+
+# Befehl prüfen und auf die benötigten Felder reduzieren, Fehler ohne jeden DB-Zugriff
+def parse_command(data, recipe_book):
+    name = data.get('command')
+    if name not in COMMAND_NAMES:
+        raise CommandError(f"unknown command: {name}")
+
+    if name != "brew":
+        return {"command": name}
+
+    coffee_type = data.get('coffee_type')
+    if coffee_type not in recipe_book:
+        raise CommandError(f"unknown coffee_type: {coffee_type}")
+    try:
+        amount = int(data.get('amount', 1))
+    except (TypeError, ValueError):
+        raise CommandError("amount must be 1 or 2")
+    if amount not in (1, 2):
+        raise CommandError("amount must be 1 or 2")
+    return {"command": "brew", "coffee_type": coffee_type, "amount": amount}
+
+
+# Übersetzt die alten Textbefehle ("Brew", "1", "Normal", "HeatUp", ...) in Befehle.
+# Der Zustand gehört zur Verbindung, damit sich zwei Clients nicht gegenseitig stören.
+class LegacyCommandAdapter:
+    SIMPLE_COMMANDS = {
+        "HeatUp": "heat_up",
+        "CoolDown": "cool_down",
+        "WaterFillUp": "water_fill_up",
+        "GroundClearing": "ground_clearing",
+    }
+
+    def __init__(self, recipe_book):
+        self.recipe_book = recipe_book
+        self.input_state = "ready"
+        self.amount = 1
+
+    # Gibt den fertigen Befehl zurück oder None, solange noch Eingaben fehlen bzw. bei unbekanntem Text
+    def feed(self, message):
+        if self.input_state == "await_amount":
+            if message in ["1", "2"]:
+                self.amount = int(message)
+                self.input_state = "await_coffee_choice"
+            else:
+                self.input_state = "ready"
+            return None
+
+        if self.input_state == "await_coffee_choice":
+            self.input_state = "ready"
+            if message in self.recipe_book:
+                return {"command": "brew", "coffee_type": message, "amount": self.amount}
+            return None
+
+        if message == "Brew":
+            self.input_state = "await_amount"
+            return None
+        if message in self.SIMPLE_COMMANDS:
+            return {"command": self.SIMPLE_COMMANDS[message]}
+        return None
+
+
+# Ergebnis einer Operation (siehe MachineSupervisor.submit) als Status für die Bestätigung
+def operation_status(result):
+    if isinstance(result, str):
+        return result
+    if result is False:
+        return "failed"
+    return "completed"
@@ -0,0 +1,209 @@
+import asyncio
+import time
+from collections import deque
+from Metrics import CALL_BUCKETS_MS
+from TickScheduler import LagHistogram
+
+# Zustandsänderungen einer Maschine als Ereignisse: {"machine_id", "seq", "time", "type", "changes": {...}}
+# type ist step_changed, power_changed, brew_completed, water_filled oder grounds_cleared.
+# Temperatur und Wasserfluss allein erzeugen kein Ereignis, sie stehen in changes, wenn eines entsteht, und im Snapshot.
+EVENT_FIELDS = ["current_step", "powered_on", "water_ok", "grounds_ok", "cups_since_empty", "cups_since_filled"]
+CONTEXT_FIELDS = ["temperature", "water_flow"]
+WATCHED_FIELDS = frozenset(EVENT_FIELDS)
+
+
+# Ereignis aus den vorherigen Werten der geänderten Felder und dem neuen Status, None ohne relevante Änderung
+def derive_event(previous, status):
+    changed = [key for key in EVENT_FIELDS if key in previous]
+    if not changed:
+        return None
+
+    event = {}
+    if any(status.get(key, 0) > (previous.get(key) or 0) for key in ("cups_since_empty", "cups_since_filled") if key in previous):
+        event["type"] = "brew_completed"
+        if previous.get("recipe"):
+            event["recipe"] = previous["recipe"]
+    elif "cups_since_filled" in previous and status.get("cups_since_filled") == 0:
+        event["type"] = "water_filled"
+    elif "cups_since_empty" in previous and status.get("cups_since_empty") == 0:
+        event["type"] = "grounds_cleared"
+    elif "current_step" in previous:
+        event["type"] = "step_changed"
+    else:
+        event["type"] = "power_changed"
+
+    event["changes"] = {key: status.get(key) for key in changed + CONTEXT_FIELDS if key in status}
+    return event
+
+
+# Lücke in den seq-Nummern beim Wiederherstellen: der Status danach wäre unbemerkt falsch
+class EventLogGapError(RuntimeError):
+    pass
+
+
+def apply_event(status, event):
+    status.update(event.get("changes", {}))
+    return status
+
+
+# Append-only-Protokoll einer Maschine mit regelmäßigen Snapshots. Ereignisse werden wie beim HistoryWriter
+# gesammelt und gebündelt geschrieben (storage.append_events), ein Snapshot (storage.save_snapshot) enthält
+# den ganzen Status und die Nummer des letzten enthaltenen Ereignisses. recover() lädt den Snapshot und
+# spielt nur die Ereignisse danach ab.
+class EventLog:
+    def __init__(self, storage, machine_id, clock, flush_interval=0.5, snapshot_interval=30, snapshot_every=100,
+                 batch_size=500, max_queue_size=5000, retry_interval=2):
+        self.storage = storage
+        self.machine_id = machine_id
+        self.clock = clock
+        self.flush_interval = flush_interval
+        # Snapshot nach snapshot_interval Sekunden (falls sich etwas geändert hat) oder nach snapshot_every Ereignissen
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_every = snapshot_every
+        self.batch_size = batch_size
+        self.max_queue_size = max_queue_size
+        self.retry_interval = retry_interval
+        self.queue = deque()
+        self.batch_ready = asyncio.Event()
+        self.flush_task = None
+        self.seq = 0
+        # Aktueller Status (derselbe dict wie im StatusStore) und der noch nicht geschriebene Snapshot
+        self.status = None
+        self.pending_snapshot = None
+        self.last_snapshot = {"seq": 0, "time": time.monotonic(), "last_updated": None}
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "snapshots": 0}
+        self.recovery = None
+        self.write_time = LagHistogram(CALL_BUCKETS_MS)
+
+    # Kann eine Änderung dieser Felder ein Ereignis auslösen?
+    def watches(self, changed_fields):
+        return not WATCHED_FIELDS.isdisjoint(changed_fields)
+
+    # Vom StatusStore nach einer Änderung überwachter Felder aufgerufen, ohne auf die Datenbank zu warten
+    def record(self, previous, status):
+        self.status = status
+        event = derive_event(previous, status)
+        if event is None:
+            return None
+
+        self.seq += 1
+        event.update(machine_id=self.machine_id, seq=self.seq, time=self.clock.now())
+        self.queue.append(event)
+        self.stats["recorded"] += 1
+        if len(self.queue) > self.max_queue_size:
+            # Speicher zu lange nicht erreichbar: das älteste Ereignis fällt weg, der Snapshot bis zur aktuellen seq
+            # deckt es ab (er wird nach den übrigen Ereignissen geschrieben), im Protokoll bleibt keine Lücke nach ihm
+            self.queue.popleft()
+            self.stats["dropped"] += 1
+            self.take_snapshot(status)
+        elif self.seq - self.last_snapshot["seq"] >= self.snapshot_every:
+            self.batch_ready.set()
+        return event
+
+    # Letzten Stand laden: Snapshot plus alle Ereignisse danach, None ohne gespeicherten Stand.
+    # Fehlt nach dem Snapshot eine seq, bricht recover mit EventLogGapError ab statt einen falschen Status zu liefern.
+    async def recover(self):
+        started = time.perf_counter()
+        snapshot = await self.storage.load_snapshot(self.machine_id)
+        status = snapshot["status"] if snapshot else None
+        seq = snapshot["seq"] if snapshot else 0
+
+        replayed = 0
+        async for event in self.storage.find_events(self.machine_id, seq, 500):
+            if event["seq"] != seq + 1:
+                raise EventLogGapError(
+                    f"events {seq + 1} to {event['seq'] - 1} of {self.machine_id} are missing after snapshot "
+                    f"{snapshot['seq'] if snapshot else 0}"
+                )
+            status = apply_event(status or {}, event)
+            seq = event["seq"]
+            replayed += 1
+
+        self.seq = seq
+        self.last_snapshot["seq"] = snapshot["seq"] if snapshot else 0
+        self.recovery = {
+            "snapshot_seq": snapshot["seq"] if snapshot else None,
+            "replayed": replayed,
+            "seconds": round(time.perf_counter() - started, 4),
+        }
+        return status
+
+    # Snapshot des aktuellen Status vormerken, geschrieben wird er nach den Ereignissen bis einschließlich seq
+    def take_snapshot(self, status=None):
+        if status is not None:
+            self.status = status
+        if self.status is None:
+            return
+        self.pending_snapshot = {"seq": self.seq, "status": self.status.copy()}
+        self.last_snapshot = {"seq": self.seq, "time": time.monotonic(), "last_updated": self.status.get("last_updated")}
+        self.batch_ready.set()
+
+    def snapshot_due(self):
+        if self.status is None or self.status.get("last_updated") == self.last_snapshot["last_updated"]:
+            return False
+        return (
+            time.monotonic() - self.last_snapshot["time"] >= self.snapshot_interval
+            or self.seq - self.last_snapshot["seq"] >= self.snapshot_every
+        )
+
+    def pending(self):
+        return len(self.queue)
+
+    def start(self):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush_loop())
+
+    # Hintergrund-Task beenden, letzten Snapshot vormerken und alles schreiben (der nächste Start spielt nichts ab)
+    async def stop(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+
+        if self.status is not None and self.status.get("last_updated") != self.last_snapshot["last_updated"]:
+            self.take_snapshot()
+        await self.flush()
+
+    async def flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.batch_ready.clear()
+
+            if self.snapshot_due():
+                self.take_snapshot()
+            if not await self.flush():
+                await asyncio.sleep(self.retry_interval)
+
+    # Erst alle Ereignisse, dann den Snapshot, damit ein Snapshot nie Ereignisse überspringt
+    async def flush(self):
+        while self.queue:
+            batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+            started = time.perf_counter()
+            try:
+                await self.storage.append_events(batch)
+            except Exception as e:
+                self.write_time.observe(time.perf_counter() - started)
+                print(f"Error writing machine events: {e}")
+                # Nicht geschriebene Ereignisse vorne wieder einreihen, die Reihenfolge bleibt erhalten
+                self.queue.extendleft(reversed(batch))
+                return False
+            self.write_time.observe(time.perf_counter() - started)
+            self.stats["written"] += len(batch)
+
+        if self.pending_snapshot:
+            snapshot = self.pending_snapshot
+            try:
+                await self.storage.save_snapshot(self.machine_id, snapshot["seq"], snapshot["status"])
+            except Exception as e:
+                print(f"Error writing machine snapshot: {e}")
+                return False
+            if self.pending_snapshot is snapshot:
+                self.pending_snapshot = None
+            self.stats["snapshots"] += 1
+        return True
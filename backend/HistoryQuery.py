@@ -0,0 +1,129 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+# Indizes für Zeitbereich-, Sorten- und Stärke-Filter mit Sortierung nach createdDate
+async def ensure_coffee_history_indexes(collection):
+    await collection.create_index([("createdDate", -1), ("_id", -1)])
+    await collection.create_index([("type", 1), ("createdDate", -1), ("_id", -1)])
+    await collection.create_index([("strength", 1), ("createdDate", -1), ("_id", -1)])
+    # Jede Kaffee-id nur einmal. Enthält die Collection schon Duplikate, schlägt das fehl und es wird nicht dedupliziert.
+    try:
+        await collection.create_index("id", unique=True, partialFilterExpression={"id": {"$exists": True}})
+    except Exception as e:
+        print(f"Error creating unique index on CoffeeHistory.id: {e}")
+
+
+# Cursor = createdDate und _id des letzten Eintrags der vorherigen Seite
+def encode_cursor(item):
+    created_date = item['createdDate']
+    if isinstance(created_date, datetime):
+        created_date = created_date.isoformat()
+    return f"{created_date}|{item['_id']}"
+
+
+def decode_cursor(cursor):
+    created_date, _, object_id = cursor.rpartition('|')
+    return created_date, ObjectId(object_id)
+
+
+# Filter aus der Anfrage: from/to (ISO-Zeitpunkte), coffee_type, strength, after (Cursor)
+def build_history_filter(request):
+    conditions = []
+
+    date_range = {}
+    if request.get('from'):
+        date_range['$gte'] = request['from']
+    if request.get('to'):
+        date_range['$lt'] = request['to']
+    if date_range:
+        conditions.append({"createdDate": date_range})
+
+    if request.get('coffee_type'):
+        conditions.append({"type": request['coffee_type']})
+    if request.get('strength') is not None:
+        conditions.append({"strength": int(request['strength'])})
+
+    # Keyset-Pagination: nur Einträge, die in der Sortierung nach dem Cursor kommen
+    if request.get('after'):
+        created_date, object_id = decode_cursor(request['after'])
+        conditions.append({"$or": [
+            {"createdDate": {"$lt": created_date}},
+            {"createdDate": created_date, "_id": {"$lt": object_id}},
+        ]})
+
+    if not conditions:
+        return {}
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def created_key(item):
+    created_date = item.get('createdDate')
+    return created_date.isoformat() if isinstance(created_date, datetime) else str(created_date)
+
+
+# Sortierung wie in MongoDB: createdDate, dann _id (absteigend sortieren für neueste zuerst)
+def history_sort_key(item):
+    return created_key(item), str(item.get('_id', ''))
+
+
+# Dieselben Filter wie build_history_filter als Funktion für Speicher ohne MongoDB
+def build_history_predicate(request):
+    checks = []
+    if request.get('from'):
+        checks.append(lambda item, start=request['from']: created_key(item) >= start)
+    if request.get('to'):
+        checks.append(lambda item, end=request['to']: created_key(item) < end)
+    if request.get('coffee_type'):
+        checks.append(lambda item, coffee_type=request['coffee_type']: item.get('type') == coffee_type)
+    if request.get('strength') is not None:
+        checks.append(lambda item, strength=int(request['strength']): item.get('strength') == strength)
+    if request.get('after'):
+        created_date, object_id = decode_cursor(request['after'])
+        checks.append(lambda item: history_sort_key(item) < (created_date, str(object_id)))
+    return lambda item: all(check(item) for check in checks)
+
+
+def serialize_history_item(item):
+    item = item.copy()
+    if '_id' in item:
+        item['_id'] = str(item['_id'])
+    if 'createdDate' in item and isinstance(item['createdDate'], datetime):
+        item['createdDate'] = item['createdDate'].isoformat()
+    return item
+
+
+# Liefert die Einträge aus storage.find_coffees seitenweise (neueste zuerst) an send_page, bis max_pages erreicht ist oder keine Daten mehr kommen
+# Eine ungültige Anfrage bekommt genau eine Fehlerseite mit done=True, damit der Client nicht weiter wartet
+async def stream_history_pages(storage, request, send_page):
+    try:
+        page_size = max(1, min(int(request.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        max_pages = int(request.get('max_pages', 1))
+        cursor = storage.find_coffees(request, page_size)
+    except (InvalidId, ValueError, TypeError):
+        await send_page([], None, done=True, error="invalid query")
+        return
+
+    pages_sent = 0
+    page = []
+
+    async for item in cursor:
+        page.append(item)
+        if len(page) < page_size:
+            continue
+
+        pages_sent += 1
+        last_page = pages_sent >= max_pages
+        await send_page([serialize_history_item(entry) for entry in page], encode_cursor(page[-1]), done=last_page)
+        page = []
+        if last_page:
+            await cursor.close()
+            return
+
+    await send_page([serialize_history_item(entry) for entry in page], None, done=True)
@@ -0,0 +1,161 @@
+import asyncio
+from datetime import timedelta
+from pymongo.errors import OperationFailure
+from Clock import RealClock
+
+# Verdichtungsstufen: Collection-Name, Zeiteinheit für $dateTrunc und Aufbewahrung (None = unbegrenzt)
+ROLLUP_TIERS = [
+    {"collection": "StatusHistory_1m", "unit": "minute", "retention": timedelta(days=90)},
+    {"collection": "StatusHistory_1h", "unit": "hour", "retention": None},
+]
+
+
+def truncate(timestamp, unit):
+    if unit == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+# Aggregation der Roh-Snapshots (1 Hz) in Zeitfenster der Länge unit
+def rollup_pipeline(start, end, unit, target):
+    return [
+        {"$match": {"last_updated": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {
+                "machine_id": "$machine_id",
+                "bucket": {"$dateTrunc": {"date": "$last_updated", "unit": unit}},
+                "step": {"$ifNull": ["$current_step", "Unknown"]},
+            },
+            "samples": {"$sum": 1},
+            "temperature_min": {"$min": "$temperature"},
+            "temperature_max": {"$max": "$temperature"},
+            "temperature_sum": {"$sum": "$temperature"},
+            "water_flow_total": {"$sum": "$water_flow"},
+        }},
+        {"$group": {
+            "_id": {"machine_id": "$_id.machine_id", "bucket": "$_id.bucket"},
+            "samples": {"$sum": "$samples"},
+            "temperature_min": {"$min": "$temperature_min"},
+            "temperature_max": {"$max": "$temperature_max"},
+            "temperature_sum": {"$sum": "$temperature_sum"},
+            "water_flow_total": {"$sum": "$water_flow_total"},
+            "step_seconds": {"$push": {"k": "$_id.step", "v": "$samples"}},
+        }},
+        {"$project": {
+            "machine_id": "$_id.machine_id",
+            "bucket": "$_id.bucket",
+            "samples": 1,
+            "temperature_min": 1,
+            "temperature_max": 1,
+            "temperature_avg": {"$round": [{"$divide": ["$temperature_sum", "$samples"]}, 1]},
+            "water_flow_total": 1,
+            "step_seconds": {"$arrayToObject": "$step_seconds"},
+        }},
+        {"$merge": {"into": target, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+# TTL für die Roh-Historie und inkrementelle Verdichtung in Minuten- und Stunden-Collections
+class HistoryRetention:
+    def __init__(self, database, raw_retention=timedelta(days=7), interval=60, settle_delay=timedelta(seconds=30), clock=None):
+        self.database = database
+        # Abgeschlossen ist ein Zeitfenster nach der Uhr der Simulation, von der auch last_updated kommt
+        self.clock = clock or RealClock()
+        self.raw_retention = raw_retention
+        self.interval = interval
+        # Wartezeit, damit der HistoryWriter ein Zeitfenster vollständig geschrieben hat
+        self.settle_delay = settle_delay
+        self.state_collection = database.StatusHistoryRollupState
+        self.compact_task = None
+
+    async def ensure_ttl_index(self, collection_name, field, retention):
+        collection = self.database[collection_name]
+        seconds = int(retention.total_seconds())
+        try:
+            await collection.create_index(field, expireAfterSeconds=seconds)
+        except OperationFailure:
+            # Index existiert bereits mit anderer Aufbewahrungszeit
+            await self.database.command(
+                "collMod", collection_name,
+                index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds}
+            )
+
+    async def ensure_indexes(self):
+        await self.ensure_ttl_index("StatusHistory", "last_updated", self.raw_retention)
+        for tier in ROLLUP_TIERS:
+            if tier["retention"]:
+                await self.ensure_ttl_index(tier["collection"], "bucket", tier["retention"])
+            else:
+                await self.database[tier["collection"]].create_index("bucket")
+            await self.database[tier["collection"]].create_index([("machine_id", 1), ("bucket", 1)])
+
+    # Beginn der noch nicht verdichteten Daten
+    async def get_watermark(self, tier):
+        state = await self.state_collection.find_one({"_id": tier["collection"]})
+        if state:
+            return state["until"]
+
+        oldest = await self.database.StatusHistory.find_one(
+            {"last_updated": {"$type": "date"}}, sort=[("last_updated", 1)]
+        )
+        if not oldest:
+            return None
+        return truncate(oldest["last_updated"], tier["unit"])
+
+    # Nur abgeschlossene Zeitfenster seit dem letzten Lauf verdichten
+    async def compact_tier(self, tier):
+        start = await self.get_watermark(tier)
+        if start is None:
+            return
+
+        end = truncate(self.clock.now() - self.settle_delay, tier["unit"])
+        if end <= start:
+            return
+
+        pipeline = rollup_pipeline(start, end, tier["unit"], tier["collection"])
+        await self.database.StatusHistory.aggregate(pipeline).to_list(length=None)
+        await self.state_collection.update_one(
+            {"_id": tier["collection"]},
+            {"$set": {"until": end}},
+            upsert=True
+        )
+
+    async def compact(self):
+        for tier in ROLLUP_TIERS:
+            try:
+                await self.compact_tier(tier)
+            except Exception as e:
+                print(f"Error compacting {tier['collection']}: {e}")
+
+    # Verdichtete Werte für einen Zeitraum lesen (unit: "minute" oder "hour")
+    async def get_rollups(self, unit, start, end, machine_id=None):
+        tier = next(tier for tier in ROLLUP_TIERS if tier["unit"] == unit)
+        query = {"bucket": {"$gte": start, "$lt": end}}
+        if machine_id is not None:
+            query["machine_id"] = machine_id
+        cursor = self.database[tier["collection"]].find(query, {"_id": 0}).sort("bucket", 1)
+        return await cursor.to_list(length=None)
+
+    # Hintergrund-Task starten
+    def start(self):
+        if self.compact_task is None or self.compact_task.done():
+            self.compact_task = asyncio.create_task(self.compact_loop())
+
+    async def stop(self):
+        if self.compact_task:
+            self.compact_task.cancel()
+            try:
+                await self.compact_task
+            except asyncio.CancelledError:
+                pass
+            self.compact_task = None
+
+    async def compact_loop(self):
+        try:
+            await self.ensure_indexes()
+        except Exception as e:
+            print(f"Error creating history indexes: {e}")
+
+        while True:
+            await self.compact()
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,103 @@
+import asyncio
+import time
+from collections import deque
+from pymongo.errors import BulkWriteError
+from Metrics import CALL_BUCKETS_MS
+from TickScheduler import LagHistogram
+
+
+# Sammelt Status-Snapshots und schreibt sie gebündelt in die StatusHistory (storage.insert_status_history)
+class HistoryWriter:
+    def __init__(self, storage, batch_size=50, flush_interval=2, max_queue_size=5000, retry_interval=2):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.retry_interval = retry_interval
+        self.queue = deque()
+        self.batch_ready = asyncio.Event()
+        self.flush_task = None
+        self.stats = {"queued": 0, "flushed": 0, "dropped": 0}
+        # Dauer der Schreibvorgänge in den Speicher (für die Metriken)
+        self.write_time = LagHistogram(CALL_BUCKETS_MS)
+
+    # Snapshot einreihen, ohne auf die Datenbank zu warten
+    def add(self, status_data):
+        status_copy = status_data.copy()
+        status_copy.pop('_id', None)
+
+        # Ist die Warteschlange voll, wird der älteste Eintrag verworfen
+        if len(self.queue) >= self.max_queue_size:
+            self.queue.popleft()
+            self.stats["dropped"] += 1
+
+        self.queue.append(status_copy)
+        self.stats["queued"] += 1
+        if len(self.queue) >= self.batch_size:
+            self.batch_ready.set()
+
+    def pending(self):
+        return len(self.queue)
+
+    # Hintergrund-Task starten
+    def start(self):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush_loop())
+
+    # Hintergrund-Task beenden und Warteschlange leeren
+    async def stop(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+
+        while self.queue:
+            if not await self.flush():
+                break
+
+    # Schreiben, sobald batch_size erreicht ist oder flush_interval abgelaufen ist
+    async def flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.batch_ready.clear()
+
+            while self.queue:
+                if not await self.flush():
+                    await asyncio.sleep(self.retry_interval)
+                    break
+
+    async def flush(self):
+        if not self.queue:
+            return True
+
+        batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+        started = time.perf_counter()
+        try:
+            await self.storage.insert_status_history(batch)
+            self.write_time.observe(time.perf_counter() - started)
+            self.stats["flushed"] += len(batch)
+            return True
+        except BulkWriteError as e:
+            self.write_time.observe(time.perf_counter() - started)
+            # Fehler einzelner Dokumente lassen sich durch Wiederholen nicht beheben
+            inserted = e.details.get('nInserted', 0)
+            self.stats["flushed"] += inserted
+            self.stats["dropped"] += len(batch) - inserted
+            print(f"Error writing status history batch: {e}")
+            return True
+        except Exception as e:
+            self.write_time.observe(time.perf_counter() - started)
+            print(f"Error writing status history batch: {e}")
+
+            # Nicht geschriebene Einträge wieder vorne einreihen, soweit Platz ist
+            free_space = self.max_queue_size - len(self.queue)
+            requeue = batch[-free_space:] if free_space > 0 else []
+            self.stats["dropped"] += len(batch) - len(requeue)
+            self.queue.extendleft(reversed(requeue))
+            return False
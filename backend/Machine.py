@@ -0,0 +1,38 @@
+from EventLog import EventLog
+from StatusStore import StatusStore
+from Clock import RealClock
+from Supervisor import MachineSupervisor
+
+
+# Eine Kaffeemaschine der Flotte mit eigenem Status, eigenem Task und eigenen Abonnenten
+class Machine:
+    def __init__(self, machine_id, storage, clock=None):
+        self.machine_id = machine_id
+        self.clock = clock or RealClock()
+        # Zustandsänderungen als Ereignisse mit Snapshots, daraus wird der Status nach einem Neustart wiederhergestellt
+        self.event_log = EventLog(storage, machine_id, self.clock)
+        self.status_store = StatusStore(storage, machine_id, clock=self.clock, event_log=self.event_log)
+        self.state = {
+            "is_processing": False,
+            "last_activity": self.clock.now(),
+            "current_task": None
+        }
+        # WebSockets der Clients, die diese Maschine abonniert haben
+        self.subscribers = set()
+        # Zuletzt gesendeter Status, Basis für die Delta-Frames
+        self.last_broadcast = {"seq": 0, "data": None, "message": None}
+        self.push_task = None
+        # Warteschlange für Aufheizen, Abkühlen, Brühen und andere Befehle dieser Maschine
+        self.supervisor = MachineSupervisor(machine_id)
+
+    def set_clock(self, clock):
+        self.clock = clock
+        self.status_store.clock = clock
+        self.event_log.clock = clock
+        self.state["last_activity"] = clock.now()
+
+    def subscribe(self, websocket):
+        self.subscribers.add(websocket)
+
+    def unsubscribe(self, websocket):
+        self.subscribers.discard(websocket)
@@ -0,0 +1,169 @@
+import asyncio
+import functools
+import time
+from TickScheduler import LAG_BUCKETS_MS, LagHistogram
+
+# Buckets für die Dauer eines Aufrufs bzw. Schreibvorgangs in Millisekunden
+CALL_BUCKETS_MS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000, 5000]
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+# Histogramm im Prometheus-Format: kumulative Buckets und Summe in Sekunden
+def render_histogram(lines, name, labels, histogram):
+    cumulative = 0
+    for bucket, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{format_labels({**labels, 'le': bucket / 1000})} {cumulative}")
+    lines.append(f"{name}_bucket{format_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum_ms / 1000}")
+    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+
+# Messwerte des Backends: Aufrufdauern (timed), Verzögerung der Event-Loop und Werte aus Collectors.
+# Ein Collector ist eine Funktion ohne Argumente, die Metriken als Liste liefert:
+#   (name, kind, help, samples) mit kind = "gauge" | "counter" | "histogram"
+#   samples = [(labels, value)], bei "histogram" ist value ein LagHistogram
+class Metrics:
+    def __init__(self, prefix="kaffeemaschine"):
+        self.prefix = prefix
+        self.calls = {}
+        self.loop_lag = LagHistogram(LAG_BUCKETS_MS)
+        self.collectors = []
+        self.lag_task = None
+        self.log_task = None
+        # Zählerstände beim letzten Protokolleintrag, für Raten pro Sekunde
+        self.last_log = {"time": time.monotonic(), "counters": {}}
+
+    # Dekorator für async-Funktionen: Dauer jedes Aufrufs (auch bei Fehlern) im Histogramm name
+    def timed(self, name):
+        histogram = self.calls.setdefault(name, LagHistogram(CALL_BUCKETS_MS))
+
+        def decorator(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def add_collector(self, collect):
+        self.collectors.append(collect)
+
+    def collect(self):
+        families = [
+            ("call_duration_seconds", "histogram", "Dauer der Aufrufe im Hot Path",
+             [({"function": name}, histogram) for name, histogram in self.calls.items()]),
+            ("event_loop_lag_seconds", "histogram", "Verspätung der Event-Loop gegenüber dem geplanten Aufwachen",
+             [({}, self.loop_lag)]),
+        ]
+        for collect in self.collectors:
+            try:
+                families.extend(collect())
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        return families
+
+    # Text-Format für Prometheus (GET /metrics)
+    def render(self):
+        lines = []
+        for name, kind, help_text, samples in self.collect():
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in samples:
+                if kind == "histogram":
+                    render_histogram(lines, full_name, labels, value)
+                else:
+                    lines.append(f"{full_name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    # Eine Zeile fürs Protokoll: Werte ohne Labels, Zähler als Rate, Histogramme als p99
+    def summary(self):
+        now = time.monotonic()
+        elapsed = max(now - self.last_log["time"], 1e-9)
+        counters = {}
+        parts = []
+        for name, kind, _, samples in self.collect():
+            for labels, value in samples:
+                label = "/".join(str(label_value) for label_value in labels.values())
+                key = f"{name}[{label}]" if label else name
+                if kind == "histogram":
+                    if value.count:
+                        parts.append(f"{key} p99 {value.percentile(99)} ms")
+                elif kind == "counter":
+                    counters[key] = value
+                    rate = (value - self.last_log["counters"].get(key, 0)) / elapsed
+                    parts.append(f"{key} {rate:.1f}/s")
+                elif not label:
+                    parts.append(f"{key} {value}")
+        self.last_log = {"time": now, "counters": counters}
+        return ", ".join(parts)
+
+    # Misst alle interval Sekunden, wie viel später als geplant die Event-Loop den Task wieder aufweckt
+    async def lag_loop(self, interval=0.5):
+        while True:
+            planned = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(time.perf_counter() - planned)
+
+    async def log_loop(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            print(f"Metrics: {self.summary()}")
+
+    # Hintergrund-Tasks starten, log_interval=0 schaltet das Protokoll ab
+    def start(self, log_interval=0):
+        if self.lag_task is None or self.lag_task.done():
+            self.lag_task = asyncio.create_task(self.lag_loop())
+        if log_interval and (self.log_task is None or self.log_task.done()):
+            self.log_task = asyncio.create_task(self.log_loop(log_interval))
+
+    async def stop(self):
+        for task in (self.lag_task, self.log_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.lag_task = None
+        self.log_task = None
+
+    # Minimaler HTTP-Server nur für GET /metrics, lauscht standardmäßig nur lokal
+    async def handle_http(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Header werden nicht gebraucht, nur bis zur Leerzeile lesen
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            print(f"Error serving metrics: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self, port, host="127.0.0.1"):
+        return await asyncio.start_server(self.handle_http, host, port)
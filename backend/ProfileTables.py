@@ -0,0 +1,148 @@
+import asyncio
+from bisect import bisect_left, bisect_right
+
+# Ablauf-Tabellen der DB-gesteuerten Simulation (BackendWithWebSocketAndDatabase.py).
+# Werden beim Start einmal geladen und bei Änderungen an den Collections neu eingelesen.
+HEATING_COLLECTION = "Aufheizen"
+COOLING_COLLECTION = "Abkühlen"
+
+STEP_COLLECTIONS = {
+    "Mahlen": "Mahlen",
+    "Pressen": "Pressen",
+    "Anfeuchten": "Anfeuchten",
+    "Zur_Startposition": "Zur_Startposition",
+}
+
+# (collection_prefix der Kaffeesorte, Anzahl Tassen) -> Collection für den Schritt "Brühen"
+BREW_COLLECTIONS = {
+    ("Normalen", 1): "Einen_Normalen_Kaffee_Brühen",
+    ("Normalen", 2): "Zwei_Normale_Kaffee_Brühen",
+    ("Espresso", 1): "Einen_Espresso_Brühen",
+    ("Espresso", 2): "Zwei_Espresso_Brühen",
+}
+
+PROFILE_COLLECTIONS = [HEATING_COLLECTION, COOLING_COLLECTION] + list(STEP_COLLECTIONS.values()) + list(BREW_COLLECTIONS.values())
+
+
+def step_collection_name(step_name, collection_prefix, amount):
+    if step_name == "Brühen":
+        return BREW_COLLECTIONS[(collection_prefix, 1 if amount == 1 else 2)]
+    return STEP_COLLECTIONS.get(step_name)
+
+
+# Eine Tabelle als Spalten (Tupel, Werte wie in der DB) in _id-Reihenfolge, dazu ein nach Temperatur sortierter Index
+class ProfileTable:
+    def __init__(self, documents=()):
+        documents = list(documents)
+        self.temperature = tuple(document['temperature'] for document in documents)
+        self.water_flow = tuple(document['water_flow'] for document in documents)
+        self.water_ok = tuple(bool(document['water_ok']) for document in documents)
+        self.grounds_ok = tuple(bool(document['grounds_ok']) for document in documents)
+
+        self.order_by_temperature = sorted(range(len(self.temperature)), key=self.temperature.__getitem__)
+        self.sorted_temperatures = [self.temperature[index] for index in self.order_by_temperature]
+
+    def __len__(self):
+        return len(self.temperature)
+
+    def row(self, index):
+        return (self.temperature[index], self.water_flow[index], self.water_ok[index], self.grounds_ok[index])
+
+    # Alle Einträge in _id-Reihenfolge
+    def rows(self):
+        return [self.row(index) for index in range(len(self))]
+
+    # Aufheizen: Einträge ab current_temp, aufsteigend nach Temperatur
+    def rows_from_temperature(self, current_temp):
+        start = bisect_left(self.sorted_temperatures, current_temp)
+        return [self.row(index) for index in self.order_by_temperature[start:]]
+
+    # Abkühlen: Einträge bis current_temp, absteigend nach Temperatur
+    def rows_down_from_temperature(self, current_temp):
+        end = bisect_right(self.sorted_temperatures, current_temp)
+        return [self.row(index) for index in reversed(self.order_by_temperature[:end])]
+
+
+class ProfileTables:
+    def __init__(self, database, collection_names=PROFILE_COLLECTIONS, poll_interval=5):
+        self.database = database
+        self.collection_names = list(collection_names)
+        self.poll_interval = poll_interval
+        self.tables = {}
+        self.hashes = {}
+        self.watch_task = None
+
+    def get(self, collection_name):
+        return self.tables.get(collection_name) or ProfileTable()
+
+    async def load_collection(self, collection_name):
+        documents = await self.database[collection_name].find().sort("_id", 1).to_list(length=None)
+        # Erst komplett aufbauen, dann austauschen: laufende Abläufe behalten ihre alte Tabelle
+        self.tables[collection_name] = ProfileTable(documents)
+
+    async def load(self):
+        # Prüfsummen vor dem Laden merken, damit spätere Änderungen beim Polling auffallen
+        hashes = await self.fetch_hashes()
+        if hashes is not None:
+            self.hashes = hashes
+        results = await asyncio.gather(
+            *[self.load_collection(name) for name in self.collection_names],
+            return_exceptions=True
+        )
+        for name, result in zip(self.collection_names, results):
+            if isinstance(result, Exception):
+                print(f"Error loading profile table {name}: {result}")
+
+    def start(self):
+        if self.watch_task is None:
+            self.watch_task = asyncio.create_task(self.watch_loop())
+
+    async def stop(self):
+        if self.watch_task:
+            self.watch_task.cancel()
+            try:
+                await self.watch_task
+            except asyncio.CancelledError:
+                pass
+            self.watch_task = None
+
+    # Änderungen per Change Stream (Replica Set), sonst per dbHash alle poll_interval Sekunden
+    async def watch_loop(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": self.collection_names}}}]
+        try:
+            async with self.database.watch(pipeline) as stream:
+                async for change in stream:
+                    await self.reload(change["ns"]["coll"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Change streams not available, polling profile tables: {e}")
+
+        while True:
+            await self.poll()
+            await asyncio.sleep(self.poll_interval)
+
+    async def fetch_hashes(self):
+        try:
+            result = await self.database.command("dbHash", collections=self.collection_names)
+            return result.get("collections", {})
+        except Exception as e:
+            print(f"Error checking profile tables: {e}")
+            return None
+
+    async def poll(self):
+        hashes = await self.fetch_hashes()
+        if hashes is None:
+            return
+
+        for name in self.collection_names:
+            if hashes.get(name) != self.hashes.get(name):
+                await self.reload(name)
+        self.hashes = hashes
+
+    async def reload(self, collection_name):
+        try:
+            await self.load_collection(collection_name)
+            print(f"Profile table {collection_name} reloaded")
+        except Exception as e:
+            print(f"Error reloading profile table {collection_name}: {e}")
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime
+
+# Verbindet mehrere Backend-Prozesse. Jede Instanz ist ein Endpunkt: publish() erreicht die
+# Abonnenten aller anderen Endpunkte, nicht die eigenen.
+# Schnittstelle: subscribe(channel, callback), await start(), await publish(channel, message), await stop()
+
+
+class BasePubSub:
+    def __init__(self):
+        self.callbacks = {}
+
+    def subscribe(self, channel, callback):
+        self.callbacks.setdefault(channel, []).append(callback)
+
+    async def dispatch(self, channel, message):
+        for callback in self.callbacks.get(channel, []):
+            try:
+                await callback(message)
+            except Exception as e:
+                print(f"Error handling pub/sub message on {channel}: {e}")
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+# Für Tests und einen einzelnen Prozess: alle Endpunkte hängen am selben LocalBus
+class LocalBus:
+    def __init__(self):
+        self.endpoints = []
+
+    def endpoint(self):
+        endpoint = LocalPubSub(self)
+        self.endpoints.append(endpoint)
+        return endpoint
+
+
+class LocalPubSub(BasePubSub):
+    def __init__(self, bus=None):
+        super().__init__()
+        self.bus = bus or LocalBus()
+
+    async def publish(self, channel, message):
+        for endpoint in self.bus.endpoints:
+            if endpoint is not self:
+                await endpoint.dispatch(channel, message)
+
+
+# Für mehrere Prozesse auf einem Rechner: der Besitzer-Prozess ist der Hub (TCP-Server),
+# die Worker verbinden sich. Nachrichten sind JSON-Zeilen {"channel": ..., "message": ...}.
+class SocketPubSub(BasePubSub):
+    def __init__(self, host="127.0.0.1", port=8766, is_hub=False, reconnect_interval=1):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.is_hub = is_hub
+        self.reconnect_interval = reconnect_interval
+        self.server = None
+        # Hub: Writer der verbundenen Worker mit ihren abonnierten Kanälen
+        self.peers = {}
+        self.writer = None
+        self.client_task = None
+
+    async def start(self):
+        if self.is_hub:
+            self.server = await asyncio.start_server(self.handle_peer, self.host, self.port)
+        else:
+            self.client_task = asyncio.create_task(self.client_loop())
+
+    async def stop(self):
+        if self.client_task:
+            self.client_task.cancel()
+            try:
+                await self.client_task
+            except asyncio.CancelledError:
+                pass
+        for writer in list(self.peers):
+            writer.close()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    @staticmethod
+    def encode(data):
+        return (json.dumps(data, default=str) + "\n").encode("utf-8")
+
+    async def publish(self, channel, message):
+        if self.is_hub:
+            await self.forward(channel, message, None)
+        elif self.writer is not None:
+            try:
+                self.writer.write(self.encode({"channel": channel, "message": message}))
+                await self.writer.drain()
+            except (ConnectionError, OSError) as e:
+                print(f"Error publishing to pub/sub hub: {e}")
+
+    # Hub: an alle Worker weiterleiten, die den Kanal abonniert haben (außer dem Absender)
+    async def forward(self, channel, message, sender):
+        line = self.encode({"channel": channel, "message": message})
+        for writer, channels in list(self.peers.items()):
+            if writer is sender or channel not in channels:
+                continue
+            try:
+                writer.write(line)
+                await writer.drain()
+            except (ConnectionError, OSError):
+                self.peers.pop(writer, None)
+
+    # Hub: Verbindung eines Workers, erste Zeile enthält die abonnierten Kanäle
+    async def handle_peer(self, reader, writer):
+        try:
+            hello = json.loads(await reader.readline())
+            self.peers[writer] = set(hello.get("subscribe", []))
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                data = json.loads(line)
+                await self.dispatch(data["channel"], data["message"])
+                await self.forward(data["channel"], data["message"], writer)
+        except (ConnectionError, OSError, json.JSONDecodeError):
+            pass
+        finally:
+            self.peers.pop(writer, None)
+            writer.close()
+
+    # Worker: mit dem Hub verbinden und bei Verbindungsabbruch neu verbinden
+    async def client_loop(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                writer.write(self.encode({"subscribe": list(self.callbacks)}))
+                await writer.drain()
+                self.writer = writer
+                await self.dispatch("connected", {})
+
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    data = json.loads(line)
+                    await self.dispatch(data["channel"], data["message"])
+            except (ConnectionError, OSError, json.JSONDecodeError) as e:
+                print(f"Pub/sub connection lost: {e}")
+            finally:
+                self.writer = None
+            await asyncio.sleep(self.reconnect_interval)
+
+
+# Über MongoDB Change Streams (benötigt ein Replica Set): Nachrichten werden in eine
+# Capped Collection geschrieben und von allen anderen Prozessen per watch() gelesen.
+class MongoPubSub(BasePubSub):
+    def __init__(self, database, collection_name="PubSubEvents", size=16 * 1024 * 1024):
+        super().__init__()
+        self.database = database
+        self.collection_name = collection_name
+        self.size = size
+        self.origin = uuid.uuid4().hex
+        self.watch_task = None
+
+    async def start(self):
+        if self.collection_name not in await self.database.list_collection_names():
+            try:
+                await self.database.create_collection(self.collection_name, capped=True, size=self.size)
+            except Exception:
+                # Ein anderer Prozess hat die Collection gerade angelegt
+                pass
+        self.watch_task = asyncio.create_task(self.watch_loop())
+
+    async def stop(self):
+        if self.watch_task:
+            self.watch_task.cancel()
+            try:
+                await self.watch_task
+            except asyncio.CancelledError:
+                pass
+
+    async def publish(self, channel, message):
+        await self.database[self.collection_name].insert_one({
+            "origin": self.origin,
+            "channel": channel,
+            "message": message,
+            "created": datetime.now(),
+        })
+
+    async def watch_loop(self):
+        pipeline = [{"$match": {
+            "operationType": "insert",
+            "fullDocument.origin": {"$ne": self.origin},
+            "fullDocument.channel": {"$in": list(self.callbacks)},
+        }}]
+        while True:
+            try:
+                async with self.database[self.collection_name].watch(pipeline) as stream:
+                    await self.dispatch("connected", {})
+                    async for change in stream:
+                        document = change["fullDocument"]
+                        await self.dispatch(document["channel"], document["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error watching pub/sub events: {e}")
+                await asyncio.sleep(1)
@@ -0,0 +1,99 @@
+import json
+import os
+from collections import namedtuple
+
+RECIPES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recipes.json")
+# Abläufe des alten Simulators (BackendWithWebSocket.py): ohne Ruhen, 14 s Brühen pro Tasse, Anfeuchten mit Wasserfluss 5
+LEGACY_RECIPES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recipes_legacy.json")
+STEP_FIELDS = {"step", "seconds", "water_flow", "temperature", "per_cup"}
+
+# Ein Eintrag pro simulierter Sekunde; temperature ist None, wenn der Schritt sie nicht verändert
+Tick = namedtuple("Tick", ["step", "water_flow", "temperature"])
+
+
+# Temperatur eines Schritts: fester Wert oder [start, ende] als lineare Rampe
+def temperature_profile(temperature, seconds):
+    if temperature is None:
+        return [None] * seconds
+    if isinstance(temperature, (int, float)):
+        return [temperature] * seconds
+    start, end = temperature
+    if seconds == 1:
+        return [end]
+    return [round(start + (end - start) * second / (seconds - 1), 1) for second in range(seconds)]
+
+
+# Rezept (Liste von Schritten) für eine Anzahl Tassen in eine Liste von Ticks umwandeln
+def compile_recipe(steps, amount=1):
+    timeline = []
+    for step in steps:
+        unknown_fields = set(step) - STEP_FIELDS
+        if unknown_fields:
+            raise ValueError(f"unknown fields {sorted(unknown_fields)} in step {step.get('step')}")
+        seconds = int(step["seconds"]) * (amount if step.get("per_cup") else 1)
+        if seconds < 0:
+            raise ValueError(f"negative duration in step {step['step']}")
+
+        water_flow = step.get("water_flow", 0)
+        for temperature in temperature_profile(step.get("temperature"), seconds):
+            timeline.append(Tick(step["step"], water_flow, temperature))
+    return tuple(timeline)
+
+
+# Alle Rezepte, aus recipes.json oder der Collection Recipes ({"_id": name, "steps": [...]})
+class RecipeBook:
+    def __init__(self, recipes=None):
+        self.recipes = {}
+        self.timelines = {}
+        if recipes:
+            self.set_recipes(recipes)
+
+    def __contains__(self, name):
+        return name in self.recipes
+
+    def __iter__(self):
+        return iter(self.recipes)
+
+    # Erst alle Rezepte prüfen, damit ein fehlerhaftes Rezept die bisherigen nicht ersetzt
+    def set_recipes(self, recipes):
+        for name, steps in recipes.items():
+            compile_recipe(steps)
+        self.recipes = dict(recipes)
+        self.timelines = {}
+
+    def load_file(self, path=RECIPES_FILE):
+        try:
+            with open(path, encoding="utf-8") as file:
+                self.set_recipes(json.load(file))
+            return True
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Error loading recipes from {path}: {e}")
+            return False
+
+    async def load_collection(self, collection):
+        try:
+            documents = await collection.find().to_list(length=None)
+            if not documents:
+                return False
+            self.set_recipes({document["_id"]: document["steps"] for document in documents})
+            return True
+        except Exception as e:
+            print(f"Error loading recipes from DB: {e}")
+            return False
+
+    # Timelines werden einmal pro Rezept und Tassenanzahl berechnet
+    def get_timeline(self, name, amount=1):
+        key = (name, amount)
+        if key not in self.timelines:
+            self.timelines[key] = compile_recipe(self.recipes[name], amount)
+        return self.timelines[key]
+
+
+# Timeline im Takt des TickSchedulers abspielen: on_tick pro Eintrag, verspätete Einträge werden übersprungen.
+# is_active() wird vor jedem Eintrag geprüft, False bricht ab.
+async def run_timeline(timeline, scheduler, on_tick, is_active=None):
+    async for index in scheduler.steps(len(timeline)):
+        if is_active and not is_active():
+            return False
+        await on_tick(timeline[index])
+    return True
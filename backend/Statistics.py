@@ -0,0 +1,185 @@
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from Clock import RealClock
+
+UTC_OFFSET = re.compile(r'^[+-]\d{2}(:?\d{2})?$')
+
+
+# Kaffees pro Tag, Sorte und Stärke. createdDate ist ein ISO-Text in UTC, start/end daher UTC ohne Zeitzone,
+# die Tage werden in tz geschnitten. Einträge mit fehlendem oder ungültigem createdDate werden übersprungen.
+def cups_pipeline(start, end, tz):
+    return [
+        {"$addFields": {"created": {"$convert": {"input": "$createdDate", "to": "date", "onError": None, "onNull": None}}}},
+        {"$match": {"created": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created", "timezone": tz}},
+                "type": "$type",
+                "strength": "$strength",
+            },
+            "cups": {"$sum": 1},
+        }},
+        {"$project": {"_id": 0, "day": "$_id.day", "type": "$_id.type", "strength": "$_id.strength", "cups": 1}},
+        {"$sort": {"day": 1, "type": 1, "strength": 1}},
+    ]
+
+
+# Dauer eines Bezugs = Zeit zwischen erstem und letztem Snapshot mit derselben brew_id
+def brew_duration_pipeline(start, end):
+    return [
+        {"$match": {"last_updated": {"$gte": start, "$lt": end}, "brew_id": {"$type": "string"}}},
+        {"$group": {
+            "_id": "$brew_id",
+            "recipe": {"$first": "$recipe"},
+            "started": {"$min": "$last_updated"},
+            "finished": {"$max": "$last_updated"},
+        }},
+        {"$group": {
+            "_id": "$recipe",
+            "brews": {"$sum": 1},
+            "avg_seconds": {"$avg": {"$divide": [{"$subtract": ["$finished", "$started"]}, 1000]}},
+        }},
+        {"$project": {"_id": 0, "recipe": "$_id", "brews": 1, "avg_seconds": {"$round": ["$avg_seconds", 1]}}},
+        {"$sort": {"recipe": 1}},
+    ]
+
+
+# Zeitpunkte, an denen ein Zähler auf 0 zurückgesetzt wurde (Wasser aufgefüllt / Kaffeesatz geleert),
+# je Maschine nach Zeit sortiert, optional nur für eine Maschine
+def reset_events_pipeline(field, start, end, machine_id=None):
+    match = {"last_updated": {"$gte": start, "$lt": end}}
+    if machine_id is not None:
+        match["machine_id"] = machine_id
+    return [
+        {"$match": match},
+        {"$setWindowFields": {
+            "partitionBy": "$machine_id",
+            "sortBy": {"last_updated": 1},
+            "output": {"previous": {"$shift": {"output": f"${field}", "by": -1}}},
+        }},
+        {"$match": {field: 0, "previous": {"$gt": 0}}},
+        {"$sort": {"machine_id": 1, "last_updated": 1}},
+        {"$project": {"_id": 0, "machine_id": 1, "last_updated": 1}},
+    ]
+
+
+# ISO-Zeitpunkt (auch mit "Z") in lokale Zeit ohne Zeitzone umwandeln, wie sie in der StatusHistory steht
+def parse_time(value):
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+
+# Lokale Zeit ohne Zeitzone (aus parse_time) in UTC ohne Zeitzone, wie MongoDB sie für Dates erwartet
+def to_utc(timestamp):
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# Zeitzone für die Tagesgrenzen: Name ("Europe/Berlin") oder Offset ("+02:00") vom Client,
+# sonst der aktuelle Offset des Servers
+def resolve_timezone(value):
+    if value is None:
+        offset = datetime.now().astimezone().strftime('%z')
+        return f"{offset[:3]}:{offset[3:5]}"
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"invalid timezone: {value}")
+    if not UTC_OFFSET.match(value):
+        ZoneInfo(value)
+    return value
+
+
+# Abstände nur zwischen aufeinanderfolgenden Ereignissen derselben Maschine (events: Ereignisse je Maschine)
+def summarize_intervals(events):
+    timestamps_by_machine = {}
+    for event in events:
+        timestamps_by_machine.setdefault(event.get('machine_id'), []).append(event['last_updated'])
+
+    intervals = []
+    for timestamps in timestamps_by_machine.values():
+        timestamps.sort()
+        intervals.extend((later - earlier).total_seconds() for earlier, later in zip(timestamps, timestamps[1:]))
+    if not intervals:
+        return {"events": len(events), "avg_seconds": None, "min_seconds": None, "max_seconds": None}
+    return {
+        "events": len(events),
+        "avg_seconds": round(sum(intervals) / len(intervals), 1),
+        "min_seconds": min(intervals),
+        "max_seconds": max(intervals),
+    }
+
+
+# Statistiken per Aggregation in MongoDB, Ergebnisse werden zwischengespeichert
+class Statistics:
+    def __init__(self, coffee_history_collection, status_history_collection, status_max_age=60, max_entries=100, clock=None):
+        self.coffee_history_collection = coffee_history_collection
+        self.status_history_collection = status_history_collection
+        # Ohne to endet der Zeitraum bei now() dieser Uhr (wie last_updated in der StatusHistory)
+        self.clock = clock or RealClock()
+        # Statistiken aus der StatusHistory ändern sich laufend und werden nach status_max_age Sekunden neu berechnet
+        self.status_max_age = status_max_age
+        self.max_entries = max_entries
+        self.cache = {}
+
+    # Nach jedem neuen Kaffee aufrufen
+    def invalidate_coffee(self):
+        for key in [key for key in self.cache if key[0] == "cups"]:
+            del self.cache[key]
+
+    async def cached(self, key, max_age, compute):
+        entry = self.cache.get(key)
+        if entry and (max_age is None or time.monotonic() - entry[0] < max_age):
+            return entry[1]
+
+        result = await compute()
+        if len(self.cache) >= self.max_entries:
+            oldest_key = min(self.cache, key=lambda cache_key: self.cache[cache_key][0])
+            del self.cache[oldest_key]
+        self.cache[key] = (time.monotonic(), result)
+        return result
+
+    async def get_cups(self, start, end, tz):
+        async def compute():
+            pipeline = cups_pipeline(to_utc(start), to_utc(end), tz)
+            return await self.coffee_history_collection.aggregate(pipeline).to_list(length=None)
+        return await self.cached(("cups", start, end, tz), None, compute)
+
+    async def get_brew_durations(self, start, end):
+        async def compute():
+            pipeline = brew_duration_pipeline(start, end)
+            return await self.status_history_collection.aggregate(pipeline).to_list(length=None)
+        return await self.cached(("brew_durations", start, end), self.status_max_age, compute)
+
+    async def get_refill_intervals(self, start, end, machine_id=None):
+        async def compute():
+            result = {}
+            for name, field in [("water_refill", "cups_since_filled"), ("grounds_emptied", "cups_since_empty")]:
+                pipeline = reset_events_pipeline(field, start, end, machine_id)
+                events = await self.status_history_collection.aggregate(pipeline).to_list(length=None)
+                result[name] = summarize_intervals(events)
+            return result
+        return await self.cached(("refill_intervals", start, end, machine_id), self.status_max_age, compute)
+
+    # Anfrage vom Client: name = "cups" | "brew_durations" | "refill_intervals" | "all", from/to als ISO-Zeitpunkte,
+    # timezone optional für die Tage in cups, machine_id optional für refill_intervals
+    async def query(self, request):
+        machine_id = request.get('machine_id')
+        if machine_id is not None and not isinstance(machine_id, str):
+            raise ValueError("machine_id must be a string")
+        end = parse_time(request['to']) if request.get('to') else self.clock.now()
+        start = parse_time(request['from']) if request.get('from') else end - timedelta(days=30)
+        # Auf Minuten runden, damit ähnliche Anfragen denselben Cache-Eintrag treffen
+        start = start.replace(second=0, microsecond=0)
+        end = end.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+        name = request.get('name', 'all')
+        result = {}
+        if name in ('cups', 'all'):
+            result['cups'] = await self.get_cups(start, end, resolve_timezone(request.get('timezone')))
+        if name in ('brew_durations', 'all'):
+            result['brew_durations'] = await self.get_brew_durations(start, end)
+        if name in ('refill_intervals', 'all'):
+            result['refill_intervals'] = await self.get_refill_intervals(start, end, machine_id)
+        return result
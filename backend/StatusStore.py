@@ -0,0 +1,140 @@
+import asyncio
+import time
+from datetime import datetime
+from Clock import RealClock
+from Metrics import CALL_BUCKETS_MS
+from TickScheduler import LagHistogram
+
+
+# Hält den aktuellen Maschinenstatus im Speicher und schreibt ihn im Hintergrund in den Speicher (siehe Storage.py)
+class StatusStore:
+    def __init__(self, storage, machine_id="machine-1", flush_interval=0.5, retry_interval=2, clock=None, event_log=None):
+        self.storage = storage
+        # Bekommt jede Änderung, um daraus Ereignisse abzuleiten (siehe EventLog.py)
+        self.event_log = event_log
+        self.machine_id = machine_id
+        # Liefert last_updated, damit auch beschleunigte Simulationen passende Zeitstempel schreiben
+        self.clock = clock or RealClock()
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.status = None
+        self.dirty_fields = set()
+        self.flush_event = asyncio.Event()
+        self.flush_task = None
+        # Wird bei jeder inhaltlichen Änderung erhöht, Wartende werden über change_event geweckt
+        self.version = 0
+        self.change_event = asyncio.Event()
+        # Dauer der Schreibvorgänge in den Speicher (für die Metriken)
+        self.write_time = LagHistogram(CALL_BUCKETS_MS)
+
+    # Letzten gespeicherten Status aus der Datenbank laden
+    async def load(self):
+        try:
+            stored_status = await self.storage.load_status(self.machine_id)
+            if stored_status:
+                self.status = stored_status
+        except Exception as e:
+            print(f"Error loading status from DB: {e}")
+        return self.status is not None
+
+    # Kopie des Status mit lesbaren Feldern zurückgeben (ohne DB-Zugriff)
+    def snapshot(self):
+        if self.status is None:
+            return None
+
+        status_copy = self.status.copy()
+        if 'last_updated' in status_copy and isinstance(status_copy['last_updated'], datetime):
+            status_copy['last_updated'] = status_copy['last_updated'].isoformat()
+        return status_copy
+
+    # Kompletten Status ersetzen
+    def replace(self, status_data):
+        self.status = status_data.copy()
+        self.status.pop('_id', None)
+        self.status['machine_id'] = self.machine_id
+        self.status['last_updated'] = self.clock.now()
+        if self.event_log:
+            self.event_log.status = self.status
+        self.mark_dirty(self.status.keys())
+        self.notify_change()
+        return self.status
+
+    # Einzelne Felder ändern, nur tatsächlich geänderte Felder werden später geschrieben
+    def update(self, **updates):
+        if self.status is None:
+            return None
+
+        changed_fields = [key for key, value in updates.items() if self.status.get(key, object()) != value]
+        # Vorherige Werte nur, wenn daraus ein Ereignis werden kann (nicht bei jedem Temperatur-Tick)
+        previous = None
+        if self.event_log and self.event_log.watches(changed_fields):
+            previous = {key: self.status.get(key) for key in changed_fields}
+        self.status.update(updates)
+        self.status['last_updated'] = self.clock.now()
+        self.mark_dirty(changed_fields + ['last_updated'])
+        if changed_fields:
+            self.notify_change()
+        if previous:
+            self.event_log.record(previous, self.status)
+        return self.status
+
+    def mark_dirty(self, fields):
+        self.dirty_fields.update(fields)
+        self.flush_event.set()
+
+    def notify_change(self):
+        self.version += 1
+        self.change_event.set()
+        self.change_event = asyncio.Event()
+
+    # Wartet, bis sich der Status gegenüber der übergebenen Version geändert hat
+    async def wait_for_change(self, version):
+        while self.version == version:
+            await self.change_event.wait()
+        return self.version
+
+    # Hintergrund-Task starten
+    def start(self):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush_loop())
+
+    # Hintergrund-Task beenden und letzten Stand noch speichern
+    async def stop(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+        await self.flush()
+
+    # Mehrere Änderungen innerhalb von flush_interval werden zu einem Schreibvorgang zusammengefasst
+    async def flush_loop(self):
+        while True:
+            await self.flush_event.wait()
+            await asyncio.sleep(self.flush_interval)
+            self.flush_event.clear()
+
+            if not await self.flush():
+                await asyncio.sleep(self.retry_interval)
+                self.flush_event.set()
+
+    # Ein Dokument pro Maschine, nur mit den geänderten Feldern aktualisiert
+    async def flush(self):
+        if not self.dirty_fields or self.status is None:
+            return True
+
+        fields = self.dirty_fields
+        self.dirty_fields = set()
+        changes = {key: self.status[key] for key in fields if key in self.status}
+        started = time.perf_counter()
+        try:
+            await self.storage.save_status(self.machine_id, changes)
+            self.write_time.observe(time.perf_counter() - started)
+            return True
+        except Exception as e:
+            self.write_time.observe(time.perf_counter() - started)
+            self.dirty_fields.update(fields)
+            print(f"Error flushing status to DB: {e}")
+            return False
@@ -0,0 +1,491 @@
+import asyncio
+import json
+import sqlite3
+from collections import deque
+from datetime import datetime
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from HistoryQuery import build_history_filter, build_history_predicate, decode_cursor, ensure_coffee_history_indexes, history_sort_key
+
+# Speicher für Status, StatusHistory und CoffeeHistory. Alle Varianten bieten dieselben Methoden:
+#   ping(), ensure_indexes(), close()
+#   load_status(machine_id), save_status(machine_id, changes)   ein Dokument pro Maschine
+#   insert_status_history(batch)                                Snapshots gebündelt anhängen
+#   find_status_history(machine_id, start, end, batch_size)     Snapshots eines Zeitraums, aufsteigend (Cursor)
+#   insert_coffees(batch), recent_coffees(limit)               Kaffees speichern (je id nur einmal) / neueste zuerst
+#   find_coffees(request, batch_size)                           gefilterter Cursor (async for, close)
+#   append_events(batch), find_events(machine_id, after_seq, batch_size)   Ereignisprotokoll, aufsteigend nach seq
+#   save_snapshot(machine_id, seq, status), load_snapshot(machine_id)      letzter Snapshot pro Maschine
+# database ist nur bei MongoDB gesetzt, Statistik, Verdichtung, Rezepte und MongoPubSub brauchen es.
+# insert_coffees gibt pro Eintrag "stored", "duplicate" (id schon vorhanden) oder "failed" zurück.
+DUPLICATE_KEY_ERROR = 11000
+
+
+# Schlüssel für die Eindeutigkeit ohne MongoDB: 1 und "1" sind wie in MongoDB verschiedene ids
+def coffee_key(coffee_data):
+    return json.dumps(coffee_data.get('id'))
+
+
+# Cursor über Seiten, die fetch nacheinander liefert (leere Liste = Ende), wie ein Motor-Cursor nutzbar
+class BatchCursor:
+    def __init__(self, fetch):
+        self.fetch = fetch
+        self.batch = deque()
+        self.exhausted = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.batch and not self.exhausted:
+            items = await self.fetch()
+            self.batch.extend(items)
+            self.exhausted = not items
+        if not self.batch:
+            await self.close()
+            raise StopAsyncIteration
+        return self.batch.popleft()
+
+    async def close(self):
+        self.exhausted = True
+        self.batch.clear()
+
+
+class MotorStorage:
+    name = "mongo"
+
+    def __init__(self, database):
+        self.database = database
+        self.status_collection = database.Status
+        self.status_history_collection = database.StatusHistory
+        self.coffee_history_collection = database.CoffeeHistory
+        self.events_collection = database.MachineEvents
+        self.snapshots_collection = database.MachineSnapshots
+
+    async def ping(self):
+        await self.database.command('ping')
+
+    async def ensure_indexes(self):
+        await ensure_coffee_history_indexes(self.coffee_history_collection)
+        await self.events_collection.create_index([("machine_id", 1), ("seq", 1)], unique=True)
+
+    async def close(self):
+        self.database.client.close()
+
+    async def load_status(self, machine_id):
+        stored_status = await self.status_collection.find_one({"_id": machine_id})
+        if stored_status:
+            stored_status.pop('_id', None)
+        return stored_status
+
+    # Upsert nur mit den geänderten Feldern
+    async def save_status(self, machine_id, changes):
+        await self.status_collection.update_one({"_id": machine_id}, {"$set": changes}, upsert=True)
+
+    # Kann BulkWriteError auslösen, wenn einzelne Dokumente abgelehnt werden
+    async def insert_status_history(self, batch):
+        await self.status_history_collection.insert_many(batch, ordered=False)
+
+    def find_status_history(self, machine_id, start, end, batch_size):
+        query = {"machine_id": machine_id, "last_updated": {"$gte": start, "$lt": end}}
+        projection = {"_id": 0, "last_updated": 1, "temperature": 1, "water_flow": 1}
+        return self.status_history_collection.find(query, projection).sort("last_updated", 1).batch_size(batch_size)
+
+    # Ein Round Trip pro Batch, doppelte ids lehnt der eindeutige Index auf id ab (ordered=False: der Rest wird geschrieben)
+    async def insert_coffees(self, batch):
+        statuses = ["stored"] * len(batch)
+        try:
+            await self.coffee_history_collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                statuses[error['index']] = "duplicate" if error.get('code') == DUPLICATE_KEY_ERROR else "failed"
+        return statuses
+
+    async def recent_coffees(self, limit):
+        cursor = self.coffee_history_collection.find().sort([("createdDate", -1), ("_id", -1)])
+        return await cursor.to_list(length=limit)
+
+    def find_coffees(self, request, batch_size):
+        query = build_history_filter(request)
+        return self.coffee_history_collection.find(query).sort([("createdDate", -1), ("_id", -1)]).batch_size(batch_size)
+
+    # Ein schon geschriebenes Ereignis (Wiederholung nach einem Fehler) wird über den eindeutigen Index übersprungen
+    async def append_events(self, batch):
+        try:
+            await self.events_collection.insert_many([event.copy() for event in batch], ordered=False)
+        except BulkWriteError as e:
+            if any(error.get('code') != DUPLICATE_KEY_ERROR for error in e.details.get('writeErrors', [])):
+                raise
+
+    def find_events(self, machine_id, after_seq, batch_size):
+        query = {"machine_id": machine_id, "seq": {"$gt": after_seq}}
+        return self.events_collection.find(query, {"_id": 0}).sort("seq", 1).batch_size(batch_size)
+
+    async def save_snapshot(self, machine_id, seq, status):
+        await self.snapshots_collection.replace_one({"_id": machine_id}, {"seq": seq, "status": status}, upsert=True)
+
+    async def load_snapshot(self, machine_id):
+        return await self.snapshots_collection.find_one({"_id": machine_id})
+
+
+# Alles nur im Arbeitsspeicher, z.B. für Lasttests und Benchmarks ohne Datenbank.
+# Die StatusHistory behält nur die neuesten max_status_history Snapshots.
+class MemoryStorage:
+    name = "memory"
+    database = None
+
+    def __init__(self, max_status_history=100000):
+        self.status = {}
+        self.status_history = deque(maxlen=max_status_history)
+        self.coffee_history = []
+        self.coffee_keys = set()
+        self.events = {}
+        self.snapshots = {}
+
+    async def ping(self):
+        pass
+
+    async def ensure_indexes(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def load_status(self, machine_id):
+        stored_status = self.status.get(machine_id)
+        return stored_status.copy() if stored_status else None
+
+    async def save_status(self, machine_id, changes):
+        self.status.setdefault(machine_id, {}).update(changes)
+
+    async def insert_status_history(self, batch):
+        self.status_history.extend(status.copy() for status in batch)
+
+    def find_status_history(self, machine_id, start, end, batch_size):
+        items = [
+            status for status in self.status_history
+            if status.get('machine_id') == machine_id
+            and isinstance(status.get('last_updated'), datetime) and start <= status['last_updated'] < end
+        ]
+        items.sort(key=lambda status: status['last_updated'])
+        pages = deque(items[index:index + batch_size] for index in range(0, len(items), batch_size))
+
+        async def fetch():
+            return pages.popleft() if pages else []
+        return BatchCursor(fetch)
+
+    async def insert_coffees(self, batch):
+        statuses = []
+        for coffee_data in batch:
+            key = coffee_key(coffee_data)
+            if key in self.coffee_keys:
+                statuses.append("duplicate")
+                continue
+            coffee_data.setdefault('_id', ObjectId())
+            self.coffee_history.append(coffee_data.copy())
+            self.coffee_keys.add(key)
+            statuses.append("stored")
+        return statuses
+
+    async def recent_coffees(self, limit):
+        return sorted(self.coffee_history, key=history_sort_key, reverse=True)[:limit]
+
+    def find_coffees(self, request, batch_size):
+        matches = build_history_predicate(request)
+        items = sorted(
+            (item for item in self.coffee_history if matches(item)), key=history_sort_key, reverse=True
+        )
+        pages = deque(items[index:index + batch_size] for index in range(0, len(items), batch_size))
+
+        async def fetch():
+            return pages.popleft() if pages else []
+        return BatchCursor(fetch)
+
+    async def append_events(self, batch):
+        for event in batch:
+            events = self.events.setdefault(event['machine_id'], [])
+            if not events or event['seq'] > events[-1]['seq']:
+                events.append(event.copy())
+
+    def find_events(self, machine_id, after_seq, batch_size):
+        items = [event for event in self.events.get(machine_id, []) if event['seq'] > after_seq]
+        pages = deque(items[index:index + batch_size] for index in range(0, len(items), batch_size))
+
+        async def fetch():
+            return pages.popleft() if pages else []
+        return BatchCursor(fetch)
+
+    async def save_snapshot(self, machine_id, seq, status):
+        self.snapshots[machine_id] = {"seq": seq, "status": status.copy()}
+
+    async def load_snapshot(self, machine_id):
+        snapshot = self.snapshots.get(machine_id)
+        return {"seq": snapshot["seq"], "status": snapshot["status"].copy()} if snapshot else None
+
+
+# Datum in JSON als {"$date": "..."} ablegen, damit last_updated beim Laden wieder ein datetime ist
+def encode_value(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def decode_object(item):
+    if len(item) == 1 and "$date" in item:
+        return datetime.fromisoformat(item["$date"])
+    return item
+
+
+def to_json(data):
+    return json.dumps(data, default=encode_value)
+
+
+def from_json(text):
+    return json.loads(text, object_hook=decode_object)
+
+
+def sort_text(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS status (machine_id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS status_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, machine_id TEXT, last_updated TEXT, data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS status_history_machine_time ON status_history (machine_id, last_updated);
+CREATE TABLE IF NOT EXISTS coffee_history (
+    id TEXT PRIMARY KEY, coffee_key TEXT, created_date TEXT, type TEXT, strength INTEGER, data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coffee_history_created ON coffee_history (created_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS coffee_history_type ON coffee_history (type, created_date DESC, id DESC);
+CREATE TABLE IF NOT EXISTS machine_events (
+    machine_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (machine_id, seq)
+);
+CREATE TABLE IF NOT EXISTS machine_snapshots (machine_id TEXT PRIMARY KEY, seq INTEGER NOT NULL, data TEXT NOT NULL);
+"""
+
+
+# Eine SQLite-Datei für Installationen auf einem einzelnen Rechner (ohne MongoDB-Server).
+# sqlite3 blockiert, daher läuft jeder Zugriff in einem Thread, nacheinander über lock.
+class SqliteStorage:
+    name = "sqlite"
+    database = None
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+        self.lock = asyncio.Lock()
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL: Lesen blockiert das Schreiben nicht, synchronous=NORMAL reicht dafür aus
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SQLITE_SCHEMA)
+            # Dateien aus älteren Versionen haben noch keine Spalte coffee_key (alte Einträge bleiben NULL)
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(coffee_history)")]
+            if "coffee_key" not in columns:
+                self.connection.execute("ALTER TABLE coffee_history ADD COLUMN coffee_key TEXT")
+            self.connection.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS coffee_history_key ON coffee_history (coffee_key)"
+            )
+        return self.connection
+
+    async def run(self, function, *args):
+        async with self.lock:
+            return await asyncio.to_thread(function, self.connect(), *args)
+
+    async def ping(self):
+        await self.run(lambda connection: connection.execute("SELECT 1").fetchone())
+
+    async def ensure_indexes(self):
+        # Tabellen und Indizes legt connect() an
+        await self.run(lambda connection: None)
+
+    async def close(self):
+        async with self.lock:
+            if self.connection is not None:
+                await asyncio.to_thread(self.connection.close)
+                self.connection = None
+
+    async def load_status(self, machine_id):
+        def load(connection):
+            row = connection.execute("SELECT data FROM status WHERE machine_id = ?", (machine_id,)).fetchone()
+            return from_json(row[0]) if row else None
+        return await self.run(load)
+
+    # Geänderte Felder in das gespeicherte Dokument übernehmen
+    async def save_status(self, machine_id, changes):
+        def save(connection):
+            row = connection.execute("SELECT data FROM status WHERE machine_id = ?", (machine_id,)).fetchone()
+            status = from_json(row[0]) if row else {}
+            status.update(changes)
+            with connection:
+                connection.execute(
+                    "INSERT INTO status (machine_id, data) VALUES (?, ?) "
+                    "ON CONFLICT (machine_id) DO UPDATE SET data = excluded.data",
+                    (machine_id, to_json(status))
+                )
+        await self.run(save)
+
+    async def insert_status_history(self, batch):
+        rows = [
+            (status.get('machine_id'), sort_text(status.get('last_updated')), to_json(status))
+            for status in batch
+        ]
+
+        def insert(connection):
+            with connection:
+                connection.executemany(
+                    "INSERT INTO status_history (machine_id, last_updated, data) VALUES (?, ?, ?)", rows
+                )
+        await self.run(insert)
+
+    # Keyset über die Spalte id (Einfügereihenfolge = Zeitreihenfolge), damit lange Zeiträume nicht auf einmal gelesen werden
+    def find_status_history(self, machine_id, start, end, batch_size):
+        last_id = 0
+
+        async def fetch():
+            nonlocal last_id
+            rows = await self.run(lambda connection: connection.execute(
+                "SELECT id, data FROM status_history WHERE machine_id = ? AND last_updated >= ? AND last_updated < ? "
+                "AND id > ? ORDER BY id LIMIT ?",
+                (machine_id, sort_text(start), sort_text(end), last_id, batch_size)
+            ).fetchall())
+            if rows:
+                last_id = rows[-1][0]
+            return [from_json(row[1]) for row in rows]
+        return BatchCursor(fetch)
+
+    # Eine Transaktion pro Batch, doppelte ids überspringt INSERT OR IGNORE über den eindeutigen Index
+    async def insert_coffees(self, batch):
+        rows = []
+        for coffee_data in batch:
+            coffee_data.setdefault('_id', ObjectId())
+            rows.append((
+                str(coffee_data['_id']),
+                coffee_key(coffee_data),
+                sort_text(coffee_data.get('createdDate')),
+                coffee_data.get('type'),
+                coffee_data.get('strength'),
+                to_json({key: value for key, value in coffee_data.items() if key != '_id'}),
+            ))
+
+        def insert(connection):
+            statuses = []
+            with connection:
+                for row in rows:
+                    cursor = connection.execute(
+                        "INSERT OR IGNORE INTO coffee_history (id, coffee_key, created_date, type, strength, data) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", row
+                    )
+                    statuses.append("stored" if cursor.rowcount else "duplicate")
+            return statuses
+        return await self.run(insert)
+
+    @staticmethod
+    def coffee_from_row(row):
+        item = from_json(row[1])
+        item['_id'] = ObjectId(row[0])
+        return item
+
+    async def recent_coffees(self, limit):
+        def select(connection):
+            return connection.execute(
+                "SELECT id, data FROM coffee_history ORDER BY created_date DESC, id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self.coffee_from_row(row) for row in await self.run(select)]
+
+    # Gleiche Filter wie build_history_filter, als SQL-Bedingungen. Jede weitere Seite setzt
+    # per Keyset (created_date, id) nach dem letzten Eintrag der vorherigen Seite an.
+    def find_coffees(self, request, batch_size):
+        conditions = []
+        parameters = []
+        if request.get('from'):
+            conditions.append("created_date >= ?")
+            parameters.append(request['from'])
+        if request.get('to'):
+            conditions.append("created_date < ?")
+            parameters.append(request['to'])
+        if request.get('coffee_type'):
+            conditions.append("type = ?")
+            parameters.append(request['coffee_type'])
+        if request.get('strength') is not None:
+            conditions.append("strength = ?")
+            parameters.append(int(request['strength']))
+        after = None
+        if request.get('after'):
+            created_date, object_id = decode_cursor(request['after'])
+            after = (created_date, str(object_id))
+
+        async def fetch():
+            nonlocal after
+            page_conditions = list(conditions)
+            page_parameters = list(parameters)
+            if after:
+                page_conditions.append("(created_date < ? OR (created_date = ? AND id < ?))")
+                page_parameters.extend([after[0], after[0], after[1]])
+            where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
+            query = f"SELECT id, data, created_date FROM coffee_history {where} ORDER BY created_date DESC, id DESC LIMIT ?"
+            rows = await self.run(lambda connection: connection.execute(query, (*page_parameters, batch_size)).fetchall())
+            if rows:
+                after = (rows[-1][2], rows[-1][0])
+            return [self.coffee_from_row(row) for row in rows]
+        return BatchCursor(fetch)
+
+    async def append_events(self, batch):
+        rows = [(event['machine_id'], event['seq'], to_json(event)) for event in batch]
+
+        def insert(connection):
+            with connection:
+                connection.executemany("INSERT OR IGNORE INTO machine_events (machine_id, seq, data) VALUES (?, ?, ?)", rows)
+        await self.run(insert)
+
+    def find_events(self, machine_id, after_seq, batch_size):
+        last_seq = after_seq
+
+        async def fetch():
+            nonlocal last_seq
+            rows = await self.run(lambda connection: connection.execute(
+                "SELECT seq, data FROM machine_events WHERE machine_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (machine_id, last_seq, batch_size)
+            ).fetchall())
+            if rows:
+                last_seq = rows[-1][0]
+            return [from_json(row[1]) for row in rows]
+        return BatchCursor(fetch)
+
+    async def save_snapshot(self, machine_id, seq, status):
+        def save(connection):
+            with connection:
+                connection.execute(
+                    "INSERT INTO machine_snapshots (machine_id, seq, data) VALUES (?, ?, ?) "
+                    "ON CONFLICT (machine_id) DO UPDATE SET seq = excluded.seq, data = excluded.data",
+                    (machine_id, seq, to_json(status))
+                )
+        await self.run(save)
+
+    async def load_snapshot(self, machine_id):
+        def load(connection):
+            row = connection.execute("SELECT seq, data FROM machine_snapshots WHERE machine_id = ?", (machine_id,)).fetchone()
+            return {"seq": row[0], "status": from_json(row[1])} if row else None
+        return await self.run(load)
+
+
+# DATABASE_URL: mongodb://... (Standard), memory, mongomock (MongoDB-API im Speicher) oder sqlite:///datei.db
+def create_storage(url):
+    if url == "memory":
+        return MemoryStorage()
+    if url.startswith("sqlite:"):
+        path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else url[len("sqlite:"):]
+        return SqliteStorage(path)
+    if url == "mongomock":
+        from mongomock_motor import AsyncMongoMockClient
+        return MotorStorage(AsyncMongoMockClient().Kaffeemaschine)
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    return MotorStorage(AsyncIOMotorClient(url).Kaffeemaschine)
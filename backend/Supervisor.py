@@ -0,0 +1,185 @@
+import asyncio
+import time
+from collections import deque
+from TickScheduler import LagHistogram
+
+# Buckets für Wartezeit, Laufzeit und Abbruchzeit einer Operation in Millisekunden
+OPERATION_BUCKETS_MS = [1, 5, 25, 100, 500, 1000, 5000, 30000, 60000, 300000]
+
+
+# Hält Referenzen auf Hintergrund-Tasks, protokolliert ihre Fehler und räumt sie beim Beenden ab
+class TaskSupervisor:
+    def __init__(self):
+        self.tasks = set()
+
+    def spawn(self, coroutine, name=None):
+        task = asyncio.create_task(coroutine, name=name)
+        self.tasks.add(task)
+        task.add_done_callback(self.reap)
+        return task
+
+    def reap(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error in background task {task.get_name()}: {task.exception()}")
+
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class Operation:
+    def __init__(self, name, factory, preempt):
+        self.name = name
+        self.factory = factory
+        self.preempt = preempt
+        self.enqueued = time.monotonic()
+        self.started = None
+        self.task = None
+        # Ergebnis für den Aufrufer: Rückgabewert der Operation, "cancelled", "coalesced" oder "duplicate"
+        self.future = asyncio.get_running_loop().create_future()
+
+    def resolve(self, result):
+        if not self.future.done():
+            self.future.set_result(result)
+
+
+# Führt alle Operationen einer Maschine nacheinander aus einer Warteschlange aus.
+# preempt=True (Aufheizen, Abkühlen, Brühen): laufen im Hintergrund und werden von der nächsten
+# solchen Operation abgebrochen. Erst wenn der Abbruch inkl. Aufräumen fertig ist, startet die neue.
+# preempt=False (Wasser auffüllen, ...): kurze Zustandsänderungen, laufen sofort in Reihenfolge.
+class MachineSupervisor:
+    def __init__(self, machine_id):
+        self.machine_id = machine_id
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.current = None
+        self.worker_task = None
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "coalesced": 0, "duplicate": 0}
+        self.queue_wait = LagHistogram(OPERATION_BUCKETS_MS)
+        self.run_time = LagHistogram(OPERATION_BUCKETS_MS)
+        self.cancel_time = LagHistogram(OPERATION_BUCKETS_MS)
+
+    def submit(self, name, factory, preempt=True):
+        operation = Operation(name, factory, preempt)
+        self.stats["submitted"] += 1
+        self.pending.append(operation)
+        self.wakeup.set()
+        if self.worker_task is None or self.worker_task.done():
+            self.worker_task = asyncio.create_task(self.worker_loop(), name=f"supervisor-{self.machine_id}")
+        return operation.future
+
+    def is_busy(self):
+        return self.current is not None or bool(self.pending)
+
+    # Beenden: laufende, gerade bearbeitete und wartende Operationen bekommen alle ein Ergebnis ("cancelled"),
+    # damit kein Aufrufer, der auf sein ack wartet, hängen bleibt
+    async def stop(self):
+        if self.worker_task:
+            self.worker_task.cancel()
+            try:
+                await self.worker_task
+            except asyncio.CancelledError:
+                pass
+            self.worker_task = None
+        await self.cancel_current()
+        while self.pending:
+            self.stats["cancelled"] += 1
+            self.pending.popleft().resolve("cancelled")
+
+    async def worker_loop(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+
+            if self.current and self.current.task.done():
+                self.finish(self.current)
+
+            while self.pending:
+                operation = self.pending.popleft()
+
+                # Mehrere wartende lange Operationen: nur die neueste zählt
+                if operation.preempt and any(later.preempt for later in self.pending):
+                    self.stats["coalesced"] += 1
+                    operation.resolve("coalesced")
+                    continue
+                # Der Name enthält alle Parameter (z.B. "Brew:Espresso:2"), nur eine identische Operation ist doppelt
+                if operation.preempt and self.current and self.current.name == operation.name:
+                    self.stats["duplicate"] += 1
+                    operation.resolve("duplicate")
+                    continue
+
+                try:
+                    if operation.preempt:
+                        await self.cancel_current()
+                        self.start(operation)
+                    else:
+                        await self.run_inline(operation)
+                except asyncio.CancelledError:
+                    # stop() während des Abbruchs der vorherigen oder während einer kurzen Operation
+                    if not operation.future.done():
+                        self.stats["cancelled"] += 1
+                        operation.resolve("cancelled")
+                    raise
+
+    def start(self, operation):
+        operation.started = time.monotonic()
+        self.queue_wait.observe(operation.started - operation.enqueued)
+        operation.task = asyncio.create_task(operation.factory(), name=f"{self.machine_id}-{operation.name}")
+        operation.task.add_done_callback(lambda task: self.wakeup.set())
+        self.current = operation
+
+    def finish(self, operation):
+        self.current = None
+        self.run_time.observe(time.monotonic() - operation.started)
+        if operation.task.cancelled():
+            self.stats["cancelled"] += 1
+            operation.resolve("cancelled")
+        elif operation.task.exception() is not None:
+            self.stats["failed"] += 1
+            print(f"Error in operation {operation.name} on {self.machine_id}: {operation.task.exception()}")
+            operation.resolve("failed")
+        else:
+            self.stats["completed"] += 1
+            operation.resolve(operation.task.result())
+
+    # Laufende Operation abbrechen und warten, bis ihr Aufräumen (z.B. update_step) abgeschlossen ist
+    async def cancel_current(self):
+        operation = self.current
+        if operation is None:
+            return
+        if not operation.task.done():
+            cancel_started = time.monotonic()
+            operation.task.cancel()
+            await asyncio.wait([operation.task])
+            self.cancel_time.observe(time.monotonic() - cancel_started)
+            self.stats["cancelled"] += 1
+            self.run_time.observe(time.monotonic() - operation.started)
+            self.current = None
+            operation.resolve("cancelled")
+        else:
+            self.finish(operation)
+
+    async def run_inline(self, operation):
+        operation.started = time.monotonic()
+        self.queue_wait.observe(operation.started - operation.enqueued)
+        try:
+            result = await operation.factory()
+            self.stats["completed"] += 1
+            operation.resolve(result)
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"Error in operation {operation.name} on {self.machine_id}: {e}")
+            operation.resolve("failed")
+        self.run_time.observe(time.monotonic() - operation.started)
+
+    def snapshot(self):
+        return {
+            "current": self.current.name if self.current else None,
+            "pending": len(self.pending),
+            **self.stats,
+            "queue_wait": self.queue_wait.snapshot(),
+            "run_time": self.run_time.snapshot(),
+            "cancel_time": self.cancel_time.snapshot(),
+        }
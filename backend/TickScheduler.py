@@ -0,0 +1,142 @@
+import asyncio
+
+# Obergrenzen der Histogramm-Buckets in Millisekunden
+LAG_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+
+# Verteilung der Verspätungen: wie weit nach seiner Deadline ein Tick tatsächlich ausgelöst wurde
+class LagHistogram:
+    def __init__(self, buckets=LAG_BUCKETS_MS):
+        self.buckets = list(buckets)
+        # Letzter Eintrag zählt alles über dem größten Bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, lag_seconds):
+        lag_ms = max(0.0, lag_seconds * 1000)
+        index = 0
+        while index < len(self.buckets) and lag_ms > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum_ms += lag_ms
+        self.max_ms = max(self.max_ms, lag_ms)
+
+    # Zählt die Werte eines anderen Histogramms mit denselben Buckets hinzu
+    def add(self, other):
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum_ms += other.sum_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    # Obergrenze des Buckets, in dem das Perzentil liegt (höchstens der gemessene Maximalwert)
+    def percentile(self, percent):
+        if not self.count:
+            return None
+        target = percent / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                break
+        if index < len(self.buckets):
+            return round(min(self.buckets[index], self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+    def snapshot(self):
+        buckets = {str(bucket): count for bucket, count in zip(self.buckets, self.counts)}
+        buckets["+Inf"] = self.counts[-1]
+        return {
+            "buckets": buckets,
+            "count": self.count,
+            "sum_ms": round(self.sum_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+        }
+
+
+# Gemeinsamer Takt für alle Simulationen. Ein Task schläft bis zur nächsten absoluten Deadline
+# (Raster start + n * interval) und weckt dann alle wartenden Simulationen auf einmal.
+# Die Dauer der Arbeit pro Tick verschiebt das Raster nicht; ist der Takt zu spät, zählt tick
+# alle verpassten Rasterpunkte mit, damit Abläufe ihre Gesamtdauer einhalten.
+class TickScheduler:
+    def __init__(self, clock, interval=1, idle_ticks=2):
+        self.clock = clock
+        self.interval = interval
+        # Ohne Wartende läuft der Takt noch idle_ticks Ticks weiter und beendet sich dann
+        self.idle_ticks = idle_ticks
+        self.tick = 0
+        self.tick_event = asyncio.Event()
+        self.waiters = 0
+        self.driver_task = None
+        self.lag = LagHistogram()
+        self.stats = {"ticks": 0, "skipped": 0}
+
+    def ensure_running(self):
+        if self.driver_task is None or self.driver_task.done():
+            self.driver_task = asyncio.create_task(self.drive())
+
+    async def stop(self):
+        if self.driver_task:
+            self.driver_task.cancel()
+            try:
+                await self.driver_task
+            except asyncio.CancelledError:
+                pass
+            self.driver_task = None
+
+    # Wartet, bis tick größer als last_tick ist, und gibt den aktuellen tick zurück
+    async def wait_tick(self, last_tick):
+        while self.tick <= last_tick:
+            self.ensure_running()
+            event = self.tick_event
+            self.waiters += 1
+            try:
+                await event.wait()
+            finally:
+                self.waiters -= 1
+        return self.tick
+
+    async def drive(self):
+        deadline = self.clock.monotonic() + self.interval
+        idle = 0
+        while True:
+            delay = deadline - self.clock.monotonic()
+            if delay > 0:
+                await self.clock.sleep(delay)
+
+            lag = self.clock.monotonic() - deadline
+            self.lag.observe(lag)
+            missed = max(0, int(lag // self.interval))
+            self.tick += 1 + missed
+            self.stats["ticks"] += 1
+            self.stats["skipped"] += missed
+            deadline += (1 + missed) * self.interval
+
+            idle = idle + 1 if self.waiters == 0 else 0
+            event = self.tick_event
+            self.tick_event = asyncio.Event()
+            event.set()
+            if idle >= self.idle_ticks:
+                return
+
+    # Schrittnummern 0..count-1 im Takt: der erste Schritt sofort, jeder weitere beim nächsten Tick.
+    # skip_late=True überspringt verpasste Schritte (gleiche Gesamtdauer), sonst werden sie nachgeholt.
+    async def steps(self, count, skip_late=True):
+        start = self.tick
+        index = 0
+        while index < count:
+            yield index
+            tick = await self.wait_tick(start + index)
+            index = tick - start if skip_late else index + 1
+
+    def snapshot(self):
+        return {
+            "interval": self.interval,
+            "ticks": self.stats["ticks"],
+            "skipped": self.stats["skipped"],
+            "lag": self.lag.snapshot(),
+        }
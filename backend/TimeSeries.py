@@ -0,0 +1,183 @@
+from datetime import datetime, timedelta
+from Statistics import parse_time
+
+# Zeitreihen (Temperatur, Wasserfluss) aus der StatusHistory für Diagramme.
+# Die Rohdaten werden beim Lesen in Zeitfenster einsortiert (Minimum und Maximum je Fenster), danach
+# wählt LTTB (Largest Triangle Three Buckets) daraus höchstens points Punkte aus. So bleibt der Speicher
+# unabhängig von der Länge des Zeitraums und Spitzen gehen nicht verloren.
+SERIES_FIELDS = ["temperature", "water_flow"]
+DEFAULT_POINTS = 300
+MAX_POINTS = 1000
+DEFAULT_WINDOW = timedelta(hours=1)
+# Vorauswahl vor LTTB: so viele Zeitfenster pro Zielpunkt
+PRESELECT_FACTOR = 4
+CHUNK_SIZE = 100
+# Ab dieser Länge werden die verdichteten Collections statt der Roh-Snapshots gelesen (nur MongoDB)
+ROLLUP_MINUTE_AFTER = timedelta(hours=6)
+ROLLUP_HOUR_AFTER = timedelta(days=14)
+
+
+def to_milliseconds(timestamp):
+    return int(timestamp.timestamp() * 1000)
+
+
+# Minimum und Maximum je Zeitfenster, Punkte als (Zeit in ms, Wert)
+class MinMaxBuckets:
+    def __init__(self, start_ms, end_ms, buckets):
+        self.start_ms = start_ms
+        self.width = max(1, (end_ms - start_ms) / buckets)
+        self.buckets = buckets
+        self.minimum = {}
+        self.maximum = {}
+
+    def add(self, time_ms, value):
+        index = min(self.buckets - 1, max(0, int((time_ms - self.start_ms) / self.width)))
+        if index not in self.minimum or value < self.minimum[index][1]:
+            self.minimum[index] = (time_ms, value)
+        if index not in self.maximum or value > self.maximum[index][1]:
+            self.maximum[index] = (time_ms, value)
+
+    def points(self):
+        result = []
+        for index in sorted(self.minimum):
+            pair = {self.minimum[index], self.maximum[index]}
+            result.extend(sorted(pair))
+        return result
+
+
+# Largest Triangle Three Buckets: behält je Bucket den Punkt, der mit dem vorherigen gewählten Punkt und
+# dem Mittelwert des nächsten Buckets das größte Dreieck bildet. Erster und letzter Punkt bleiben erhalten.
+def lttb(points, threshold):
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    previous = points[0]
+
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(points))
+        next_points = points[next_start:next_end] or [points[-1]]
+        average_time = sum(point[0] for point in next_points) / len(next_points)
+        average_value = sum(point[1] for point in next_points) / len(next_points)
+
+        best = None
+        best_area = -1
+        for point in points[start:end]:
+            area = abs(
+                (previous[0] - average_time) * (point[1] - previous[1])
+                - (previous[0] - point[0]) * (average_value - previous[1])
+            )
+            if area > best_area:
+                best_area = area
+                best = point
+        sampled.append(best)
+        previous = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+# Anfrage vom Client: machine_id, fields, from/to (ISO), points, method = "lttb" | "minmax".
+# Ohne to endet der Zeitraum bei now() der Uhr des Backends, von der auch last_updated in der StatusHistory kommt.
+def parse_series_request(request, default_machine_id, now):
+    end = parse_time(request['to']) if request.get('to') else now
+    start = parse_time(request['from']) if request.get('from') else end - DEFAULT_WINDOW
+    if end <= start:
+        raise ValueError("from must be before to")
+
+    fields = request.get('fields') or SERIES_FIELDS
+    if any(field not in SERIES_FIELDS for field in fields):
+        raise ValueError(f"fields must be from {SERIES_FIELDS}")
+
+    points = max(3, min(int(request.get('points', DEFAULT_POINTS)), MAX_POINTS))
+    method = request.get('method', 'lttb')
+    if method not in ('lttb', 'minmax'):
+        raise ValueError("method must be lttb or minmax")
+
+    return {
+        "machine_id": request.get('machine_id') or default_machine_id,
+        "start": start,
+        "end": end,
+        "fields": list(fields),
+        "points": points,
+        "method": method,
+    }
+
+
+# Werte aus einem verdichteten Eintrag (StatusHistory_1m / _1h): Min/Max der Temperatur, mittlerer Wasserfluss
+def rollup_values(item, field):
+    if field == "temperature":
+        return [item.get('temperature_min'), item.get('temperature_max')]
+    if item.get('samples'):
+        return [item.get('water_flow_total', 0) / item['samples']]
+    return []
+
+
+async def read_samples(storage, query, history_retention, selectors):
+    window = query["end"] - query["start"]
+    unit = None
+    if history_retention is not None:
+        if window > ROLLUP_HOUR_AFTER:
+            unit = "hour"
+        elif window > ROLLUP_MINUTE_AFTER:
+            unit = "minute"
+
+    samples = 0
+    if unit:
+        for item in await history_retention.get_rollups(unit, query["start"], query["end"], query["machine_id"]):
+            time_ms = to_milliseconds(item['bucket'])
+            for field, selector in selectors.items():
+                for value in rollup_values(item, field):
+                    if isinstance(value, (int, float)):
+                        selector.add(time_ms, value)
+            samples += 1
+        return samples, unit
+
+    cursor = storage.find_status_history(query["machine_id"], query["start"], query["end"], 1000)
+    async for item in cursor:
+        timestamp = item.get('last_updated')
+        if not isinstance(timestamp, datetime):
+            continue
+        time_ms = to_milliseconds(timestamp)
+        for field, selector in selectors.items():
+            value = item.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                selector.add(time_ms, value)
+        samples += 1
+    return samples, "raw"
+
+
+# Liest den Zeitraum einmal und gibt je Feld höchstens points Punkte zurück
+async def query_series(storage, query, history_retention=None):
+    start_ms = to_milliseconds(query["start"])
+    end_ms = to_milliseconds(query["end"])
+    points = query["points"]
+    # minmax liefert zwei Punkte pro Fenster, LTTB wählt aus einer größeren Vorauswahl
+    buckets = points // 2 if query["method"] == "minmax" else points * PRESELECT_FACTOR
+    selectors = {field: MinMaxBuckets(start_ms, end_ms, buckets) for field in query["fields"]}
+
+    samples, source = await read_samples(storage, query, history_retention, selectors)
+
+    series = {}
+    for field, selector in selectors.items():
+        preselected = selector.points()
+        series[field] = preselected[:points] if query["method"] == "minmax" else lttb(preselected, points)
+    return {"samples": samples, "source": source, "series": series}
+
+
+# Punkte in Stücken zu CHUNK_SIZE an send_chunk, das letzte Stück hat done=True
+async def stream_series(result, send_chunk):
+    chunks = []
+    for field, points in result["series"].items():
+        for index in range(0, len(points), CHUNK_SIZE):
+            chunks.append((field, [list(point) for point in points[index:index + CHUNK_SIZE]]))
+        if not points:
+            chunks.append((field, []))
+
+    for number, (field, points) in enumerate(chunks):
+        await send_chunk(field, points, number == len(chunks) - 1)
@@ -1,5 +1,17 @@
+import argparse
 import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
 import websockets
+from Clock import add_clock_arguments
+
+# Ohne Parameter: interaktive Konsole für einen Client.
+# Mit --load: viele simulierte Dashboards und Bediener gleichzeitig, am Ende ein Bericht.
 
 async def listen(websocket):
     """Empfängt Nachrichten vom Server und druckt sie."""
@@ -20,13 +32,354 @@ async def send(websocket):
             break
         await websocket.send(msg)
 
-async def main():
-    async with websockets.connect("ws://localhost:8765") as websocket:
-        print("Verbunden mit Server (ws://localhost:8765)")
+async def interactive(url):
+    async with websockets.connect(url) as websocket:
+        print(f"Verbunden mit Server ({url})")
         await asyncio.gather(
             listen(websocket),
             send(websocket),
         )
 
+
+# Befehlsmix der Bediener (Gewichte) und woran man im Status erkennt, dass der Befehl angekommen ist
+COMMAND_MIX = {
+    "heat_up": 3,
+    "brew": 4,
+    "water_fill_up": 1,
+    "ground_clearing": 1,
+    "cool_down": 1,
+}
+
+STATUS_CHECKS = {
+    "heat_up": lambda status: status.get('current_step') == "HeatUp" or status.get('temperature', 0) >= 94,
+    "cool_down": lambda status: status.get('current_step') == "CoolDown" or not status.get('powered_on', True),
+    "brew": lambda status: status.get('current_step') in ("Grind", "Water empty", "Grounds full"),
+    "water_fill_up": lambda status: status.get('cups_since_filled') == 0,
+    "ground_clearing": lambda status: status.get('cups_since_empty') == 0,
+}
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+class LoadStats:
+    def __init__(self):
+        self.connect_ms = []
+        self.connect_failed = 0
+        self.disconnects = 0
+        self.frames = 0
+        self.bytes = 0
+        # Übersprungene Sequenznummern in Status-Frames (vom Broadcaster zusammengefasst oder verworfen)
+        self.skipped_frames = 0
+        self.ack_ms = []
+        self.server_ms = []
+        self.status_ms = []
+        self.command_results = {}
+        self.status_timeouts = 0
+        # Befehle, deren Ziel-Zustand schon vorher erreicht war (z.B. Wasser auffüllen bei vollem Tank)
+        self.status_unchanged = 0
+
+    def count_result(self, status):
+        self.command_results[status] = self.command_results.get(status, 0) + 1
+
+
+# Eine Verbindung: empfängt alle Frames, führt den aktuellen Status pro Maschine mit (auch aus Delta-Frames)
+class LoadClient:
+    def __init__(self, url, stats, machine_id=None, delta=False):
+        self.url = url
+        self.stats = stats
+        self.machine_id = machine_id
+        self.delta = delta
+        self.websocket = None
+        self.status = {}
+        self.last_seq = {}
+        self.status_changed = asyncio.Event()
+        self.acks = {}
+
+    async def connect(self):
+        started = time.perf_counter()
+        try:
+            self.websocket = await websockets.connect(self.url, max_queue=None)
+        except (OSError, websockets.exceptions.WebSocketException):
+            self.stats.connect_failed += 1
+            return False
+        self.stats.connect_ms.append((time.perf_counter() - started) * 1000)
+
+        if self.delta:
+            await self.websocket.send(json.dumps({"type": "hello", "delta": True}))
+        if self.machine_id:
+            await self.websocket.send(json.dumps({"type": "subscribe", "machines": [self.machine_id]}))
+        return True
+
+    async def receive_loop(self, stop_event):
+        try:
+            async for message in self.websocket:
+                self.stats.frames += 1
+                self.stats.bytes += len(message)
+                self.handle_frame(json.loads(message))
+        except websockets.exceptions.ConnectionClosed:
+            if not stop_event.is_set():
+                self.stats.disconnects += 1
+
+    def handle_frame(self, frame):
+        if frame.get('type') in ('status', 'status_delta'):
+            machine_id = frame.get('machine_id')
+            seq = frame.get('seq')
+            last_seq = self.last_seq.get(machine_id)
+            if seq is not None and last_seq is not None and seq > last_seq + 1:
+                self.stats.skipped_frames += seq - last_seq - 1
+            if seq is not None:
+                self.last_seq[machine_id] = seq
+
+            if frame['type'] == 'status':
+                self.status[machine_id] = frame['data']
+            else:
+                self.status.setdefault(machine_id, {}).update(frame['data'])
+            self.status_changed.set()
+        elif frame.get('type') == 'ack':
+            future = self.acks.pop(frame.get('request_id'), None)
+            if future and not future.done():
+                future.set_result(frame)
+
+    # Status der bedienten Maschine (vor dem subscribe kommt noch der Status von machine-1)
+    def machine_status(self):
+        return self.status.get(self.machine_id, {})
+
+    async def wait_for_status(self, check, timeout):
+        deadline = time.perf_counter() + timeout
+        while True:
+            if check(self.machine_status()):
+                return True
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False
+            self.status_changed.clear()
+            try:
+                await asyncio.wait_for(self.status_changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+
+    async def close(self):
+        if self.websocket:
+            await self.websocket.close()
+
+
+# Dashboard: verbindet sich, fragt die Historie an und empfängt danach nur noch
+async def run_dashboard(url, stats, stop_event, delta):
+    client = LoadClient(url, stats, delta=delta)
+    if not await client.connect():
+        return
+    await client.websocket.send("History")
+    receiver = asyncio.create_task(client.receive_loop(stop_event))
+    await stop_event.wait()
+    await client.close()
+    await receiver
+
+
+# Bediener: sendet Befehle aus dem Mix und misst die Zeit bis zum ack und bis zum passenden Status
+async def run_operator(url, stats, stop_event, machine_id, interval, status_timeout):
+    client = LoadClient(url, stats, machine_id=machine_id)
+    if not await client.connect():
+        return
+    receiver = asyncio.create_task(client.receive_loop(stop_event))
+    names = list(COMMAND_MIX)
+    weights = list(COMMAND_MIX.values())
+    request_number = 0
+
+    try:
+        while not stop_event.is_set():
+            name = random.choices(names, weights)[0]
+            command = {"type": "command", "request_id": f"{id(client)}-{request_number}", "command": name}
+            if name == "brew":
+                command.update(coffee_type=random.choice(["Normal", "Espresso"]), amount=random.choice([1, 2]))
+            request_number += 1
+
+            ack_future = asyncio.get_running_loop().create_future()
+            client.acks[command['request_id']] = ack_future
+            check = STATUS_CHECKS[name]
+            already_reached = check(client.machine_status())
+            sent = time.perf_counter()
+            await client.websocket.send(json.dumps(command))
+
+            try:
+                ack = await asyncio.wait_for(ack_future, status_timeout)
+                stats.ack_ms.append((time.perf_counter() - sent) * 1000)
+                stats.server_ms.append(ack.get('timing', {}).get('server_ms', 0))
+                stats.count_result(ack.get('status') or ack.get('error', 'error'))
+            except asyncio.TimeoutError:
+                stats.count_result("no_ack")
+
+            if already_reached:
+                stats.status_unchanged += 1
+            elif await client.wait_for_status(check, status_timeout):
+                stats.status_ms.append((time.perf_counter() - sent) * 1000)
+            else:
+                stats.status_timeouts += 1
+
+            try:
+                await asyncio.wait_for(stop_event.wait(), random.uniform(0.5, 1.5) * interval)
+            except asyncio.TimeoutError:
+                pass
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        await client.close()
+        await receiver
+
+
+def build_report(args, stats, duration):
+    return {
+        "config": {
+            "url": args.url,
+            "dashboards": args.dashboards,
+            "operators": args.operators,
+            "machines": args.machines,
+            "duration_s": round(duration, 1),
+        },
+        "connect_ms": summarize(stats.connect_ms),
+        "connect_failed": stats.connect_failed,
+        "disconnects": stats.disconnects,
+        "frames": stats.frames,
+        "frames_per_s": round(stats.frames / duration, 1) if duration else None,
+        "bytes_per_s": round(stats.bytes / duration, 1) if duration else None,
+        "skipped_frames": stats.skipped_frames,
+        "commands": stats.command_results,
+        "ack_ms": summarize(stats.ack_ms),
+        "server_ms": summarize(stats.server_ms),
+        "command_to_status_ms": summarize(stats.status_ms),
+        "status_timeouts": stats.status_timeouts,
+        "status_unchanged": stats.status_unchanged,
+    }
+
+
+def print_report(report):
+    def line(name, summary):
+        if not summary["count"]:
+            return f"{name:<22} -"
+        return (f"{name:<22} p50 {summary['p50']:.1f}   p95 {summary['p95']:.1f}   "
+                f"p99 {summary['p99']:.1f}   max {summary['max']:.1f} ms  (n={summary['count']})")
+
+    config = report["config"]
+    print(f"Dashboards / Bediener: {config['dashboards']} / {config['operators']} auf {config['machines']} Maschine(n), "
+          f"{config['duration_s']} s")
+    print(line("Verbindungsaufbau", report["connect_ms"]))
+    print(f"{'Fehlgeschlagen':<22} {report['connect_failed']} Verbindungen, {report['disconnects']} Abbrüche")
+    print(f"{'Empfangen':<22} {report['frames']} Frames ({report['frames_per_s']}/s, {report['bytes_per_s']} B/s)")
+    print(f"{'Übersprungene Frames':<22} {report['skipped_frames']}")
+    print(f"{'Befehle':<22} {report['commands']}")
+    print(line("Befehl bis ack", report["ack_ms"]))
+    print(line("Server-Zeit", report["server_ms"]))
+    print(line("Befehl bis Status", report["command_to_status_ms"]))
+    print(f"{'Ohne passenden Status':<22} {report['status_timeouts']} (Ziel schon erreicht: {report['status_unchanged']})")
+
+
+# Backend als eigenen Prozess mit Datenbank im Speicher starten (kein MongoDB-Server nötig)
+async def start_embedded_backend(args):
+    port = args.port
+    env = dict(os.environ, DATABASE_URL="memory", MACHINE_IDS=",".join(f"machine-{index + 1}" for index in range(args.machines)))
+    backend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "BackendWithWebSocketAndDatabaseInAndOut.py")
+    process = subprocess.Popen(
+        [sys.executable, backend_path, "--port", str(port), "--clock", args.clock, "--speed", str(args.speed)],
+        env=env
+    )
+    for _ in range(100):
+        try:
+            with socket.create_connection(("localhost", port), timeout=0.1):
+                return process
+        except OSError:
+            await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Backend did not start")
+
+
+async def run_load(args):
+    process = await start_embedded_backend(args) if args.embedded else None
+    stats = LoadStats()
+    stop_event = asyncio.Event()
+    tasks = []
+    machine_ids = [f"machine-{index + 1}" for index in range(args.machines)]
+
+    try:
+        started = time.perf_counter()
+        # Verbindungen gleichmäßig über --ramp Sekunden verteilt aufbauen
+        total = args.dashboards + args.operators
+        delay = args.ramp / total if total else 0
+        for index in range(args.dashboards):
+            tasks.append(asyncio.create_task(run_dashboard(args.url, stats, stop_event, args.delta)))
+            await asyncio.sleep(delay)
+        for index in range(args.operators):
+            machine_id = machine_ids[index % len(machine_ids)]
+            tasks.append(asyncio.create_task(
+                run_operator(args.url, stats, stop_event, machine_id, args.command_interval, args.status_timeout)
+            ))
+            await asyncio.sleep(delay)
+
+        # Bei langen Läufen (Soak-Test) regelmäßig Zwischenstände ausgeben
+        end = started + args.duration
+        while time.perf_counter() < end:
+            await asyncio.sleep(min(args.progress_interval, max(0, end - time.perf_counter())))
+            elapsed = time.perf_counter() - started
+            if time.perf_counter() < end:
+                print(f"[{elapsed:.0f} s] {len(stats.connect_ms)} verbunden, {stats.frames} Frames, "
+                      f"{sum(stats.command_results.values())} Befehle, {stats.disconnects} Abbrüche")
+
+        stop_event.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        duration = time.perf_counter() - started
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    report = build_report(args, stats, duration)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Bericht gespeichert: {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test-Client und Lastgenerator für das Kaffeemaschinen-Backend")
+    parser.add_argument("--url", default=None, help="Standard: ws://localhost:<port>")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--load", action="store_true", help="Lasttest statt interaktiver Konsole")
+    parser.add_argument("--dashboards", type=int, default=100, help="Clients, die nur empfangen")
+    parser.add_argument("--operators", type=int, default=5, help="Clients, die Befehle senden")
+    parser.add_argument("--machines", type=int, default=1, help="Bediener werden auf machine-1..N verteilt")
+    parser.add_argument("--duration", type=float, default=60, help="Dauer in Sekunden")
+    parser.add_argument("--ramp", type=float, default=5, help="Zeit zum Aufbau aller Verbindungen in Sekunden")
+    parser.add_argument("--command-interval", type=float, default=5, help="Mittlerer Abstand der Befehle eines Bedieners")
+    parser.add_argument("--status-timeout", type=float, default=10)
+    parser.add_argument("--delta", action="store_true", help="Dashboards verwenden den Delta-Modus")
+    parser.add_argument("--progress-interval", type=float, default=30)
+    parser.add_argument("--report", help="Bericht zusätzlich als JSON-Datei speichern")
+    parser.add_argument("--embedded", action="store_true",
+                        help="Backend selbst starten (DATABASE_URL=memory, ohne MongoDB-Server)")
+    # Uhr des eingebetteten Backends
+    add_clock_arguments(parser)
+    args = parser.parse_args()
+    args.url = args.url or f"ws://localhost:{args.port}"
+
+    if args.load:
+        asyncio.run(run_load(args))
+    else:
+        asyncio.run(interactive(args.url))
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    main()
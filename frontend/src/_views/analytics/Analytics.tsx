@@ -34,8 +34,21 @@ ChartJS.register(
     Legend
 );
 
+// Zeitraum des Diagramms in Minuten. Die Punkte kommen bereits reduziert aus der StatusHistory,
+// live empfangene Werte werden angehängt, bis CHART_POINTS + LIVE_POINTS erreicht sind (dann neu laden).
+const CHART_WINDOWS = [10, 60, 24 * 60];
+const CHART_POINTS = 300;
+const LIVE_POINTS = 100;
+
+type ChartPoint = { x: number; y: number };
+
+const toChartPoints = (points: [number, number][] = []): ChartPoint[] =>
+    points.map(([x, y]) => ({ x, y }));
+
+const formatWindow = (minutes: number) => (minutes < 60 ? `${minutes} min` : `${minutes / 60} h`);
+
 const Analytics = () => {
-    const { logs, coffeeHistory } = useWebSocket();
+    const { logs, coffeeHistory, statusData, isConnected, queryTimeSeries } = useWebSocket();
     const { texts, translate, language } = useLanguage();
 
     const [temperature, setTemperature] = useState<number>(0);
@@ -45,15 +58,65 @@ const Analytics = () => {
     const [currentState, setCurrentState] = useState<string>();
     const [currentStrength, setCurrentStrength] = useState<number | null>(null);
 
-    const [chartData, setChartData] = useState<{ x: number; y: number }[]>(() => {
-        const saved = sessionStorage.getItem("chartData");
-        return saved ? JSON.parse(saved) : [];
-    });
+    const [chartWindow, setChartWindow] = useState<number>(CHART_WINDOWS[0]);
+    const [temperatureData, setTemperatureData] = useState<ChartPoint[]>([]);
+    const [waterFlowData, setWaterFlowData] = useState<ChartPoint[]>([]);
+    const [chartEnd, setChartEnd] = useState<number>(Date.now());
+    // Nummer der letzten Abfrage: Antworten älterer Abfragen (z.B. vor einem Wechsel des Zeitraums) werden verworfen
+    const chartRequest = useRef(0);
+    const loadingChart = useRef(false);
+
+    const loadChart = () => {
+        const request = ++chartRequest.current;
+        loadingChart.current = true;
+
+        const end = Date.now();
+        queryTimeSeries({
+            fields: ["temperature", "water_flow"],
+            from: new Date(end - chartWindow * 60 * 1000).toISOString(),
+            to: new Date(end).toISOString(),
+            points: CHART_POINTS,
+        })
+            .then((result) => {
+                if (request !== chartRequest.current) return;
+                setTemperatureData(toChartPoints(result.series.temperature));
+                setWaterFlowData(toChartPoints(result.series.water_flow));
+                setChartEnd(end);
+            })
+            .catch((err) => console.error("Failed to load chart data:", err))
+            .finally(() => {
+                if (request === chartRequest.current) loadingChart.current = false;
+            });
+    };
+
+    useEffect(() => {
+        // Früher wurde das Diagramm im sessionStorage gehalten
+        sessionStorage.removeItem("chartData");
+        sessionStorage.removeItem("secondsCounter");
+    }, []);
 
-    const [secondsCounter, setSecondsCounter] = useState<number>(() => {
-        const saved = sessionStorage.getItem("secondsCounter");
-        return saved ? Number(saved) : 0;
-    });
+    useEffect(() => {
+        if (isConnected) loadChart();
+    }, [isConnected, chartWindow]);
+
+    // Live-Werte anhängen, Punkte außerhalb des Zeitraums fallen heraus
+    useEffect(() => {
+        if (!statusData) return;
+
+        const now = Date.now();
+        const windowStart = now - chartWindow * 60 * 1000;
+        const append = (points: ChartPoint[], y: number) =>
+            [...points.filter((point) => point.x >= windowStart), { x: now, y }];
+
+        const nextTemperature = append(temperatureData, Number(statusData.temperature));
+        setTemperatureData(nextTemperature);
+        setWaterFlowData((prev) => append(prev, Number(statusData.water_flow)));
+        setChartEnd(now);
+
+        if (nextTemperature.length > CHART_POINTS + LIVE_POINTS && !loadingChart.current) {
+            loadChart();
+        }
+    }, [statusData]);
 
     useEffect(() => {
         if (coffeeHistory.length > 0 && currentState !== texts.state.waitState) {
@@ -87,31 +150,6 @@ const Analytics = () => {
             setWaterLevelIsGood(wasser.trim() === "1");
             setCoffeeGroundsContainerEmpty(kaffeesatz.trim() === "1");
             setWaterFlow(Number(durchfluss));
-
-            setSecondsCounter((prev) => {
-                let next = prev + 1;
-
-                if (next >= 500) {
-                    next = 0;
-                    const resetData = [{ x: 0, y: Number(temp) }];
-                    setChartData(resetData);
-
-                    sessionStorage.setItem("secondsCounter", "0");
-                    sessionStorage.setItem("chartData", JSON.stringify(resetData));
-
-                    return next;
-                }
-
-                const newData = [...chartData, { x: next, y: Number(temp) }];
-                if (newData.length > 50) newData.shift();
-
-                setChartData(newData);
-
-                sessionStorage.setItem("secondsCounter", String(next));
-                sessionStorage.setItem("chartData", JSON.stringify(newData));
-
-                return next;
-            });
         }
     }, [logs, texts, translate, language]);
 
@@ -193,6 +231,17 @@ const Analytics = () => {
                 <div className="card-header">
                     <GiHeatHaze className="iconConfig" />
                     <p className="info-title"> {texts.heatGraph}</p>
+                    <div className="chartWindowButtons">
+                        {CHART_WINDOWS.map((minutes) => (
+                            <button
+                                key={minutes}
+                                className={`chartWindowButton ${minutes === chartWindow ? "chartWindowButtonActive" : ""}`}
+                                onClick={() => setChartWindow(minutes)}
+                            >
+                                {formatWindow(minutes)}
+                            </button>
+                        ))}
+                    </div>
                 </div>
 
                 <div className="chartWrapper">
@@ -201,28 +250,53 @@ const Analytics = () => {
                             datasets: [
                                 {
                                     label: texts.temperatureChart,
-                                    data: chartData,
+                                    data: temperatureData,
                                     borderColor: "rgba(22,42,79,1)",
                                     backgroundColor: "rgba(22,42,79,0,2)",
                                     tension: 0.3,
+                                    pointRadius: 0,
+                                    yAxisID: "y",
+                                },
+                                {
+                                    label: texts.waterFlowChart,
+                                    data: waterFlowData,
+                                    borderColor: "rgba(64,140,200,1)",
+                                    backgroundColor: "rgba(64,140,200,0.2)",
+                                    stepped: true,
+                                    pointRadius: 0,
+                                    yAxisID: "y1",
                                 },
                             ],
                         }}
                         options={{
                             responsive: true,
                             animation: false, // verhindert Flackern
+                            parsing: false, // Punkte liegen schon als {x, y} vor
                             scales: {
                                 x: {
                                     type: "linear",
-                                    min: Math.max(secondsCounter - 20, 0),
-                                    max: secondsCounter,
-                                    title: { display: true, text: texts.secondsChart },
+                                    min: chartEnd - chartWindow * 60 * 1000,
+                                    max: chartEnd,
+                                    ticks: {
+                                        callback: (value) => new Date(Number(value)).toLocaleTimeString(language, {
+                                            hour: "2-digit",
+                                            minute: "2-digit",
+                                        }),
+                                    },
+                                    title: { display: true, text: texts.timeChart },
                                 },
                                 y: {
                                     min: 0,
                                     max: 120, // fixierter Bereich für Temperatur
                                     title: { display: true, text: "°C" },
                                 },
+                                y1: {
+                                    position: "right",
+                                    min: 0,
+                                    max: 10,
+                                    grid: { drawOnChartArea: false },
+                                    title: { display: true, text: "mL/s" },
+                                },
                             },
                         }}
                     />
@@ -2,6 +2,7 @@ import React, { useMemo } from "react";
 import "./History.css";
 import { useWebSocket } from "../../common/context/WebSocketContext";
 import { useLanguage } from "../../common/context/LanguageContext";
+import { coffeeTypeLabel } from "../../common/utils/coffeeTypes";
 
 const History = () => {
     const { coffeeHistory } = useWebSocket();
@@ -23,10 +24,11 @@ const History = () => {
                 todayCount++;
             }
 
-            if (coffeeTypes[coffee.type])
-                coffeeTypes[coffee.type]++;
+            const label = coffeeTypeLabel(coffee.type, texts);
+            if (coffeeTypes[label])
+                coffeeTypes[label]++;
             else
-                coffeeTypes[coffee.type] = 1;
+                coffeeTypes[label] = 1;
 
 
         }
@@ -43,7 +45,7 @@ const History = () => {
             totalCount: coffeeHistory.length,
             mostPopularType,
         };
-    }, [coffeeHistory, texts.historyNoCoffeMadeYet]);
+    }, [coffeeHistory, texts]);
 
     const cupLabel =
         statistics.todayCount === 1
@@ -100,7 +102,7 @@ const History = () => {
                                 <tr key={coffee.id}>
                                     <td>{date}</td>
                                     <td>{time}</td>
-                                    <td>{coffee.type}</td>
+                                    <td>{coffeeTypeLabel(coffee.type, texts)}</td>
                                     <td>{coffee.strength}/5</td>
                                 </tr>
                             );
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from "react";
 import { useWebSocket } from "../../common/context/WebSocketContext";
 import { useLanguage } from "../../common/context/LanguageContext";
 import { isToday } from "../../common/utils/dateUtils";
+import { coffeeTypeLabel, toRecipeKey } from "../../common/utils/coffeeTypes";
 import PageHeader from "../../_views/layout/PageHeader";
 import "./Preperation.css";
 
@@ -73,15 +74,16 @@ const Preparation = () => {
         setIsBrewing(true);
         showSnackbar(texts.brewingStarted.replace("{type}", coffeeType), "info");
 
+        const recipe = toRecipeKey(coffeeType, texts);
         send("Brew");
         setTimeout(() => send(amount.toString()), BREW_DELAYS.amount);
         setTimeout(() => {
-            send(coffeeType === texts.espresso ? "Espresso" : "Normal");
+            send(recipe);
         }, BREW_DELAYS.type);
         setTimeout(() => {
             const now = new Date().toISOString();
             for (let i = 0; i < amount; i++) {
-                addCoffeeToHistory({ id: Date.now() + i, type: coffeeType, strength, createdDate: now });
+                addCoffeeToHistory({ id: Date.now() + i, type: recipe, strength, createdDate: now });
             }
         }, BREW_DELAYS.history);
     };
@@ -314,8 +316,8 @@ const Preparation = () => {
                                             })}
                                         </td>
                                         <td>
-                                                <span className={`badge ${coffee.type === texts.espresso ? "bg-primary" : "bg-dark"}`}>
-                                                    {coffee.type}
+                                                <span className={`badge ${coffeeTypeLabel(coffee.type, texts) === texts.espresso ? "bg-primary" : "bg-dark"}`}>
+                                                    {coffeeTypeLabel(coffee.type, texts)}
                                                 </span>
                                         </td>
                                         <td>
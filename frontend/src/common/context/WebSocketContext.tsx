@@ -3,6 +3,7 @@ import React, { createContext, useContext, useEffect, useRef, useState } from "r
 const WS_URL = "ws://localhost:8765";
 const HISTORY_RELOAD_DELAY = 1000;
 const HISTORY_INITIAL_DELAY = 500;
+const TIMESERIES_TIMEOUT = 10000;
 
 const BREWING_STEPS = ["Grind", "Press", "Moisten", "Brew", "ToStartposition"];
 
@@ -11,6 +12,13 @@ const WebSocketContext = createContext<IWebSocketContext | null>(null);
 export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ children }) => {
     const ws = useRef<WebSocket | null>(null);
     const lastBrewingState = useRef(false);
+    // Offene Zeitreihen-Abfragen: Stücke sammeln, bis "done" kommt
+    const pendingSeries = useRef<Record<string, {
+        result: ITimeSeriesResult;
+        resolve: (result: ITimeSeriesResult) => void;
+        reject: (error: Error) => void;
+        timeout: ReturnType<typeof setTimeout>;
+    }>>({});
 
     const [isConnected, setIsConnected] = useState(false);
     const [logs, setLogs] = useState<string[]>([]);
@@ -83,6 +91,52 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
         setCoffeeHistory(formattedHistory);
     };
 
+    const handleTimeSeriesMessage = (data: any) => {
+        const pending = pendingSeries.current[data.request_id];
+        if (!pending) return;
+
+        if (data.type === "timeseries_info") {
+            pending.result.source = data.source;
+            pending.result.samples = data.samples;
+            return;
+        }
+
+        if (data.field) {
+            pending.result.series[data.field] = [...(pending.result.series[data.field] || []), ...data.data];
+        }
+        if (data.done) {
+            clearTimeout(pending.timeout);
+            delete pendingSeries.current[data.request_id];
+            if (data.error) {
+                pending.reject(new Error(data.error));
+            } else {
+                pending.resolve(pending.result);
+            }
+        }
+    };
+
+    // Zeitreihe vom Backend, bereits auf höchstens query.points Punkte pro Feld reduziert
+    const queryTimeSeries = (query: ITimeSeriesQuery) => new Promise<ITimeSeriesResult>((resolve, reject) => {
+        if (ws.current?.readyState !== WebSocket.OPEN) {
+            reject(new Error("not connected"));
+            return;
+        }
+
+        const requestId = `series-${Date.now()}-${Math.random().toString(36).slice(2, 8)}`;
+        const timeout = setTimeout(() => {
+            delete pendingSeries.current[requestId];
+            reject(new Error("timeout"));
+        }, TIMESERIES_TIMEOUT);
+
+        pendingSeries.current[requestId] = {
+            result: { source: "", samples: 0, series: {} },
+            resolve,
+            reject,
+            timeout,
+        };
+        ws.current.send(JSON.stringify({ type: "timeseries_query", request_id: requestId, ...query }));
+    });
+
     useEffect(() => {
         ws.current = new WebSocket(WS_URL);
 
@@ -114,6 +168,17 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
                     handleCoffeeHistoryMessage(data.data);
                     return;
                 }
+
+                if (data.type === "timeseries_info" || data.type === "timeseries_chunk") {
+                    handleTimeSeriesMessage(data);
+                    return;
+                }
+
+                // Abgelehnte Kaffees (ungültig oder Backend überlastet) im Log festhalten
+                if (data.type === "ack" && typeof data.request_id === "string" && data.request_id.startsWith("coffee-")) {
+                    if (!data.ok) setLogs((prev) => [...prev, `Coffee rejected: ${data.error || data.status}`]);
+                    return;
+                }
             } catch (err) {
                 console.error("Failed to parse WebSocket message:", err);
             }
@@ -136,7 +201,7 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
         });
 
         if (ws.current?.readyState === WebSocket.OPEN) {
-            ws.current.send(JSON.stringify(entry));
+            ws.current.send(JSON.stringify({ ...entry, request_id: `coffee-${entry.id}` }));
         }
     };
 
@@ -148,6 +213,7 @@ export const WebSocketProvider: React.FC<{ children: React.ReactNode }> = ({ chi
                 send,
                 addCoffeeToHistory,
                 requestHistoryUpdate,
+                queryTimeSeries,
                 setIsOn,
                 setIsReady,
                 setIsBrewing,
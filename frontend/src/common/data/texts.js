@@ -51,6 +51,8 @@ export const texts = {
         currentState: 'Aktueller Zustand',
         temperatureChart: 'Temperatur',
         secondsChart: 'Sekunden',
+        timeChart: 'Uhrzeit',
+        waterFlowChart: 'Wasserdurchfluss',
         state: {
             heatingState: 'Aufheizen',
             grindingState: 'Mahlen',
@@ -198,6 +200,8 @@ export const texts = {
         currentState: 'Current State',
         temperatureChart: 'Temperature',
         secondsChart: 'Seconds',
+        timeChart: 'Time',
+        waterFlowChart: 'Water flow',
         state: {
             heatingState: "HeatUp",           // war: "Heating up"
             grindingState: "Grind",            // war: "Grinding"
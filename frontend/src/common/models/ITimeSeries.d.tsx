@@ -0,0 +1,14 @@
+interface ITimeSeriesQuery {
+    machine_id?: string;
+    fields?: string[];
+    from?: string;
+    to?: string;
+    points?: number;
+    method?: "lttb" | "minmax";
+}
+
+interface ITimeSeriesResult {
+    source: string;
+    samples: number;
+    series: Record<string, [number, number][]>;
+}
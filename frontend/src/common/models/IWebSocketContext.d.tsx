@@ -13,4 +13,5 @@ interface IWebSocketContext {
     setIsBrewing: (v: boolean) => void;
     addCoffeeToHistory: (entry: ICoffee) => void;
     requestHistoryUpdate: () => void;
+    queryTimeSeries: (query: ITimeSeriesQuery) => Promise<ITimeSeriesResult>;
 }
\ No newline at end of file
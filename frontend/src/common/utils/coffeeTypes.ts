@@ -0,0 +1,9 @@
+// Das Backend speichert die Rezeptnamen ("Normal", "Espresso"), angezeigt wird der übersetzte Name
+export const toRecipeKey = (coffeeType: string, texts: { espresso: string }): string =>
+    coffeeType === texts.espresso ? "Espresso" : "Normal";
+
+export const coffeeTypeLabel = (coffeeType: string, texts: { espresso: string; black: string }): string => {
+    if (coffeeType === "Espresso") return texts.espresso;
+    if (coffeeType === "Normal") return texts.black;
+    return coffeeType;
+};